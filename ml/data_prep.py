@@ -2,12 +2,18 @@
 ML Data Preparation - Download and prepare stock data with technical features
 """
 
-import yfinance as yf
 import pandas as pd
 import numpy as np
 import json
 from pathlib import Path
 
+try:
+    from ml.features import FEATURE_COLUMNS, add_features
+    from ml.market_data import get_provider
+except ImportError:  # Run as a script from inside ml/
+    from features import FEATURE_COLUMNS, add_features
+    from market_data import get_provider
+
 # 16 Stocks: 8 NASDAQ + 8 Indian NSE (5-year historical data)
 TICKERS = [
     # NASDAQ stocks
@@ -41,119 +47,81 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 OUT_DIR = BASE_DIR / "ml" / "artifacts"
 OUT_DIR.mkdir(parents=True, exist_ok=True)
 
-def compute_rsi(series, n=14):
-    """Relative Strength Index"""
-    delta = series.diff()
-    up = delta.clip(lower=0)
-    down = -1 * delta.clip(upper=0)
-    ma_up = up.rolling(n).mean()
-    ma_down = down.rolling(n).mean()
-    rs = ma_up / (ma_down + 1e-9)
-    return 100 - (100 / (1 + rs))
-
 def prepare_ticker(ticker, period="5y", interval="1d"):
     """Download and prepare features for one ticker"""
     print(f"  Downloading {ticker}...")
 
     try:
-        df = yf.download(ticker, period=period, interval=interval, progress=False, auto_adjust=True)
+        df = get_provider().download([ticker], period=period, interval=interval).get(ticker)
 
-        if df.empty:
+        if df is None:
             print(f"    Warning: No data for {ticker}")
             return None
 
-        # Handle multi-index columns from yfinance
-        if isinstance(df.columns, pd.MultiIndex):
-            df.columns = df.columns.get_level_values(0)
-
-        df = df[['Open','High','Low','Close','Volume']].dropna()
-        df.columns = [str(c).lower() for c in df.columns]
-
-        # Returns
-        df['ret1'] = df['close'].pct_change()
-
-        # Lag returns (1-10 days)
-        for lag in range(1, 11):
-            df[f'ret_lag{lag}'] = df['ret1'].shift(lag)
-
-        # Momentum
-        df['mom_7'] = df['close'].pct_change(7)
-        df['mom_21'] = df['close'].pct_change(21)
-
-        # Volatility (annualized)
-        df['vol_7'] = df['ret1'].rolling(7).std() * (252**0.5)
-        df['vol_21'] = df['ret1'].rolling(21).std() * (252**0.5)
-        df['vol_63'] = df['ret1'].rolling(63).std() * (252**0.5)
-
-        # RSI
-        df['rsi_14'] = compute_rsi(df['close'], 14)
-
-        # Volume features
-        df['vma_21'] = df['volume'] / (df['volume'].rolling(21).mean() + 1e-9)
-        df['vma_63'] = df['volume'] / (df['volume'].rolling(63).mean() + 1e-9)
-
-        # Moving averages
-        df['sma_7'] = df['close'].rolling(7).mean()
-        df['sma_21'] = df['close'].rolling(21).mean()
-        df['sma_50'] = df['close'].rolling(50).mean()
-
-        # Price vs SMA
-        df['price_vs_sma7'] = df['close'] / (df['sma_7'] + 1e-9) - 1
-        df['price_vs_sma21'] = df['close'] / (df['sma_21'] + 1e-9) - 1
-        df['price_vs_sma50'] = df['close'] / (df['sma_50'] + 1e-9) - 1
+        return add_labels(add_features(df), ticker)
 
-        # Calendar features
-        df['day_of_week'] = df.index.dayofweek
-        df['month'] = df.index.month
+    except Exception as e:
+        print(f"    Error: {e}")
+        return None
 
-        # Drop NaN
-        df.dropna(inplace=True)
+def add_labels(df, ticker):
+    """Drop the feature warm-up rows and add the training targets for one ticker"""
+    # Drop NaN
+    df = df.dropna().copy()
 
-        # Create target variables
+    # Create target variables
 
-        # 1. Direction (up/neutral/down for next day)
-        df['future_ret1'] = df['close'].pct_change().shift(-1)
-        thr = 0.005  # 0.5% threshold
-        df['label_dir'] = df['future_ret1'].apply(
-            lambda x: 2 if x > thr else (0 if x < -thr else 1)
-        )
+    # 1. Direction (up/neutral/down for next day)
+    df['future_ret1'] = df['close'].pct_change().shift(-1)
+    thr = 0.005  # 0.5% threshold
+    df['label_dir'] = df['future_ret1'].apply(
+        lambda x: 2 if x > thr else (0 if x < -thr else 1)
+    )
 
-        # 2. Future volatility (5-day ahead)
-        df['future_vol5'] = df['ret1'].rolling(5).std().shift(-1) * (252**0.5)
+    # 2. Future volatility (5-day ahead)
+    df['future_vol5'] = df['ret1'].rolling(5).std().shift(-1) * (252**0.5)
 
-        # 3. Regime labels (based on volatility and drawdown)
-        df['rolling_max'] = df['close'].rolling(63).max()
-        df['drawdown'] = (df['close'] - df['rolling_max']) / df['rolling_max']
+    # 3. Regime labels (based on volatility and drawdown)
+    df['rolling_max'] = df['close'].rolling(63).max()
+    df['drawdown'] = (df['close'] - df['rolling_max']) / df['rolling_max']
 
-        # Regime: 0=Calm, 1=Volatile, 2=Crash
-        df['label_regime'] = 0  # Default calm
-        df.loc[df['vol_21'] > df['vol_21'].quantile(0.75), 'label_regime'] = 1  # Volatile
-        df.loc[(df['drawdown'] < -0.15) | (df['vol_21'] > df['vol_21'].quantile(0.90)), 'label_regime'] = 2  # Crash
+    # Regime: 0=Calm, 1=Volatile, 2=Crash
+    df['label_regime'] = 0  # Default calm
+    df.loc[df['vol_21'] > df['vol_21'].quantile(0.75), 'label_regime'] = 1  # Volatile
+    df.loc[(df['drawdown'] < -0.15) | (df['vol_21'] > df['vol_21'].quantile(0.90)), 'label_regime'] = 2  # Crash
 
-        # Drop rows with NaN in targets
-        df = df.dropna()
+    # Drop rows with NaN in targets
+    df = df.dropna()
 
-        # Add ticker
-        df['ticker'] = ticker
-        df['ticker_name'] = TICKER_NAMES.get(ticker, ticker)
+    # Add ticker
+    df['ticker'] = ticker
+    df['ticker_name'] = TICKER_NAMES.get(ticker, ticker)
 
-        print(f"    Processed {len(df)} rows")
-        return df
-
-    except Exception as e:
-        print(f"    Error: {e}")
-        return None
+    print(f"    Processed {len(df)} rows")
+    return df
 
 def build_dataset(tickers=TICKERS):
     """Build complete dataset from all tickers"""
     print("Building ML dataset...")
     print("="*60)
 
+    # One download and one feature pass over the panel of all tickers
+    print(f"  Downloading {len(tickers)} tickers...")
+    raw = get_provider().download(list(tickers), period="5y")
+    for t in tickers:
+        if t not in raw:
+            print(f"    Warning: No data for {t}")
+    if not raw:
+        print("ERROR: No data collected!")
+        return None, None
+    panel = add_features(pd.concat([df.assign(ticker=t) for t, df in raw.items()]), by='ticker')
+
+    groups = dict(tuple(panel.groupby('ticker', sort=False)))
     frames = []
     for t in tickers:
-        df = prepare_ticker(t)
-        if df is not None:
-            frames.append(df)
+        if t in groups:
+            print(f"  Labelling {t}...")
+            frames.append(add_labels(groups[t].drop(columns='ticker'), t))
 
     if not frames:
         print("ERROR: No data collected!")
@@ -163,12 +131,7 @@ def build_dataset(tickers=TICKERS):
     df = pd.concat(frames).reset_index().rename(columns={'index':'date'})
 
     # Define feature columns
-    feature_cols = [c for c in df.columns if c.startswith('ret_lag') or c in [
-        'mom_7', 'mom_21', 'vol_7', 'vol_21', 'vol_63',
-        'rsi_14', 'vma_21', 'vma_63',
-        'price_vs_sma7', 'price_vs_sma21', 'price_vs_sma50',
-        'day_of_week', 'month'
-    ]]
+    feature_cols = list(FEATURE_COLUMNS)
 
     # Save dataset
     df.to_parquet(OUT_DIR / "dataset.parquet")
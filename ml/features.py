@@ -0,0 +1,269 @@
+"""
+Model features shared by training (ml/data_prep.py) and serving (users/ml_predictor.py)
+
+Batch mode (add_features) computes every feature column over a daily OHLCV
+frame, or over a panel of many tickers at once: rows are sorted by ticker
+and date and every shift/rolling window runs once over the whole panel,
+with values that would reach across two tickers masked out.
+
+Online mode (OnlineFeatures) keeps the rolling-window state of each symbol
+- ring buffers with running sums - and updates the feature vector in O(1)
+when a new bar arrives, so serving does not recompute the windows.
+"""
+from collections import deque
+import threading
+
+import numpy as np
+import pandas as pd
+
+ANNUALIZE = 252 ** 0.5
+LAGS = 10
+MOMENTUM_WINDOWS = (7, 21)
+VOLATILITY_WINDOWS = (7, 21, 63)
+RSI_WINDOW = 14
+VOLUME_WINDOWS = (21, 63)
+SMA_WINDOWS = (7, 21, 50)
+
+FEATURE_COLUMNS = (
+    [f'ret_lag{lag}' for lag in range(1, LAGS + 1)]
+    + [f'mom_{n}' for n in MOMENTUM_WINDOWS]
+    + [f'vol_{n}' for n in VOLATILITY_WINDOWS]
+    + [f'rsi_{RSI_WINDOW}']
+    + [f'vma_{n}' for n in VOLUME_WINDOWS]
+    + [f'price_vs_sma{n}' for n in SMA_WINDOWS]
+    + ['day_of_week', 'month']
+)
+
+# Bars before every feature is defined (vol_63 needs 63 returns)
+WARMUP_BARS = max(VOLATILITY_WINDOWS) + 1
+
+# Running sums are recomputed from the buffers this often to stop float drift
+RESYNC_EVERY = 1000
+
+
+def add_features(df, by=None):
+    """
+    Add the feature columns (and ret1/sma_* intermediates) to a daily OHLCV
+    frame with lowercase columns and a DatetimeIndex. With `by` (a ticker
+    column) the frame is a panel and features are computed per ticker in one
+    pass; the result is sorted by ticker and date.
+    """
+    if by is not None:
+        index = df.index.name or 'date'
+        df = df.rename_axis(index).reset_index().sort_values([by, index], kind='stable').set_index(index)
+        position = df.groupby(by, sort=False).cumcount().to_numpy()
+    else:
+        df = df.copy()
+        position = np.arange(len(df))
+
+    def within(values, bars):
+        """Values that need `bars` earlier rows of the same ticker; NaN otherwise"""
+        return values.where(position >= bars)
+
+    close = df['close']
+    volume = df['volume']
+
+    # Returns
+    df['ret1'] = within(close / close.shift(1) - 1, 1)
+
+    # Lag returns (1-10 days)
+    for lag in range(1, LAGS + 1):
+        df[f'ret_lag{lag}'] = within(df['ret1'].shift(lag), lag)
+
+    # Momentum
+    for n in MOMENTUM_WINDOWS:
+        df[f'mom_{n}'] = within(close / close.shift(n) - 1, n)
+
+    # Volatility (annualized) - windows reaching the previous ticker include its NaN first return
+    for n in VOLATILITY_WINDOWS:
+        df[f'vol_{n}'] = df['ret1'].rolling(n).std() * ANNUALIZE
+
+    # RSI
+    delta = within(close.diff(), 1)
+    ma_up = delta.clip(lower=0).rolling(RSI_WINDOW).mean()
+    ma_down = (-delta.clip(upper=0)).rolling(RSI_WINDOW).mean()
+    df[f'rsi_{RSI_WINDOW}'] = 100 - (100 / (1 + ma_up / (ma_down + 1e-9)))
+
+    # Volume features
+    for n in VOLUME_WINDOWS:
+        df[f'vma_{n}'] = volume / (within(volume.rolling(n).mean(), n - 1) + 1e-9)
+
+    # Moving averages
+    for n in SMA_WINDOWS:
+        df[f'sma_{n}'] = within(close.rolling(n).mean(), n - 1)
+
+    # Price vs SMA
+    for n in SMA_WINDOWS:
+        df[f'price_vs_sma{n}'] = close / (df[f'sma_{n}'] + 1e-9) - 1
+
+    # Calendar features
+    df['day_of_week'] = df.index.dayofweek
+    df['month'] = df.index.month
+    return df
+
+
+class RollingSeries:
+    """Ring buffer of recent values with running sums over several windows"""
+
+    def __init__(self, windows, size):
+        self.windows = windows
+        self.values = deque(maxlen=size)
+        self.sums = dict.fromkeys(windows, 0.0)
+        self.squares = dict.fromkeys(windows, 0.0)
+        self.pushes = 0
+
+    def __len__(self):
+        return len(self.values)
+
+    def __getitem__(self, index):
+        return self.values[index]
+
+    def push(self, value):
+        self.values.append(value)
+        for n in self.windows:
+            self.sums[n] += value
+            self.squares[n] += value * value
+            if len(self.values) > n:
+                dropped = self.values[-n - 1]
+                self.sums[n] -= dropped
+                self.squares[n] -= dropped * dropped
+        self.pushes += 1
+        if self.pushes % RESYNC_EVERY == 0:
+            self.resync()
+
+    def pop(self):
+        """Undo the last push (the buffer holds one value more than the longest window)"""
+        value = self.values.pop()
+        for n in self.windows:
+            self.sums[n] -= value
+            self.squares[n] -= value * value
+            if len(self.values) >= n:
+                restored = self.values[-n]
+                self.sums[n] += restored
+                self.squares[n] += restored * restored
+
+    def resync(self):
+        values = list(self.values)
+        for n in self.windows:
+            window = values[-n:]
+            self.sums[n] = sum(window)
+            self.squares[n] = sum(value * value for value in window)
+
+    def mean(self, n):
+        return self.sums[n] / n
+
+    def std(self, n):
+        """Sample standard deviation over the last n values"""
+        variance = (self.squares[n] - self.sums[n] * self.sums[n] / n) / (n - 1)
+        return variance ** 0.5 if variance > 0 else 0.0
+
+
+class SymbolFeatures:
+    """Rolling-window state of one symbol"""
+
+    def __init__(self):
+        size = WARMUP_BARS + 1
+        self.closes = RollingSeries(SMA_WINDOWS, size)
+        self.volumes = RollingSeries(VOLUME_WINDOWS, size)
+        self.returns = RollingSeries(VOLATILITY_WINDOWS, size)
+        self.ups = RollingSeries((RSI_WINDOW,), size)
+        self.downs = RollingSeries((RSI_WINDOW,), size)
+        self.dates = deque(maxlen=size)
+
+    @property
+    def last_date(self):
+        return self.dates[-1] if self.dates else None
+
+    def push(self, date, close, volume):
+        if self.closes:
+            previous = self.closes[-1]
+            self.returns.push(close / previous - 1)
+            self.ups.push(max(close - previous, 0.0))
+            self.downs.push(max(previous - close, 0.0))
+        self.closes.push(close)
+        self.volumes.push(volume)
+        self.dates.append(date)
+
+    def pop(self):
+        """Undo the last bar, e.g. to replace a bar that was still forming"""
+        self.dates.pop()
+        self.closes.pop()
+        self.volumes.pop()
+        if self.returns:
+            self.returns.pop()
+            self.ups.pop()
+            self.downs.pop()
+
+    def ready(self):
+        return len(self.closes) >= WARMUP_BARS
+
+    def values(self):
+        """{feature: value} for the latest bar; requires ready()"""
+        close = self.closes[-1]
+        values = {f'ret_lag{lag}': self.returns[-1 - lag] for lag in range(1, LAGS + 1)}
+        for n in MOMENTUM_WINDOWS:
+            values[f'mom_{n}'] = close / self.closes[-1 - n] - 1
+        for n in VOLATILITY_WINDOWS:
+            values[f'vol_{n}'] = self.returns.std(n) * ANNUALIZE
+        ma_up, ma_down = self.ups.mean(RSI_WINDOW), self.downs.mean(RSI_WINDOW)
+        values[f'rsi_{RSI_WINDOW}'] = 100 - (100 / (1 + ma_up / (ma_down + 1e-9)))
+        for n in VOLUME_WINDOWS:
+            values[f'vma_{n}'] = self.volumes[-1] / (self.volumes.mean(n) + 1e-9)
+        for n in SMA_WINDOWS:
+            values[f'price_vs_sma{n}'] = close / (self.closes.mean(n) + 1e-9) - 1
+        date = pd.Timestamp(self.dates[-1])
+        values['day_of_week'] = date.dayofweek
+        values['month'] = date.month
+        return values
+
+
+class OnlineFeatures:
+    """Per-symbol online feature state, updated in O(1) per new bar"""
+
+    def __init__(self):
+        self.states = {}
+        self.lock = threading.Lock()
+
+    def update(self, symbol, date, close, volume):
+        """Add a bar; a bar for the latest date replaces it"""
+        with self.lock:
+            state = self.states.setdefault(symbol, SymbolFeatures())
+            if state.last_date == date:
+                state.pop()
+            state.push(date, float(close), float(volume))
+
+    def sync(self, symbol, df):
+        """
+        Bring a symbol's state up to the end of a daily OHLCV frame: only bars
+        from the state's last date onwards are applied. Without state, or when
+        the frame does not overlap it, the state is rebuilt from the frame's tail.
+        """
+        dates = df.index.to_numpy(dtype='datetime64[D]')
+        closes = df['close'].to_numpy(dtype=float)
+        volumes = df['volume'].to_numpy(dtype=float)
+        with self.lock:
+            state = self.states.get(symbol)
+            start = None
+            if state is not None and state.last_date is not None:
+                start = int(np.searchsorted(dates, state.last_date))
+                if start == len(dates) or dates[start] != state.last_date:
+                    start = None
+            if start is None:
+                state = self.states[symbol] = SymbolFeatures()
+                start = max(len(dates) - (WARMUP_BARS + 1), 0)
+            for i in range(start, len(dates)):
+                if state.last_date == dates[i]:
+                    if state.closes[-1] == closes[i] and state.volumes[-1] == volumes[i]:
+                        continue
+                    state.pop()
+                state.push(dates[i], closes[i], volumes[i])
+            return state
+
+    def vector(self, symbol, features=FEATURE_COLUMNS):
+        """Latest feature vector in `features` order, or None while warming up"""
+        with self.lock:
+            state = self.states.get(symbol)
+            if state is None or not state.ready():
+                return None
+            values = state.values()
+        return np.array([values[feature] for feature in features], dtype=float)
@@ -0,0 +1,224 @@
+"""
+Market data providers - every OHLCV and metadata fetch goes through this interface.
+
+    MARKET_DATA_PROVIDER=yfinance   live Yahoo Finance data (default)
+    MARKET_DATA_PROVIDER=replay     recorded fixtures from MARKET_DATA_REPLAY_DIR,
+                                    optionally delayed by MARKET_DATA_REPLAY_LATENCY seconds
+
+The replay backend lets the refresh and prediction pipelines run offline and
+deterministically, e.g. for benchmarks and load tests.
+"""
+
+import json
+import os
+import time
+from pathlib import Path
+
+OHLCV_COLUMNS = ['open', 'high', 'low', 'close', 'volume']
+
+# Get base directory (parent of ml/)
+BASE_DIR = Path(__file__).resolve().parent.parent
+DEFAULT_REPLAY_DIR = BASE_DIR / "ml" / "fixtures"
+
+
+def normalize_ohlcv(df):
+    """
+    Normalize an OHLCV frame to lowercase open/high/low/close/volume columns
+    indexed by date. Returns None if the frame is empty or incomplete.
+    """
+    if df is None or df.empty:
+        return None
+    import pandas as pd
+
+    # Handle multi-index columns from yfinance
+    if isinstance(df.columns, pd.MultiIndex):
+        df = df.copy()
+        df.columns = df.columns.get_level_values(0)
+
+    df = df.rename(columns=lambda c: str(c).lower())
+    missing_cols = [c for c in OHLCV_COLUMNS if c not in df.columns]
+    if missing_cols:
+        print(f"Warning: Missing OHLCV columns: {missing_cols}")
+        return None
+
+    df = df[OHLCV_COLUMNS].dropna()
+    return df if not df.empty else None
+
+
+class MarketDataProvider:
+    """Interface for market data backends"""
+
+    name = None
+
+    def download(self, tickers, period=None, start=None, interval="1d"):
+        """
+        Download OHLCV bars for many tickers, either for a `period` ("90d", "6mo",
+        "2y", ...) or from a `start` date onwards (inclusive).
+        Returns {ticker: normalized frame}; tickers without data are left out.
+        """
+        raise NotImplementedError
+
+    def info(self, ticker):
+        """Return metadata for a ticker using yfinance `info` keys (longName, sector, marketCap, ...)"""
+        raise NotImplementedError
+
+
+class YFinanceProvider(MarketDataProvider):
+    """Live data from Yahoo Finance"""
+
+    name = 'yfinance'
+
+    def download(self, tickers, period=None, start=None, interval="1d"):
+        import pandas as pd
+        import yfinance as yf
+
+        tickers = list(tickers)
+        window = {'start': str(start)} if start is not None else {'period': period or "1y"}
+        raw = yf.download(
+            tickers, interval=interval, group_by="ticker",
+            progress=False, auto_adjust=True, threads=True, **window,
+        )
+
+        frames = {}
+        if raw is None or raw.empty:
+            return frames
+
+        for ticker in tickers:
+            if isinstance(raw.columns, pd.MultiIndex):
+                if ticker in raw.columns.get_level_values(0):
+                    df = raw[ticker]
+                elif ticker in raw.columns.get_level_values(1):
+                    df = raw.xs(ticker, axis=1, level=1)
+                else:
+                    continue
+            else:
+                df = raw  # Single ticker downloads can come back without the ticker level
+            df = normalize_ohlcv(df)
+            if df is not None:
+                frames[ticker] = df
+        return frames
+
+    def info(self, ticker):
+        import yfinance as yf
+        return yf.Ticker(ticker).info
+
+
+class ReplayProvider(MarketDataProvider):
+    """
+    Serves recorded fixtures: <root>/<TICKER>.parquet or <TICKER>.csv (date,
+    open, high, low, close, volume) and <root>/info.json ({ticker: info}).
+    Periods are measured back from the last recorded bar, so results are
+    deterministic.
+    """
+
+    name = 'replay'
+
+    def __init__(self, root=DEFAULT_REPLAY_DIR, latency=0.0):
+        self.root = Path(root)
+        self.latency = latency
+        self._frames = {}
+        self._info = None
+
+    def _load(self, ticker):
+        import pandas as pd
+        if ticker not in self._frames:
+            df = None
+            parquet_path = self.root / f"{ticker}.parquet"
+            csv_path = self.root / f"{ticker}.csv"
+            if parquet_path.exists():
+                df = pd.read_parquet(parquet_path)
+            elif csv_path.exists():
+                df = pd.read_csv(csv_path, index_col=0, parse_dates=True)
+            if df is not None:
+                df.index = pd.DatetimeIndex(df.index).tz_localize(None)
+                df = normalize_ohlcv(df.sort_index())
+            self._frames[ticker] = df
+        return self._frames[ticker]
+
+    def download(self, tickers, period=None, start=None, interval="1d"):
+        if interval != "1d":
+            raise ValueError(f"Replay fixtures only hold daily bars, not {interval}")
+        import pandas as pd
+        if self.latency:
+            time.sleep(self.latency)
+
+        frames = {}
+        for ticker in tickers:
+            df = self._load(ticker)
+            if df is None:
+                continue
+            if start is not None:
+                df = df[df.index >= pd.Timestamp(str(start))]
+            elif period and period != "max":
+                df = df[df.index > df.index[-1] - _period_offset(period)]
+            if not df.empty:
+                frames[ticker] = df.copy()
+        return frames
+
+    def info(self, ticker):
+        if self.latency:
+            time.sleep(self.latency)
+        if self._info is None:
+            info_path = self.root / "info.json"
+            self._info = json.loads(info_path.read_text()) if info_path.exists() else {}
+        return self._info.get(ticker, {})
+
+
+def _period_offset(period):
+    """Convert a yfinance period string ("90d", "6mo", "2y", "1wk") to a DateOffset"""
+    import pandas as pd
+    for suffix, unit in (("mo", "months"), ("wk", "weeks"), ("d", "days"), ("y", "years")):
+        if period.endswith(suffix):
+            return pd.DateOffset(**{unit: int(period[:-len(suffix)])})
+    raise ValueError(f"Unsupported period: {period}")
+
+
+def record_fixtures(tickers, out_dir=DEFAULT_REPLAY_DIR, period="2y", source=None):
+    """Record OHLCV parquet files and info.json from `source` (live yfinance by default) for replay"""
+    source = source or YFinanceProvider()
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    frames = source.download(tickers, period=period)
+    for ticker, df in frames.items():
+        df.to_parquet(out_dir / f"{ticker}.parquet")
+
+    info = {}
+    for ticker in frames:
+        try:
+            info[ticker] = {
+                key: value for key, value in source.info(ticker).items()
+                if key in ('longName', 'shortName', 'sector', 'marketCap', 'regularMarketPrice', 'currentPrice')
+            }
+        except Exception as e:
+            print(f"Warning: could not record info for {ticker}: {e}")
+    with open(out_dir / "info.json", "w") as f:
+        json.dump(info, f, indent=2)
+
+    return sorted(frames)
+
+
+_provider = None
+
+
+def get_provider():
+    """Return the process-wide provider selected by MARKET_DATA_PROVIDER"""
+    global _provider
+    if _provider is None:
+        name = os.getenv('MARKET_DATA_PROVIDER', 'yfinance')
+        if name == 'replay':
+            _provider = ReplayProvider(
+                root=os.getenv('MARKET_DATA_REPLAY_DIR', DEFAULT_REPLAY_DIR),
+                latency=float(os.getenv('MARKET_DATA_REPLAY_LATENCY', '0')),
+            )
+        elif name == 'yfinance':
+            _provider = YFinanceProvider()
+        else:
+            raise ValueError(f"Unknown MARKET_DATA_PROVIDER: {name}")
+    return _provider
+
+
+def set_provider(provider):
+    """Swap the process-wide provider (e.g. a ReplayProvider in perf tests)"""
+    global _provider
+    _provider = provider
@@ -0,0 +1,127 @@
+"""
+Versioned model registry
+
+Each trained model set is published into its own directory,
+<root>/<version>/, holding the three boosters, the feature list and
+model_metadata.json. The file <root>/ACTIVE names the version in use and is
+replaced atomically, so a process reading it sees either the old or the new
+version, never a partial one. Until a version is published, the models are
+read from the legacy training output (ml/models and ml/artifacts).
+"""
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+REGISTRY_DIR = BASE_DIR / "ml" / "registry"
+MODELS_DIR = BASE_DIR / "ml" / "models"
+ARTIFACTS_DIR = BASE_DIR / "ml" / "artifacts"
+
+MODEL_FILES = ("dir_model.txt", "vol_model.txt", "regime_model.txt")
+ARTIFACT_FILES = ("feature_cols.json", "model_metadata.json", "ticker_mapping.json")
+# Files a version cannot be loaded without
+REQUIRED_FILES = MODEL_FILES + ("feature_cols.json",)
+
+
+class RegistryError(Exception):
+    """Unknown or incomplete model version"""
+
+
+class ModelRegistry:
+    """Model versions under `root`, with the legacy training output as fallback"""
+
+    def __init__(self, root=REGISTRY_DIR, models_dir=MODELS_DIR, artifacts_dir=ARTIFACTS_DIR):
+        self.root = Path(root)
+        self.models_dir = Path(models_dir)
+        self.artifacts_dir = Path(artifacts_dir)
+        self.pointer = self.root / "ACTIVE"
+
+    def versions(self):
+        """Published versions, oldest first"""
+        if not self.root.exists():
+            return []
+        return sorted(
+            path.name for path in self.root.iterdir()
+            if path.is_dir() and not path.name.startswith('.') and all((path / name).exists() for name in REQUIRED_FILES)
+        )
+
+    def active_version(self):
+        """The version named by the ACTIVE pointer, or None"""
+        try:
+            return self.pointer.read_text().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def metadata(self, version):
+        """model_metadata.json of a version ({} if it has none)"""
+        path = self.root / version / "model_metadata.json"
+        if not path.exists():
+            return {}
+        with open(path) as f:
+            return json.load(f)
+
+    def resolve(self):
+        """
+        (version, models directory, artifacts directory) to load: the active
+        version, or the legacy training output versioned by its file stats.
+        """
+        version = self.active_version()
+        if version is not None:
+            directory = self.root / version
+            if not all((directory / name).exists() for name in REQUIRED_FILES):
+                raise RegistryError(f"Active model version {version} is missing or incomplete")
+            return version, directory, directory
+
+        stats = hashlib.sha1()
+        for path in [self.models_dir / name for name in MODEL_FILES] + [self.artifacts_dir / "feature_cols.json"]:
+            if path.exists():
+                stat = path.stat()
+                stats.update(f"{path.name}:{stat.st_size}:{stat.st_mtime_ns}".encode())
+        return f"legacy-{stats.hexdigest()[:8]}", self.models_dir, self.artifacts_dir
+
+    def publish(self, activate=True):
+        """
+        Copy the legacy training output into a new version directory and
+        (by default) activate it. Returns the version.
+        """
+        required = [self.models_dir / name for name in MODEL_FILES] + [self.artifacts_dir / "feature_cols.json"]
+        missing = [path.name for path in required if not path.exists()]
+        if missing:
+            raise RegistryError(f"Cannot publish, missing {', '.join(missing)}")
+        sources = [self.models_dir / name for name in MODEL_FILES]
+        sources += [self.artifacts_dir / name for name in ARTIFACT_FILES if (self.artifacts_dir / name).exists()]
+
+        digest = hashlib.sha1()
+        for path in sources:
+            digest.update(path.read_bytes())
+        version = f"{time.strftime('%Y%m%d-%H%M%S')}-{digest.hexdigest()[:8]}"
+
+        # Build the version in a hidden directory and rename it into place
+        self.root.mkdir(parents=True, exist_ok=True)
+        staging = Path(tempfile.mkdtemp(prefix=".publish-", dir=self.root))
+        os.chmod(staging, 0o755)
+        try:
+            for path in sources:
+                shutil.copy2(path, staging / path.name)
+            os.rename(staging, self.root / version)
+        except Exception:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+
+        if activate:
+            self.activate(version)
+        return version
+
+    def activate(self, version):
+        """Point ACTIVE at a published version"""
+        if version not in self.versions():
+            raise RegistryError(f"Unknown model version {version}")
+        self.root.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(prefix=".ACTIVE-", dir=self.root)
+        with os.fdopen(fd, "w") as f:
+            f.write(version + "\n")
+        os.replace(tmp, self.pointer)
@@ -0,0 +1,180 @@
+"""
+Achievement rules, grouped by the domain event that can change them.
+
+Trades, portfolio revaluations (P&L milestones), profile saves (XP and
+streak), scenario quiz results and stock predictions each emit an event
+(users/events.py); the achievement worker
+evaluates only the rule group for that event, and skips the group entirely
+once the user has unlocked every achievement in it. Newly unlocked
+achievements are pushed to the user's notification socket.
+"""
+import time
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.db.models import Sum
+
+from simulator.models import QuizRun, UserScenarioAttempt
+from .models import Achievement, DemoPortfolio, StockPredictionChallenge, UserAchievement, UserProfile
+
+XP_MILESTONES = [
+    ('xp_100', 100),
+    ('xp_500', 500),
+    ('xp_1000', 1000),
+    ('xp_2500', 2500),
+]
+STREAK_MILESTONES = [
+    ('streak_5', 5),
+    ('streak_10', 10),
+    ('streak_30', 30),
+]
+PREDICTION_MILESTONES = [
+    ('stock_predictor', 10),
+    ('stock_master', 50),
+]
+# Total P&L percent of the holdings
+PNL_MILESTONES = [
+    ('portfolio_pro', 10),
+    ('portfolio_master', 25),
+]
+# Seconds the set of active achievement ids is reused before it is re-read
+ACTIVE_IDS_TTL = 300
+
+_active_ids = (0.0, frozenset())
+
+
+def active_achievement_ids():
+    """Ids of the active achievements, re-read every ACTIVE_IDS_TTL seconds"""
+    global _active_ids
+    expires, ids = _active_ids
+    if time.monotonic() >= expires:
+        ids = frozenset(Achievement.objects.filter(is_active=True).values_list('id', flat=True))
+        _active_ids = (time.monotonic() + ACTIVE_IDS_TTL, ids)
+    return ids
+
+
+def _profile_rules(user, profile):
+    met = {ach_id for ach_id, threshold in XP_MILESTONES if profile.xp >= threshold}
+    met |= {ach_id for ach_id, days in STREAK_MILESTONES if profile.streak >= days}
+    return met
+
+
+def _trade_rules(user, profile):
+    portfolio = DemoPortfolio.objects.filter(user=user).first()
+    if portfolio is None:
+        return set()
+
+    met = set()
+    holdings = set(portfolio.positions.values_list('symbol', flat=True))
+    if holdings or portfolio.trades.exists():
+        met.add('first_trade')
+    if len(holdings) >= 5:
+        met.add('diversified')
+    return met
+
+
+def _portfolio_value_rules(user, profile):
+    portfolio = DemoPortfolio.objects.filter(user=user).first()
+    if portfolio is None:
+        return set()
+
+    from .portfolio_views import calculate_portfolio_data
+    total_pnl_percent = calculate_portfolio_data(portfolio).get('total_pnl_percent', 0)
+    return {ach_id for ach_id, threshold in PNL_MILESTONES if total_pnl_percent >= threshold}
+
+
+def _quiz_rules(user, profile):
+    met = set()
+    scenario_score = UserScenarioAttempt.objects.filter(user=user).aggregate(total=Sum('score_earned'))['total'] or 0
+    if scenario_score >= 1000:
+        met.add('scenario_master')
+
+    # Perfect run: 20 points for every scenario in it
+    completed = QuizRun.objects.filter(user=user, is_completed=True).values_list('scenario_ids', 'total_score')
+    for scenario_ids, total_score in completed:
+        scenario_count = len([pk for pk in (scenario_ids or '').split(',') if pk.strip()])
+        if total_score >= scenario_count * 20:
+            met.add('scenario_perfect')
+            break
+    return met
+
+
+def _prediction_rules(user, profile):
+    correct_count = StockPredictionChallenge.objects.filter(user=user, is_correct=True).count()
+    return {ach_id for ach_id, threshold in PREDICTION_MILESTONES if correct_count >= threshold}
+
+
+# {event: (achievement ids the event can unlock, rule)}
+RULES = {
+    'profile': ([ach_id for ach_id, _ in XP_MILESTONES + STREAK_MILESTONES], _profile_rules),
+    'trade': (['first_trade', 'diversified'], _trade_rules),
+    'portfolio_value': ([ach_id for ach_id, _ in PNL_MILESTONES], _portfolio_value_rules),
+    'quiz': (['scenario_master', 'scenario_perfect'], _quiz_rules),
+    'prediction': ([ach_id for ach_id, _ in PREDICTION_MILESTONES], _prediction_rules),
+}
+
+
+def evaluate_achievements(user, events=None):
+    """
+    Unlock the achievements whose rules are met and award their XP.
+    `events` limits evaluation to those rule groups; None evaluates all.
+    Returns the newly unlocked Achievements.
+    """
+    profile = UserProfile.objects.filter(user=user).first()
+    if profile is None:
+        return []
+
+    active = set(Achievement.objects.filter(is_active=True).values_list('id', flat=True))
+    unlocked_ids = set(UserAchievement.objects.filter(user=user).values_list('achievement_id', flat=True))
+
+    met = set()
+    for event in events or RULES:
+        if event not in RULES:
+            continue
+        ach_ids, rule = RULES[event]
+        pending = (set(ach_ids) & active) - unlocked_ids
+        if pending:
+            met |= rule(user, profile) & pending
+    if not met:
+        return []
+
+    unlocked = []
+    for achievement in Achievement.objects.filter(id__in=met):
+        _, created = UserAchievement.objects.get_or_create(user=user, achievement=achievement)
+        if created:
+            unlocked.append(achievement)
+
+    xp_reward = sum(achievement.xp_reward for achievement in unlocked)
+    if xp_reward > 0:
+        profile.xp += xp_reward
+        profile.save()
+    return unlocked
+
+
+def achievement_payload(achievement):
+    """Achievement as sent to clients"""
+    return {
+        'id': achievement.id,
+        'name': achievement.name,
+        'description': achievement.description,
+        'icon_name': achievement.icon_name,
+        'xp_reward': achievement.xp_reward,
+    }
+
+
+def notification_group(user_id):
+    return f'user_{user_id}'
+
+
+def push_unlocked(user_id, achievements):
+    """Push newly unlocked achievements to the user's open notification sockets"""
+    channel_layer = get_channel_layer()
+    if channel_layer is None or not achievements:
+        return
+    try:
+        async_to_sync(channel_layer.group_send)(notification_group(user_id), {
+            'type': 'achievements_unlocked',
+            'achievements': [achievement_payload(achievement) for achievement in achievements],
+        })
+    except Exception as e:
+        print(f"[ACHIEVEMENTS] Could not push unlocks to user {user_id}: {e}")
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import UserProfile, UserProgress, QuizAttempt, DemoPortfolio
+from .models import UserProfile, UserProgress, QuizAttempt, DemoPortfolio, Position, Trade, Order, PortfolioSnapshot
 
 
 @admin.register(UserProfile)
@@ -30,6 +30,39 @@ class QuizAttemptAdmin(admin.ModelAdmin):
 
 @admin.register(DemoPortfolio)
 class DemoPortfolioAdmin(admin.ModelAdmin):
-    list_display = ['user', 'total_value', 'created_at', 'updated_at']
+    list_display = ['user', 'total_value', 'day_change', 'day_change_percent', 'valued_at', 'created_at', 'updated_at']
     search_fields = ['user__username']
     readonly_fields = ['created_at', 'updated_at']
+
+
+@admin.register(Position)
+class PositionAdmin(admin.ModelAdmin):
+    list_display = ['portfolio', 'symbol', 'quantity', 'avg_price', 'updated_at']
+    search_fields = ['portfolio__user__username', 'symbol']
+    readonly_fields = ['created_at', 'updated_at']
+
+
+@admin.register(Trade)
+class TradeAdmin(admin.ModelAdmin):
+    list_display = ['portfolio', 'side', 'symbol', 'quantity', 'price', 'amount', 'realized_pnl', 'executed_at']
+    list_filter = ['side', 'executed_at']
+    search_fields = ['portfolio__user__username', 'symbol']
+    readonly_fields = ['executed_at']
+    ordering = ['-executed_at']
+
+
+@admin.register(Order)
+class OrderAdmin(admin.ModelAdmin):
+    list_display = ['portfolio', 'order_type', 'side', 'symbol', 'quantity', 'trigger_price', 'status', 'fill_price', 'created_at']
+    list_filter = ['status', 'order_type', 'side']
+    search_fields = ['portfolio__user__username', 'symbol']
+    readonly_fields = ['created_at', 'closed_at']
+    ordering = ['-created_at']
+
+
+@admin.register(PortfolioSnapshot)
+class PortfolioSnapshotAdmin(admin.ModelAdmin):
+    list_display = ['portfolio', 'resolution', 'value', 'taken_at']
+    list_filter = ['resolution', 'taken_at']
+    search_fields = ['portfolio__user__username']
+    ordering = ['-taken_at']
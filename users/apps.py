@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class UsersConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'users'
+
+    def ready(self):
+        from . import checks  # noqa: F401 - registers the system checks
+        from . import events  # noqa: F401 - connects the achievement event receivers
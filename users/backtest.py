@@ -0,0 +1,351 @@
+"""
+Vectorized strategy backtests over the OHLCV store.
+
+Closes for the chosen symbols are aligned into one T x N matrix and every
+parameter set of a strategy is evaluated at once as P x T x N arrays:
+rolling means and RSI come from cumulative sums, position state from a
+vectorized forward fill, equity from cumulative products. Nothing loops
+over bars in Python.
+
+Long/flat strategies give each symbol an equal, independent sleeve of the
+capital; a signal at one close is traded at the next bar, with a cost per
+position change. Results are stored per (normalized spec, data version)
+in the BacktestResult table, so identical backtests are answered from it
+until a refresh writes new bars. Runs happen in a Celery worker
+(run_backtest_task) and the web processes poll the same table.
+"""
+from datetime import timedelta
+import hashlib
+import itertools
+import json
+
+import numpy as np
+from django.utils import timezone
+
+from .ml_predictor import TICKERS
+from .models import BacktestResult
+from .ohlcv_store import OHLCV_STORE, YEAR_BARS, aligned_closes, series_version
+
+TRADING_DAYS = 252
+DEFAULT_DAYS = 2 * YEAR_BARS
+MAX_DAYS = 5 * YEAR_BARS
+MAX_SYMBOLS = 30
+MAX_PARAM_SETS = 50
+MAX_CURVE_POINTS = 250
+DEFAULT_CAPITAL = 100000.0
+DEFAULT_COST_BPS = 10
+BACKTEST_RESULT_TTL = 24 * 3600
+# A queued run that has not finished by then can be queued again
+PENDING_TTL = 600
+
+# Default value of every parameter; lists in a request expand to a grid
+STRATEGIES = {
+    'sma_crossover': {'fast': 20, 'slow': 50},
+    'rsi_bands': {'period': 14, 'lower': 30, 'upper': 70},
+    'equal_weight': {'rebalance_days': 21},
+}
+
+
+class BacktestError(Exception):
+    """Invalid backtest request or not enough history"""
+
+
+def _int_list(value, name, low, high):
+    values = value if isinstance(value, list) else [value]
+    try:
+        values = sorted({int(v) for v in values})
+    except (TypeError, ValueError):
+        raise BacktestError(f'{name} must be an integer or a list of integers')
+    if not values or values[0] < low or values[-1] > high:
+        raise BacktestError(f'{name} must be between {low} and {high}')
+    return values
+
+
+def param_grid(strategy, params):
+    """Expand a strategy's parameters (scalars or lists) into the valid parameter sets"""
+    if strategy not in STRATEGIES:
+        raise BacktestError(f'Unknown strategy: {strategy}. Use one of {", ".join(STRATEGIES)}')
+    params = {**STRATEGIES[strategy], **(params or {})}
+    if strategy == 'sma_crossover':
+        grid = {'fast': _int_list(params['fast'], 'fast', 2, 250), 'slow': _int_list(params['slow'], 'slow', 3, 250)}
+        valid = lambda p: p['fast'] < p['slow']
+    elif strategy == 'rsi_bands':
+        grid = {
+            'period': _int_list(params['period'], 'period', 2, 100),
+            'lower': _int_list(params['lower'], 'lower', 1, 99),
+            'upper': _int_list(params['upper'], 'upper', 1, 99),
+        }
+        valid = lambda p: p['lower'] < p['upper']
+    else:
+        grid = {'rebalance_days': _int_list(params['rebalance_days'], 'rebalance_days', 1, TRADING_DAYS)}
+        valid = lambda p: True
+
+    sets = [dict(zip(grid, values)) for values in itertools.product(*grid.values())]
+    sets = [p for p in sets if valid(p)]
+    if not sets:
+        raise BacktestError('No valid parameter combination')
+    if len(sets) > MAX_PARAM_SETS:
+        raise BacktestError(f'At most {MAX_PARAM_SETS} parameter sets per backtest ({len(sets)} requested)')
+    return sets
+
+
+def normalize_spec(data):
+    """Validate a backtest request and return its canonical spec dict"""
+    strategy = data.get('strategy', 'sma_crossover')
+    symbols = data.get('symbols') or [symbol for symbol in TICKERS if symbol != 'SPY']
+    if not isinstance(symbols, list):
+        raise BacktestError('symbols must be a list')
+    symbols = sorted({str(symbol).upper() for symbol in symbols})
+    if len(symbols) > MAX_SYMBOLS:
+        raise BacktestError(f'At most {MAX_SYMBOLS} symbols per backtest')
+    missing = [symbol for symbol in symbols if OHLCV_STORE.count(symbol) < 2]
+    if missing:
+        raise BacktestError(f'No stored history for {", ".join(missing)}')
+    try:
+        days = min(max(int(data.get('days', DEFAULT_DAYS)), 30), MAX_DAYS)
+        capital = float(data.get('initial_capital', DEFAULT_CAPITAL))
+        cost_bps = float(data.get('cost_bps', DEFAULT_COST_BPS))
+    except (TypeError, ValueError):
+        raise BacktestError('days, initial_capital and cost_bps must be numbers')
+    if capital <= 0 or not 0 <= cost_bps <= 500:
+        raise BacktestError('initial_capital must be positive and cost_bps between 0 and 500')
+    return {
+        'strategy': strategy,
+        'symbols': symbols,
+        'param_sets': param_grid(strategy, data.get('params')),
+        'days': days,
+        'initial_capital': capital,
+        'cost_bps': cost_bps,
+    }
+
+
+def backtest_key(spec):
+    """Key of a spec over the currently stored data"""
+    text = json.dumps(spec, sort_keys=True) + series_version(spec['symbols'])
+    return 'backtest:' + hashlib.sha1(text.encode()).hexdigest()[:24]
+
+
+# --- Indicators (T x N in, T x N out, NaN during warm-up) ---
+
+def rolling_mean(values, window):
+    """Trailing mean over `window` rows via a cumulative sum"""
+    csum = np.cumsum(np.vstack([np.zeros((1, values.shape[1])), values]), axis=0)
+    out = np.full(values.shape, np.nan)
+    out[window - 1:] = (csum[window:] - csum[:-window]) / window
+    return out
+
+
+def rsi(closes, period):
+    """RSI from simple moving averages of gains and losses (Cutler's RSI)"""
+    change = np.diff(closes, axis=0)
+    gains = rolling_mean(np.maximum(change, 0), period)
+    losses = rolling_mean(np.maximum(-change, 0), period)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        value = 100 - 100 / (1 + gains / losses)
+    value = np.where(losses == 0, np.where(gains > 0, 100.0, 50.0), value)
+    value[np.isnan(gains)] = np.nan
+    return np.vstack([np.full((1, closes.shape[1]), np.nan), value])
+
+
+def forward_fill(values, axis=1):
+    """Carry the last non-NaN value forward along `axis`; leading NaNs stay NaN"""
+    shape = [1] * values.ndim
+    shape[axis] = values.shape[axis]
+    index = np.where(~np.isnan(values), np.arange(values.shape[axis]).reshape(shape), 0)
+    np.maximum.accumulate(index, axis=axis, out=index)
+    return np.take_along_axis(values, index, axis=axis)
+
+
+# --- Strategies: closes (T x N) and parameter sets -> positions (P x T x N) or equity (P x T) ---
+
+def sma_crossover_positions(closes, param_sets):
+    windows = sorted({p['fast'] for p in param_sets} | {p['slow'] for p in param_sets})
+    means = np.stack([rolling_mean(closes, window) for window in windows])
+    fast = means[[windows.index(p['fast']) for p in param_sets]]
+    slow = means[[windows.index(p['slow']) for p in param_sets]]
+    with np.errstate(invalid='ignore'):
+        return (fast > slow).astype(float)
+
+
+def rsi_bands_positions(closes, param_sets):
+    periods = sorted({p['period'] for p in param_sets})
+    values = np.stack([rsi(closes, period) for period in periods])[[periods.index(p['period']) for p in param_sets]]
+    lower = np.array([p['lower'] for p in param_sets], dtype=float)[:, None, None]
+    upper = np.array([p['upper'] for p in param_sets], dtype=float)[:, None, None]
+    # Enter below the lower band, exit above the upper band, hold in between
+    with np.errstate(invalid='ignore'):
+        state = np.where(values < lower, 1.0, np.where(values > upper, 0.0, np.nan))
+    return np.nan_to_num(forward_fill(state, axis=1), nan=0.0)
+
+
+def long_flat_equity(closes, positions, cost):
+    """Equity (P x T, starting at 1) of equal sleeves trading long/flat positions"""
+    returns = closes[1:] / closes[:-1] - 1
+    held = positions[:, :-1]
+    turnover = np.abs(np.diff(positions, axis=1, prepend=0))[:, :-1]
+    sleeves = np.cumprod(1 + held * returns - cost * turnover, axis=1)
+    equity = sleeves.mean(axis=2)
+    trades = np.count_nonzero(turnover, axis=(1, 2))
+    exposure = held.mean(axis=(1, 2))
+    return np.hstack([np.ones((len(positions), 1)), equity]), trades, exposure
+
+
+def equal_weight_equity(closes, param_sets, cost):
+    """Equity (P x T, starting at 1) of an equal-weight portfolio rebalanced every k bars"""
+    T = len(closes)
+    t = np.arange(T)
+    k = np.array([p['rebalance_days'] for p in param_sets])[:, None]
+    last_rebalance = (t[None, :] // k) * k  # P x T
+    # Growth since the last rebalance, averaged over the equally weighted symbols
+    growth = (closes[None] / closes[last_rebalance]).mean(axis=2)
+    # Value carried into each rebalance: the full period's growth (rebalance cost on top)
+    is_rebalance = (t[None, :] % k == 0) & (t[None, :] > 0)
+    prev = np.maximum(t[None, :] - k, 0)
+    period_growth = np.where(is_rebalance, (closes[None] / closes[prev]).mean(axis=2) * (1 - cost), 1.0)
+    carried = np.cumprod(period_growth, axis=1)
+    equity = carried[np.arange(len(param_sets))[:, None], last_rebalance] * growth
+    rebalances = (T - 1) // k[:, 0]
+    return equity, rebalances * closes.shape[1], np.ones(len(param_sets))
+
+
+def equity_stats(equity):
+    """Return, risk and drawdown statistics for each equity curve (P x T)"""
+    T = equity.shape[1]
+    daily = equity[:, 1:] / equity[:, :-1] - 1
+    years = max((T - 1) / TRADING_DAYS, 1 / TRADING_DAYS)
+    vol = daily.std(axis=1, ddof=1) * np.sqrt(TRADING_DAYS)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        sharpe = np.where(vol > 0, daily.mean(axis=1) * TRADING_DAYS / vol, 0.0)
+
+    peak = np.maximum.accumulate(equity, axis=1)
+    drawdown = equity / peak - 1
+    t = np.arange(T)
+    last_peak = np.maximum.accumulate(np.where(equity >= peak, t, 0), axis=1)
+    return {
+        'total_return': equity[:, -1] - 1,
+        'cagr': np.maximum(equity[:, -1], 0) ** (1 / years) - 1,
+        'volatility': vol,
+        'sharpe': sharpe,
+        'max_drawdown': drawdown.min(axis=1),
+        'max_drawdown_days': (t - last_peak).max(axis=1),
+    }, drawdown
+
+
+def run_backtest(spec):
+    """Run a normalized spec and return the result dict"""
+    dates, closes = aligned_closes(spec['symbols'], spec['days'])
+    if len(dates) < 30:
+        raise BacktestError(f'Only {len(dates)} common trading days across {", ".join(spec["symbols"])}')
+
+    param_sets = spec['param_sets']
+    cost = spec['cost_bps'] / 10000
+    if spec['strategy'] == 'equal_weight':
+        equity, trades, exposure = equal_weight_equity(closes, param_sets, cost)
+    else:
+        positions = (sma_crossover_positions if spec['strategy'] == 'sma_crossover' else rsi_bands_positions)(closes, param_sets)
+        equity, trades, exposure = long_flat_equity(closes, positions, cost)
+
+    stats, drawdown = equity_stats(equity)
+    buy_hold = (closes / closes[0]).mean(axis=1)
+    capital = spec['initial_capital']
+    points = np.unique(np.linspace(0, len(dates) - 1, min(len(dates), MAX_CURVE_POINTS)).round().astype(int))
+    curve_dates = [str(date) for date in dates[points]]
+
+    runs = []
+    for i, params in enumerate(param_sets):
+        runs.append({
+            'params': params,
+            'final_value': round(float(equity[i, -1] * capital), 2),
+            'total_return': round(float(stats['total_return'][i]) * 100, 2),
+            'cagr': round(float(stats['cagr'][i]) * 100, 2),
+            'volatility': round(float(stats['volatility'][i]) * 100, 2),
+            'sharpe': round(float(stats['sharpe'][i]), 3),
+            'max_drawdown': round(float(stats['max_drawdown'][i]) * 100, 2),
+            'max_drawdown_days': int(stats['max_drawdown_days'][i]),
+            'trades': int(trades[i]),
+            'exposure': round(float(exposure[i]) * 100, 1),
+            'equity': np.round(equity[i, points] * capital, 2).tolist(),
+            'drawdown': np.round(drawdown[i, points] * 100, 2).tolist(),
+        })
+
+    best = max(range(len(runs)), key=lambda i: runs[i]['sharpe'])
+    return {
+        'strategy': spec['strategy'],
+        'symbols': spec['symbols'],
+        'start_date': str(dates[0]),
+        'end_date': str(dates[-1]),
+        'bars': int(len(dates)),
+        'initial_capital': capital,
+        'cost_bps': spec['cost_bps'],
+        'dates': curve_dates,
+        'buy_and_hold': {
+            'total_return': round(float(buy_hold[-1] - 1) * 100, 2),
+            'equity': np.round(buy_hold[points] * capital, 2).tolist(),
+        },
+        'best': best,
+        'runs': runs,
+    }
+
+
+def _expired(row, now=None):
+    """Whether a stored row no longer counts: a stale pending run or an old result"""
+    ttl = PENDING_TTL if row.status == 'pending' else BACKTEST_RESULT_TTL
+    return row.updated_at < (now or timezone.now()) - timedelta(seconds=ttl)
+
+
+def get_result(key):
+    """Stored result for a backtest key: {'status': 'done'|'error'|'pending', ...} or None"""
+    row = BacktestResult.objects.filter(key=key).first()
+    if row is None or _expired(row):
+        return None
+    return {'status': row.status, **row.result}
+
+
+def store_result(key, spec):
+    """Run a spec and store its outcome under `key`"""
+    try:
+        result = {'status': 'done', 'result': run_backtest(spec)}
+    except BacktestError as e:
+        result = {'status': 'error', 'error': str(e)}
+    outcome = {name: value for name, value in result.items() if name != 'status'}
+    BacktestResult.objects.update_or_create(key=key, defaults={'status': result['status'], 'result': outcome})
+    return result
+
+
+def clear_pending(key):
+    """Drop a queued run that will not finish, so the spec can be queued again"""
+    BacktestResult.objects.filter(key=key, status='pending').delete()
+
+
+def request_backtest(spec):
+    """
+    Return (key, stored result or None). A miss queues the run on the
+    Celery worker unless the same spec is already queued.
+    """
+    key = backtest_key(spec)
+    result = get_result(key)
+    if result is not None:
+        return key, result
+
+    # Claim the key: a new row, or an expired one taken over by exactly one request
+    row, claimed = BacktestResult.objects.get_or_create(key=key)
+    if not claimed and _expired(row):
+        claimed = BacktestResult.objects.filter(pk=row.pk, updated_at=row.updated_at).update(
+            status='pending', result={}, updated_at=timezone.now(),
+        ) == 1
+
+    if claimed:
+        try:
+            from .tasks import run_backtest_task
+            run_backtest_task.delay(key, spec)
+        except Exception:
+            clear_pending(key)
+            raise
+    return key, {'status': 'pending'}
+
+
+def purge_backtest_results():
+    """Delete results and pending runs that have expired. Returns the number deleted."""
+    cutoff = timezone.now() - timedelta(seconds=max(BACKTEST_RESULT_TTL, PENDING_TTL))
+    deleted, _ = BacktestResult.objects.filter(updated_at__lt=cutoff).delete()
+    return deleted
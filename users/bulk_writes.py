@@ -0,0 +1,58 @@
+"""
+Bulk row writes for the background jobs that rewrite thousands of rows at a time.
+
+bulk_update() builds a CASE expression per row and field, which costs
+seconds at thousands of rows; one executemany UPDATE keeps the write linear.
+"""
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+
+
+def executemany_update(model, fields, rows, prepare=True, using=DEFAULT_DB_ALIAS):
+    """
+    Update many rows of `model` in one executemany UPDATE.
+    `rows` are (pk, value, ...) tuples with one value per field. With
+    prepare=False the values must already be database-ready (e.g. floats
+    for decimal columns), which skips the per-value field conversion.
+    """
+    connection = connections[using]
+    meta = model._meta
+    columns = [meta.get_field(name) for name in fields]
+    qn = connection.ops.quote_name
+    sql = 'UPDATE {} SET {} WHERE {} = %s'.format(
+        qn(meta.db_table),
+        ', '.join(f'{qn(field.column)} = %s' for field in columns),
+        qn(meta.pk.column),
+    )
+
+    if prepare:
+        params = [
+            [field.get_db_prep_save(field.to_python(value), connection) for field, value in zip(columns, row[1:])]
+            + [row[0]]
+            for row in rows
+        ]
+    else:
+        params = [list(row[1:]) + [row[0]] for row in rows]
+
+    with transaction.atomic(using=using), connection.cursor() as cursor:
+        cursor.executemany(sql, params)
+    return len(params)
+
+
+def executemany_insert(model, fields, rows, using=DEFAULT_DB_ALIAS):
+    """
+    Insert many rows of `model` in one executemany INSERT.
+    `rows` are database-ready value tuples, one value per field.
+    """
+    connection = connections[using]
+    meta = model._meta
+    qn = connection.ops.quote_name
+    sql = 'INSERT INTO {} ({}) VALUES ({})'.format(
+        qn(meta.db_table),
+        ', '.join(qn(meta.get_field(name).column) for name in fields),
+        ', '.join(['%s'] * len(fields)),
+    )
+
+    params = [list(row) for row in rows]
+    with transaction.atomic(using=using), connection.cursor() as cursor:
+        cursor.executemany(sql, params)
+    return len(params)
@@ -312,10 +312,6 @@ def submit_stock_prediction(request):
                     leaderboard_entry.current_streak = 0
                 leaderboard_entry.save()
                 
-                # Check for achievements
-                from .achievement_views import check_and_unlock_achievements
-                check_and_unlock_achievements(request.user)
-                
                 return Response({
                     'success': True,
                     'score': score,
@@ -341,24 +337,9 @@ def submit_stock_prediction(request):
         if not stock_info or stock_info.get('current_price', 0.0) <= 0.0:
             return Response({'error': 'Stock not found or data unavailable'}, status=404)
         
-        # Get stock detail with price history using helper functions
+        # Get price history from the OHLCV store (a stale quote only queues a background refresh)
         from .portfolio_views import generate_price_history
-        from .models import PredictedStockData
-        from django.utils import timezone
-        
-        # Try to get price history from cache first
-        price_history = []
-        try:
-            cached = PredictedStockData.objects.get(symbol=stock_symbol)
-            cache_age = timezone.now() - cached.last_updated
-            if cache_age.total_seconds() < 600:  # 10 minutes
-                price_history = cached.price_history or []
-        except PredictedStockData.DoesNotExist:
-            pass
-        
-        # If no cached history, generate it
-        if not price_history:
-            price_history = generate_price_history(stock_symbol, days=60, use_cache=False)
+        price_history = generate_price_history(stock_symbol, days=60)
         
         if not price_history:
             return Response({'error': 'Price history not available for this stock'}, status=404)
@@ -367,8 +348,8 @@ def submit_stock_prediction(request):
         ai_direction = analyze_stock_trend(stock_symbol, price_history)
         
         # Also get ML prediction for more accurate analysis
-        from .ml_predictor import ML_PREDICTOR
-        ml_prediction = ML_PREDICTOR.predict(stock_symbol)
+        from .prediction_cache import serve_prediction
+        ml_prediction = serve_prediction(stock_symbol) or {}
         ml_direction = ml_prediction.get('direction', 'neutral')
         
         # Use ML prediction if available, otherwise use trend analysis
@@ -0,0 +1,26 @@
+"""
+System checks for the users app, run by manage.py (runserver, migrate, check).
+"""
+from django.conf import settings
+from django.core.checks import Warning, register
+
+# Backends whose entries are private to one process
+PROCESS_LOCAL_CACHES = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+@register()
+def shared_cache_check(app_configs, **kwargs):
+    """Warn when the default cache cannot be shared by the web and Celery processes"""
+    backend = settings.CACHES.get('default', {}).get('BACKEND')
+    if backend not in PROCESS_LOCAL_CACHES:
+        return []
+    return [Warning(
+        'The default cache is process-local, so the provider rate limit and circuit '
+        'breaker, refresh de-duplication and quote invalidation only apply within '
+        'each process.',
+        hint='Set REDIS_CACHE_URL to share the cache across web and Celery workers.',
+        id='users.W001',
+    )]
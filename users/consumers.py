@@ -0,0 +1,35 @@
+import json
+from channels.generic.websocket import AsyncWebsocketConsumer
+
+from .achievements import notification_group
+
+
+class NotificationConsumer(AsyncWebsocketConsumer):
+    """Per-user socket for pushed notifications (achievement unlocks)"""
+
+    async def connect(self):
+        user = self.scope.get('user')
+        if user is None or not user.is_authenticated:
+            await self.close()
+            return
+        self.group_name = notification_group(user.id)
+
+        await self.channel_layer.group_add(
+            self.group_name,
+            self.channel_name
+        )
+
+        await self.accept()
+
+    async def disconnect(self, close_code):
+        if hasattr(self, 'group_name'):
+            await self.channel_layer.group_discard(
+                self.group_name,
+                self.channel_name
+            )
+
+    async def achievements_unlocked(self, event):
+        await self.send(text_data=json.dumps({
+            'type': 'achievements_unlocked',
+            'data': event['achievements']
+        }))
@@ -0,0 +1,133 @@
+"""
+Custom stock tick engine - advances every simulated CustomStock in one numpy batch.
+
+Each tick moves prices by geometric Brownian motion with drift, using the
+stock's daily `volatility` and a drift from its `trend` and `trend_strength`.
+Custom stocks trade on the NSE session: ticks outside it are skipped, so a
+simulated day is the session's minutes and not the whole clock day.
+The tick updates the forming daily bar in the OHLCV store (a new bar starts
+each day), writes all quotes in one batched UPDATE and keeps the history
+bounded.
+"""
+import numpy as np
+from django.utils import timezone
+
+from .bulk_writes import executemany_update
+from .market_clock import CUSTOM_STOCK_EXCHANGE, EXCHANGES, is_open
+from .models import CustomStock
+from .ohlcv_store import OHLCV_DTYPE, OHLCV_STORE, YEAR_BARS, build_summary
+from .quotes import invalidate_quotes
+
+# Seconds between beat ticks (tick-custom-stocks-every-minute)
+TICK_SECONDS = 60
+# Ticks that make up one simulated trading day (one a minute over the session -> 375)
+SESSION = EXCHANGES[CUSTOM_STOCK_EXCHANGE]
+TICKS_PER_DAY = (
+    (SESSION['close'].hour * 60 + SESSION['close'].minute)
+    - (SESSION['open'].hour * 60 + SESSION['open'].minute)
+) * 60 // TICK_SECONDS
+# Daily drift at trend_strength 1.0
+DAILY_DRIFT = 0.005
+# Volume traded per tick
+TICK_VOLUME = (1_000, 25_000)
+# Bars kept per symbol; the store is compacted once it grows past this plus some slack
+HISTORY_RETENTION_BARS = 2 * YEAR_BARS
+RETENTION_SLACK_BARS = 20
+MIN_PRICE = 0.01
+
+TREND_SIGN = {'bullish': 1.0, 'bearish': -1.0}
+
+
+def _rolling_ma(prior_closes, closes, window):
+    """MA over the last window-1 prior closes plus the new close (NaN if too short)"""
+    tail = prior_closes[:, -(window - 1):]
+    have = np.count_nonzero(~np.isnan(tail), axis=1)
+    total = np.nansum(tail, axis=1) + closes
+    return np.where(have >= window - 1, total / window, np.nan)
+
+
+def tick_custom_stocks(now=None, rng=None):
+    """
+    Advance every custom stock by one tick. Returns the number of stocks ticked
+    (0 while the market is closed).
+    """
+    now = now or timezone.now()
+    if not is_open(CUSTOM_STOCK_EXCHANGE, now):
+        return 0
+    rng = rng or np.random.default_rng()
+    stocks = list(CustomStock.objects.only(
+        'id', 'symbol', 'current_price', 'volatility', 'trend', 'trend_strength', 'summary',
+    ))
+    n = len(stocks)
+    if n == 0:
+        return 0
+
+    # --- Price step for the whole universe ---
+    dt = 1.0 / TICKS_PER_DAY
+    prices = np.array([float(s.current_price) for s in stocks])
+    sigma = np.array([s.volatility for s in stocks])
+    mu = np.array([TREND_SIGN.get(s.trend, 0.0) * s.trend_strength * DAILY_DRIFT for s in stocks])
+    shocks = rng.standard_normal(n)
+    new_prices = prices * np.exp((mu - 0.5 * sigma ** 2) * dt + sigma * np.sqrt(dt) * shocks)
+    new_prices = np.maximum(np.round(new_prices, 2), MIN_PRICE)
+    volumes = rng.integers(*TICK_VOLUME, size=n)
+
+    # --- Gather the forming bar and the closes before it ---
+    today = np.datetime64(now.astimezone(SESSION['tz']).date(), 'D')
+    last_bars = np.zeros(n, dtype=OHLCV_DTYPE)
+    forming = np.zeros(n, dtype=bool)
+    prior_closes = np.full((n, 49), np.nan)
+    for i, stock in enumerate(stocks):
+        recent = OHLCV_STORE.read(stock.symbol, days=50)
+        if len(recent) and recent['date'][-1] == today:
+            forming[i] = True
+            last_bars[i] = recent[-1]
+            recent = recent[:-1]
+        recent = recent[-49:]
+        if len(recent):
+            prior_closes[i, 49 - len(recent):] = recent['close']
+
+    # --- Build today's bars: extend the forming bar or open a new one at the last price ---
+    bars = np.empty(n, dtype=OHLCV_DTYPE)
+    bars['date'] = today
+    bars['open'] = np.where(forming, last_bars['open'], prices)
+    bars['high'] = np.where(forming, np.maximum(last_bars['high'], new_prices), np.maximum(prices, new_prices))
+    bars['low'] = np.where(forming, np.minimum(last_bars['low'], new_prices), np.minimum(prices, new_prices))
+    bars['close'] = new_prices
+    bars['volume'] = np.where(forming, last_bars['volume'], 0) + volumes
+    bars['ma20'] = _rolling_ma(prior_closes, new_prices, 20)
+    bars['ma50'] = _rolling_ma(prior_closes, new_prices, 50)
+    change_percent = np.round((new_prices - bars['open']) / bars['open'] * 100, 2)
+
+    # --- Write history and quotes ---
+    for i, stock in enumerate(stocks):
+        symbol = stock.symbol
+        OHLCV_STORE.append(symbol, bars[i:i + 1])
+        price = float(new_prices[i])
+
+        if forming[i] and stock.summary:
+            # Same day: fold the tick into the stored summary
+            summary = stock.summary
+            for key in ('high', 'high_52w'):
+                summary[key] = round(max(summary.get(key, price), price), 2)
+            for key in ('low', 'low_52w'):
+                summary[key] = round(min(summary.get(key, price), price), 2)
+            summary['ma20'] = None if np.isnan(bars['ma20'][i]) else round(float(bars['ma20'][i]), 2)
+            summary['ma50'] = None if np.isnan(bars['ma50'][i]) else round(float(bars['ma50'][i]), 2)
+        else:
+            # New day: compact the history if needed and rebuild the summary
+            if OHLCV_STORE.count(symbol) > HISTORY_RETENTION_BARS + RETENTION_SLACK_BARS:
+                OHLCV_STORE.replace(symbol, OHLCV_STORE.read(symbol, days=HISTORY_RETENTION_BARS))
+            summary = build_summary(OHLCV_STORE.read(symbol, days=YEAR_BARS), price)
+
+        stock.current_price = price
+        stock.change_percent = float(change_percent[i])
+        stock.summary = summary
+        stock.last_updated = now
+
+    executemany_update(
+        CustomStock, ['current_price', 'change_percent', 'summary', 'last_updated'],
+        [(stock.pk, stock.current_price, stock.change_percent, stock.summary, stock.last_updated) for stock in stocks],
+    )
+    invalidate_quotes()
+    return n
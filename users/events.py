@@ -0,0 +1,118 @@
+"""
+Domain events for the achievement worker.
+
+Saves of the models that achievements depend on emit an event once the
+surrounding transaction commits, and portfolio revaluation emits one when a
+user's P&L reaches a milestone they have not unlocked yet. The events of a
+transaction are collected per user and queue one evaluate_achievements_task
+per user on commit - a basket of N legs is evaluated once, not N times - so
+achievement checks never run inside the request that made the change.
+Receivers are connected in UsersConfig.ready().
+"""
+from django.db import transaction
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from simulator.models import QuizRun, UserScenarioAttempt
+from .achievements import PNL_MILESTONES, active_achievement_ids
+from .models import DemoPortfolio, StockPredictionChallenge, Trade, UserAchievement, UserProfile
+
+
+class EventBatch:
+    """Events emitted in one transaction, {user id: event names}, dispatched on commit"""
+
+    def __init__(self):
+        self.events = {}
+
+    def add(self, user_id, event):
+        self.events.setdefault(user_id, set()).add(event)
+
+    def __call__(self):
+        for user_id, events in self.events.items():
+            _dispatch(user_id, sorted(events))
+
+
+def emit(user_id, event):
+    """Queue achievement evaluation of `event` rules for a user after commit"""
+    connection = transaction.get_connection()
+    if not connection.in_atomic_block:
+        _dispatch(user_id, [event])
+        return
+    # One batch per transaction: reuse it while its commit hook is still registered
+    # (a rollback drops the hook along with the events it would have sent)
+    batch = getattr(connection, 'achievement_events', None)
+    if batch is None or not any(entry[1] is batch for entry in connection.run_on_commit):
+        batch = connection.achievement_events = EventBatch()
+        transaction.on_commit(batch)
+    batch.add(user_id, event)
+
+
+def _dispatch(user_id, events):
+    try:
+        from .tasks import evaluate_achievements_task
+        evaluate_achievements_task.delay(user_id, events)
+    except Exception as e:
+        # Broker unavailable - evaluate inline rather than lose the unlock
+        print(f"[ACHIEVEMENTS] Could not queue {', '.join(events)} events for user {user_id}, evaluating inline: {e}")
+        from django.contrib.auth.models import User
+        from .achievements import evaluate_achievements, push_unlocked
+        user = User.objects.filter(pk=user_id).first()
+        if user is not None:
+            push_unlocked(user_id, evaluate_achievements(user, events))
+
+
+def portfolio_values_changed(pnl_percent):
+    """
+    Emit portfolio_value events after a revaluation, given {user id: total
+    P&L percent}, for the users with a profile who have reached an active
+    P&L milestone they have not unlocked yet - milestones that cannot
+    unlock do not queue an evaluation on every revaluation.
+    """
+    active = active_achievement_ids()
+    reached = {
+        user_id: {ach_id for ach_id, threshold in PNL_MILESTONES if percent >= threshold and ach_id in active}
+        for user_id, percent in pnl_percent.items()
+    }
+    reached = {user_id: ach_ids for user_id, ach_ids in reached.items() if ach_ids}
+    if not reached:
+        return 0
+    with_profile = set(UserProfile.objects.filter(user_id__in=reached).values_list('user_id', flat=True))
+    unlocked = set(UserAchievement.objects.filter(
+        user_id__in=with_profile, achievement_id__in=[ach_id for ach_id, _ in PNL_MILESTONES],
+    ).values_list('user_id', 'achievement_id'))
+    emitted = 0
+    for user_id, ach_ids in reached.items():
+        if user_id in with_profile and any((user_id, ach_id) not in unlocked for ach_id in ach_ids):
+            emit(user_id, 'portfolio_value')
+            emitted += 1
+    return emitted
+
+
+@receiver(post_save, sender=Trade, dispatch_uid='achievement_events_trade')
+def trade_executed(sender, instance, created, **kwargs):
+    if created:
+        user_id = DemoPortfolio.objects.filter(pk=instance.portfolio_id).values_list('user_id', flat=True).first()
+        emit(user_id, 'trade')
+        emit(user_id, 'portfolio_value')
+
+
+@receiver(post_save, sender=UserProfile, dispatch_uid='achievement_events_profile')
+def profile_saved(sender, instance, **kwargs):
+    emit(instance.user_id, 'profile')
+
+
+@receiver(post_save, sender=UserScenarioAttempt, dispatch_uid='achievement_events_scenario_attempt')
+def scenario_attempt_saved(sender, instance, **kwargs):
+    emit(instance.user_id, 'quiz')
+
+
+@receiver(post_save, sender=QuizRun, dispatch_uid='achievement_events_quiz_run')
+def quiz_run_saved(sender, instance, **kwargs):
+    if instance.is_completed:
+        emit(instance.user_id, 'quiz')
+
+
+@receiver(post_save, sender=StockPredictionChallenge, dispatch_uid='achievement_events_prediction')
+def prediction_saved(sender, instance, created, **kwargs):
+    if created:
+        emit(instance.user_id, 'prediction')
@@ -0,0 +1,109 @@
+"""
+Idempotent trade requests.
+
+Clients send an Idempotency-Key header with trade requests. The first
+request with a key runs the view and stores its response in the same
+transaction as the trades it made, so a retry after a dropped connection
+replays the stored response instead of trading twice. Server errors are
+rolled back together with the key, so the retry runs again.
+"""
+import hashlib
+import json
+from datetime import timedelta
+from functools import wraps
+
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework.response import Response
+
+from .models import IdempotencyKey
+
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+# Keys can be reused for a new request after this long
+IDEMPOTENCY_TTL = timedelta(hours=24)
+
+
+class _RollBack(Exception):
+    """Carries a server error response out of the transaction so it is rolled back"""
+
+    def __init__(self, response):
+        super().__init__()
+        self.response = response
+
+
+def request_fingerprint(request):
+    """sha256 of the request's method, path and body"""
+    body = json.dumps(request.data, sort_keys=True, default=str)
+    return hashlib.sha256(f'{request.method} {request.path}\n{body}'.encode()).hexdigest()
+
+
+def _replay(record, fingerprint):
+    if record.request_hash != fingerprint:
+        return Response({'error': f'{IDEMPOTENCY_HEADER} was already used for a different request'}, status=422)
+    response = Response(record.response, status=record.status_code)
+    response['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def _in_flight():
+    """Retryable answer for a key whose first request has not committed"""
+    response = Response(
+        {'error': f'A request with this {IDEMPOTENCY_HEADER} is in progress or failed, retry shortly'},
+        status=409,
+    )
+    response['Retry-After'] = '1'
+    return response
+
+
+def idempotent(view):
+    """
+    Make a POST view idempotent per (user, Idempotency-Key). Requests
+    without the header run as before. Apply below @api_view so the view
+    receives the DRF request.
+    """
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        key = request.headers.get(IDEMPOTENCY_HEADER)
+        if not key or request.method != 'POST':
+            return view(request, *args, **kwargs)
+        if len(key) > 64:
+            return Response({'error': f'{IDEMPOTENCY_HEADER} must be at most 64 characters'}, status=400)
+
+        fingerprint = request_fingerprint(request)
+        IdempotencyKey.objects.filter(
+            user=request.user, key=key, created_at__lt=timezone.now() - IDEMPOTENCY_TTL,
+        ).delete()
+
+        try:
+            with transaction.atomic():
+                try:
+                    with transaction.atomic():
+                        record = IdempotencyKey.objects.create(user=request.user, key=key, request_hash=fingerprint)
+                except IntegrityError:
+                    # Seen before - a concurrent first attempt has committed by now
+                    record = None
+                if record is None:
+                    existing = IdempotencyKey.objects.filter(user=request.user, key=key).first()
+                    if existing is None:
+                        # The attempt that held the key rolled back - this retry may run it again
+                        return _in_flight()
+                    return _replay(existing, fingerprint)
+
+                response = view(request, *args, **kwargs)
+                if response.status_code >= 500:
+                    raise _RollBack(response)
+                record.status_code = response.status_code
+                record.response = response.data
+                record.save(update_fields=['status_code', 'response'])
+                return response
+        except _RollBack as e:
+            return e.response
+
+    return wrapper
+
+
+def purge_idempotency_keys(now=None):
+    """Delete expired keys. Returns the number deleted."""
+    now = now or timezone.now()
+    deleted, _ = IdempotencyKey.objects.filter(created_at__lt=now - IDEMPOTENCY_TTL).delete()
+    return deleted
@@ -57,10 +57,10 @@ class Command(BaseCommand):
                 if achievement.id == 'first_trade':
                     try:
                         portfolio = DemoPortfolio.objects.get(user=user)
-                        holdings = portfolio.holdings or {}
+                        holdings = portfolio.positions.all()
                         should_be_unlocked = len(holdings) > 0
                         if not should_be_unlocked:
-                            reason.append('No portfolio holdings')
+                            reason.append('No portfolio positions')
                     except DemoPortfolio.DoesNotExist:
                         reason.append('No portfolio')
                 
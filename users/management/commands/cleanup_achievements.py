@@ -30,7 +30,7 @@ class Command(BaseCommand):
                 if achievement.id == 'first_trade':
                     try:
                         portfolio = DemoPortfolio.objects.get(user=user)
-                        holdings = portfolio.holdings or {}
+                        holdings = portfolio.positions.all()
                         should_be_unlocked = len(holdings) > 0
                     except DemoPortfolio.DoesNotExist:
                         should_be_unlocked = False
@@ -66,7 +66,7 @@ class Command(BaseCommand):
                 elif achievement.id == 'diversified':
                     try:
                         portfolio = DemoPortfolio.objects.get(user=user)
-                        holdings = portfolio.holdings or {}
+                        holdings = portfolio.positions.all()
                         should_be_unlocked = len(holdings) >= 5
                     except DemoPortfolio.DoesNotExist:
                         should_be_unlocked = False
@@ -8,6 +8,8 @@ from datetime import timedelta
 import random
 import math
 from users.models import CustomStock
+from users.ohlcv_store import OHLCV_STORE, build_summary, records_from_history
+from users.quotes import invalidate_quotes
 
 
 class Command(BaseCommand):
@@ -275,6 +277,10 @@ class Command(BaseCommand):
             else:
                 change_percent = 0.0
             
+            # Regenerated history replaces whatever the OHLCV store held for this symbol
+            records = records_from_history(price_history)
+            OHLCV_STORE.replace(stock_data['symbol'], records)
+            
             # Create or update stock
             stock, created = CustomStock.objects.update_or_create(
                 symbol=stock_data['symbol'],
@@ -289,7 +295,8 @@ class Command(BaseCommand):
                     'volatility': stock_data['volatility'],
                     'trend': stock_data['trend'],
                     'trend_strength': stock_data['trend_strength'],
-                    'price_history': price_history,
+                    'price_history': [],  # History lives in the OHLCV store
+                    'summary': build_summary(records, current_price),
                     'currency': 'INR',
                     'market_cap': market_cap,
                 }
@@ -302,6 +309,8 @@ class Command(BaseCommand):
                 updated_count += 1
                 self.stdout.write(self.style.SUCCESS(f'  ✓ Updated {stock.symbol}: {stock.name} - ₹{stock.current_price}'))
         
+        invalidate_quotes()
+        
         self.stdout.write(self.style.SUCCESS(
             f'\n✅ Custom Stocks Created!\n'
             f'  Created: {created_count}\n'
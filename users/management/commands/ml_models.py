@@ -0,0 +1,49 @@
+"""
+Django management command to manage versions in the ML model registry.
+
+Usage:
+    python manage.py ml_models                      # list versions
+    python manage.py ml_models --publish            # publish ml/models + ml/artifacts as a new active version
+    python manage.py ml_models --activate VERSION   # switch (or roll back) to a published version
+
+Running processes pick up the active version within ML_MODEL_CHECK_SECONDS.
+"""
+
+from django.core.management.base import BaseCommand, CommandError
+from ml.registry import RegistryError
+from users.ml_predictor import ML_PREDICTOR
+
+
+class Command(BaseCommand):
+    help = 'List, publish and activate versions in the ML model registry'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--publish', action='store_true', help='Publish the current training output as a new version')
+        parser.add_argument('--no-activate', action='store_true', help='With --publish, do not activate the new version')
+        parser.add_argument('--activate', type=str, metavar='VERSION', help='Make a published version active')
+
+    def handle(self, *args, **options):
+        registry = ML_PREDICTOR.registry
+        try:
+            if options['publish']:
+                version = registry.publish(activate=not options['no_activate'])
+                self.stdout.write(self.style.SUCCESS(f"Published model version {version}"))
+            if options['activate']:
+                registry.activate(options['activate'])
+                self.stdout.write(self.style.SUCCESS(f"Activated model version {options['activate']}"))
+        except RegistryError as e:
+            raise CommandError(str(e))
+
+        active = registry.active_version()
+        versions = registry.versions()
+        if not versions:
+            self.stdout.write('No published versions - serving the models in ml/models')
+            return
+        for version in versions:
+            metadata = registry.metadata(version)
+            accuracy = metadata.get('models', {}).get('direction', {}).get('accuracy')
+            details = f"trained {metadata.get('training_date', '?')}"
+            if accuracy is not None:
+                details += f", direction accuracy {accuracy:.3f}"
+            marker = '*' if version == active else ' '
+            self.stdout.write(f" {marker} {version}  ({details})")
@@ -0,0 +1,34 @@
+"""
+Django management command to record market data fixtures for the replay provider.
+
+Usage:
+    python manage.py record_market_data
+    python manage.py record_market_data --symbol AAPL --period 1y --out ml/fixtures
+
+Then run with MARKET_DATA_PROVIDER=replay to serve the recorded data offline.
+"""
+
+from django.core.management.base import BaseCommand
+from ml.market_data import DEFAULT_REPLAY_DIR, record_fixtures
+from users.ml_predictor import ML_PREDICTOR, TICKERS
+
+
+class Command(BaseCommand):
+    help = 'Record OHLCV and metadata fixtures from yfinance for the replay market data provider'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--symbol', type=str, help='Record a specific symbol only (optional)')
+        parser.add_argument('--period', type=str, default='2y', help='History to record (default: 2y)')
+        parser.add_argument('--out', type=str, default=str(DEFAULT_REPLAY_DIR), help='Fixture directory')
+
+    def handle(self, *args, **options):
+        symbols = [options['symbol']] if options.get('symbol') else TICKERS
+        full_tickers = [ML_PREDICTOR._get_full_ticker(symbol) for symbol in symbols]
+
+        self.stdout.write(f"Recording {len(full_tickers)} tickers ({options['period']}) to {options['out']}...")
+        recorded = record_fixtures(full_tickers, out_dir=options['out'], period=options['period'])
+
+        missing = sorted(set(full_tickers) - set(recorded))
+        if missing:
+            self.stdout.write(self.style.WARNING(f"No data for: {', '.join(missing)}"))
+        self.stdout.write(self.style.SUCCESS(f"Recorded {len(recorded)} tickers"))
@@ -69,6 +69,11 @@ class Command(BaseCommand):
                 return
             
             self.stdout.write(self.style.SUCCESS('✓ Models trained successfully!'))
+            
+            # Publish to the model registry - running processes hot-reload the new version
+            from users.ml_predictor import ML_PREDICTOR
+            version = ML_PREDICTOR.registry.publish()
+            self.stdout.write(self.style.SUCCESS(f'✓ Published and activated model version {version}'))
                 
         except Exception as e:
             self.stdout.write(self.style.ERROR(f'Error in model training: {e}'))
@@ -79,5 +84,5 @@ class Command(BaseCommand):
         self.stdout.write('\n' + '='*70)
         self.stdout.write(self.style.SUCCESS('TRAINING COMPLETE!'))
         self.stdout.write('='*70)
-        self.stdout.write('\nModels are now available for predictions.')
+        self.stdout.write('\nRunning processes switch to the new models within ML_MODEL_CHECK_SECONDS.')
 
@@ -0,0 +1,157 @@
+"""
+Market clock - trading sessions and holidays for the exchanges we track.
+
+Used by the refresh scheduler to decide how often each symbol needs new data
+and by the quote serving layer to decide when a quote counts as stale: while
+an exchange is closed its last post-close quote stays fresh until the next open.
+"""
+from datetime import date, datetime, time, timedelta
+import json
+from pathlib import Path
+from zoneinfo import ZoneInfo
+
+from django.conf import settings
+from django.utils import timezone
+
+from .ml_predictor import NSE_TICKERS
+
+# Regular sessions in exchange local time (no pre/post-market, no half days)
+EXCHANGES = {
+    'NSE': {
+        'tz': ZoneInfo('Asia/Kolkata'),
+        'open': time(9, 15),
+        'close': time(15, 30),
+    },
+    'NASDAQ': {
+        'tz': ZoneInfo('America/New_York'),
+        'open': time(9, 30),
+        'close': time(16, 0),
+    },
+}
+
+# Session the simulated custom stocks tick on (users/custom_ticks.py)
+CUSTOM_STOCK_EXCHANGE = 'NSE'
+
+# Final bars can lag the close by a few minutes on the provider side
+CLOSE_SETTLE = timedelta(minutes=15)
+
+# Full-day trading holidays. Update yearly from the exchange calendars: add
+# the new year here, or list it in the MARKET_HOLIDAYS_FILE JSON without a
+# release. A year with no holidays for an exchange logs a warning.
+HOLIDAYS = {
+    'NSE': {
+        date(2026, 1, 26), date(2026, 3, 3), date(2026, 3, 26), date(2026, 3, 31),
+        date(2026, 4, 3), date(2026, 4, 14), date(2026, 5, 1), date(2026, 5, 28),
+        date(2026, 6, 26), date(2026, 9, 14), date(2026, 10, 2), date(2026, 10, 20),
+        date(2026, 11, 10), date(2026, 11, 24), date(2026, 12, 25),
+    },
+    'NASDAQ': {
+        date(2026, 1, 1), date(2026, 1, 19), date(2026, 2, 16), date(2026, 4, 3),
+        date(2026, 5, 25), date(2026, 6, 19), date(2026, 7, 3), date(2026, 9, 7),
+        date(2026, 11, 26), date(2026, 12, 25),
+        date(2027, 1, 1), date(2027, 1, 18), date(2027, 2, 15), date(2027, 3, 26),
+        date(2027, 5, 31), date(2027, 6, 18), date(2027, 7, 5), date(2027, 9, 6),
+        date(2027, 11, 25), date(2027, 12, 24),
+    },
+}
+
+
+def exchange_for(symbol):
+    """Exchange a tracked symbol trades on"""
+    return 'NSE' if symbol.upper() in NSE_TICKERS else 'NASDAQ'
+
+
+_calendar = None
+_warned_years = set()
+
+
+def load_holidays(path=None):
+    """HOLIDAYS merged with the MARKET_HOLIDAYS_FILE ({exchange: [ISO dates]})"""
+    holidays = {exchange: set(days) for exchange, days in HOLIDAYS.items()}
+    path = path or getattr(settings, 'MARKET_HOLIDAYS_FILE', None)
+    if path:
+        try:
+            extra = json.loads(Path(path).read_text())
+            for exchange, days in extra.items():
+                holidays.setdefault(exchange, set()).update(date.fromisoformat(day) for day in days)
+        except (OSError, ValueError, TypeError) as e:
+            print(f"[MARKET] Could not load holidays from {path}: {e}")
+    return holidays
+
+
+def holidays_for(exchange, year):
+    """Holidays of an exchange in a year, warning once if none are listed for the current year or later"""
+    global _calendar
+    if _calendar is None:
+        _calendar = {
+            exchange: (days, {day.year for day in days}) for exchange, days in load_holidays().items()
+        }
+    days, years = _calendar[exchange]
+    if year not in years and year >= date.today().year and (exchange, year) not in _warned_years:
+        _warned_years.add((exchange, year))
+        print(f"[MARKET] No {exchange} holidays listed for {year} - holidays will be treated as "
+              f"trading days; add them to HOLIDAYS in users/market_clock.py or MARKET_HOLIDAYS_FILE")
+    return days
+
+
+def is_trading_day(exchange, day):
+    """Whether the exchange holds a regular session on a (local) date"""
+    return day.weekday() < 5 and day not in holidays_for(exchange, day.year)
+
+
+def _session(exchange, day):
+    """(open, close) datetimes of the session on a local date"""
+    spec = EXCHANGES[exchange]
+    return (
+        datetime.combine(day, spec['open'], tzinfo=spec['tz']),
+        datetime.combine(day, spec['close'], tzinfo=spec['tz']),
+    )
+
+
+def is_open(exchange, now=None):
+    """Whether the exchange is in its regular session right now"""
+    now = now or timezone.now()
+    local = now.astimezone(EXCHANGES[exchange]['tz'])
+    if not is_trading_day(exchange, local.date()):
+        return False
+    session_open, session_close = _session(exchange, local.date())
+    return session_open <= local < session_close
+
+
+def last_close(exchange, now=None):
+    """End of the most recent session that has finished"""
+    now = now or timezone.now()
+    day = now.astimezone(EXCHANGES[exchange]['tz']).date()
+    while True:
+        if is_trading_day(exchange, day):
+            session_close = _session(exchange, day)[1]
+            if session_close <= now:
+                return session_close
+        day -= timedelta(days=1)
+
+
+def next_open(exchange, now=None):
+    """Start of the next session (now, if the exchange is open)"""
+    now = now or timezone.now()
+    if is_open(exchange, now):
+        return now
+    day = now.astimezone(EXCHANGES[exchange]['tz']).date()
+    while True:
+        if is_trading_day(exchange, day):
+            session_open = _session(exchange, day)[0]
+            if session_open > now:
+                return session_open
+        day += timedelta(days=1)
+
+
+def is_quote_stale(symbol, last_updated, fresh_seconds, now=None):
+    """
+    Whether a quote needs refreshing: during the session, once it is older than
+    fresh_seconds; while closed, only until it has been written after the last
+    close has settled.
+    """
+    now = now or timezone.now()
+    exchange = exchange_for(symbol)
+    if is_open(exchange, now):
+        return (now - last_updated).total_seconds() >= fresh_seconds
+    return last_updated < last_close(exchange, now) + CLOSE_SETTLE
@@ -0,0 +1,193 @@
+"""
+Batched market data refresh for the tracked ticker universe.
+
+Downloads daily OHLCV for every symbol in one multi-ticker request, appends
+it to the OHLCV store and reuses the stored window for the quote and the ML
+features, predicts the universe in one batched model pass through the
+prediction cache, then writes all PredictedStockData rows in one transaction.
+
+Refreshes are incremental: only bars from the last stored date onwards are
+downloaded (the last bar may still be forming), and moving averages and model
+features are computed over the tail rather than the full history.
+"""
+import traceback
+
+import numpy as np
+from django.db import transaction
+from django.utils import timezone
+
+from .ml_predictor import ML_PREDICTOR, TICKERS, NSE_TICKERS
+from .models import PredictedStockData
+from .ohlcv_store import OHLCV_STORE, YEAR_BARS, build_summary, records_from_frame, records_to_frame
+from .portfolio_views import fetch_stock_metadata
+from .prediction_cache import FEATURE_WINDOW, predict_frames
+from .provider_guard import guarded_provider
+from .quotes import invalidate_quotes
+
+# First download for a symbol with nothing stored yet
+BACKFILL_PERIOD = "2y"
+# Index series kept in the OHLCV store for risk analytics - no quote row or prediction.
+# SPY is a tracked ticker already.
+BENCHMARK_TICKERS = {'NIFTY': '^NSEI'}
+
+REFRESH_FIELDS = [
+    'name', 'current_price', 'change_percent', 'category', 'sector', 'market_cap',
+    'currency', 'price_history', 'summary', 'ml_direction', 'ml_confidence', 'ml_regime',
+    'ml_volatility', 'ml_model_version', 'last_updated',
+]
+
+
+def download_universe(symbols, period=None, start=None):
+    """
+    Download daily OHLCV for all symbols in a single provider call, either for
+    a `period` or from a `start` date onwards (inclusive).
+    Returns {symbol: normalized frame}; symbols without data are left out.
+    """
+    full_tickers = {ML_PREDICTOR._get_full_ticker(symbol): symbol for symbol in symbols}
+    frames = guarded_provider().download(
+        list(full_tickers), period=None if start is not None else (period or BACKFILL_PERIOD), start=start,
+    )
+    return {full_tickers[full_ticker]: df for full_ticker, df in frames.items()}
+
+
+def download_new_bars(symbols):
+    """
+    Download only the bars each symbol is missing from the OHLCV store.
+    Symbols are grouped by their last stored date, so a regular refresh is a
+    single request; symbols with no history get a BACKFILL_PERIOD download.
+    """
+    plan = {}
+    for symbol in symbols:
+        plan.setdefault(OHLCV_STORE.last_date(symbol), []).append(symbol)
+
+    frames = {}
+    for last_date, group in plan.items():
+        try:
+            frames.update(download_universe(group, start=last_date))
+        except Exception as e:
+            print(f"[REFRESH] Download failed for {group}: {e}")
+    return frames
+
+
+def refresh_benchmarks():
+    """Append new bars for the benchmark indices to the OHLCV store"""
+    for symbol, ticker in BENCHMARK_TICKERS.items():
+        last_date = OHLCV_STORE.last_date(symbol)
+        try:
+            frames = guarded_provider().download(
+                [ticker], period=None if last_date is not None else BACKFILL_PERIOD, start=last_date,
+            )
+        except Exception as e:
+            print(f"[REFRESH] Benchmark download failed for {ticker}: {e}")
+            continue
+        new_bars = frames.get(ticker)
+        if new_bars is None or new_bars.empty:
+            continue
+        prior = OHLCV_STORE.read(symbol, end=np.datetime64(new_bars.index[0], 'D') - 1, days=49)
+        OHLCV_STORE.append(symbol, records_from_frame(new_bars, prior=prior))
+
+
+def quote_from_frame(df):
+    """Return (current_price, change_percent) for the latest bar of an OHLCV frame"""
+    latest = df.iloc[-1]
+    close = float(latest['close'])
+    open_price = float(latest['open'])
+    change_percent = ((close - open_price) / open_price) * 100 if open_price else 0.0
+    return round(close, 2), round(change_percent, 2)
+
+
+def refresh_market_data(symbols=None):
+    """
+    Refresh quotes, price history and ML predictions for the given symbols
+    (defaults to TICKERS) from one batched download.
+
+    Returns a list of per-symbol result dicts with a 'status' of
+    'created', 'updated', 'skipped' or 'error'.
+    """
+    symbols = list(symbols or TICKERS)
+    frames = download_new_bars(symbols)
+    # NIFTY moves with the NSE symbols - refresh it alongside them
+    if any(symbol.upper() in NSE_TICKERS for symbol in symbols):
+        refresh_benchmarks()
+    existing = {row.symbol: row for row in PredictedStockData.objects.filter(symbol__in=symbols)}
+    now = timezone.now()
+
+    results = []
+    to_create = []
+    to_update = []
+
+    # Store the new bars and read back each symbol's windows
+    windows = {}
+    for symbol in symbols:
+        new_bars = frames.get(symbol)
+        if new_bars is None:
+            results.append({'symbol': symbol, 'status': 'skipped', 'error': 'No price data available'})
+            continue
+
+        try:
+            # Seed the MAs with the stored bars just before the new ones
+            first_new = np.datetime64(new_bars.index[0], 'D')
+            prior = OHLCV_STORE.read(symbol, end=first_new - 1, days=49)
+            OHLCV_STORE.append(symbol, records_from_frame(new_bars, prior=prior))
+
+            # One read covers the 52-week summary and the feature window
+            year = OHLCV_STORE.read(symbol, days=YEAR_BARS)
+            windows[symbol] = (year, records_to_frame(year[-FEATURE_WINDOW:]))
+        except Exception as e:
+            results.append({'symbol': symbol, 'status': 'error', 'error': str(e), 'traceback': traceback.format_exc()})
+
+    # One batched model pass over the symbols whose latest bar is not predicted yet
+    predictions = predict_frames({symbol: window for symbol, (_, window) in windows.items()})
+
+    for symbol, (year, window) in windows.items():
+        prediction = predictions[symbol]
+        try:
+            current_price, change_percent = quote_from_frame(window)
+
+            row = existing.get(symbol)
+            created = row is None
+            if created:
+                row = PredictedStockData(symbol=symbol)
+
+            # Name/sector/market cap rarely change - only fetch provider info when missing
+            if created or not row.name:
+                try:
+                    metadata = fetch_stock_metadata(symbol)
+                    row.name = metadata['name']
+                    row.category = metadata['category']
+                    row.sector = metadata['sector']
+                    row.market_cap = metadata['market_cap']
+                except Exception as e:
+                    print(f"[REFRESH] Could not fetch metadata for {symbol}: {e}")
+                    row.name = row.name or symbol
+
+            row.current_price = current_price
+            row.change_percent = change_percent
+            row.currency = 'INR' if symbol.upper() in NSE_TICKERS else 'USD'
+            row.price_history = []  # History lives in the OHLCV store
+            row.summary = build_summary(year, current_price)
+            row.ml_direction = prediction.get('direction', 'neutral')
+            row.ml_confidence = prediction.get('confidence', 0.5)
+            row.ml_regime = prediction.get('regime', 'Unknown')
+            row.ml_volatility = prediction.get('vol', 0.0)
+            row.ml_model_version = prediction.get('model_version') or ''
+            row.last_updated = now
+
+            (to_create if created else to_update).append(row)
+            results.append({
+                'symbol': symbol,
+                'status': 'created' if created else 'updated',
+                'current_price': current_price,
+                'direction': row.ml_direction,
+            })
+        except Exception as e:
+            results.append({'symbol': symbol, 'status': 'error', 'error': str(e), 'traceback': traceback.format_exc()})
+
+    with transaction.atomic():
+        if to_create:
+            PredictedStockData.objects.bulk_create(to_create)
+        if to_update:
+            PredictedStockData.objects.bulk_update(to_update, REFRESH_FIELDS)
+    invalidate_quotes()
+
+    return results
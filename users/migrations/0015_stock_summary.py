@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0014_financialgoal_color_financialgoal_icon_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customstock',
+            name='summary',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.AddField(
+            model_name='predictedstockdata',
+            name='summary',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
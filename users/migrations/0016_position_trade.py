@@ -0,0 +1,48 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:29
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0015_stock_summary'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Position',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('symbol', models.CharField(db_index=True, max_length=20)),
+                ('quantity', models.DecimalField(decimal_places=4, default=0, max_digits=16)),
+                ('avg_price', models.DecimalField(decimal_places=4, default=0, max_digits=14)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('portfolio', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='positions', to='users.demoportfolio')),
+            ],
+            options={
+                'ordering': ['symbol'],
+                'unique_together': {('portfolio', 'symbol')},
+            },
+        ),
+        migrations.CreateModel(
+            name='Trade',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('symbol', models.CharField(db_index=True, max_length=20)),
+                ('side', models.CharField(choices=[('buy', 'Buy'), ('sell', 'Sell')], max_length=4)),
+                ('quantity', models.DecimalField(decimal_places=4, max_digits=16)),
+                ('price', models.DecimalField(decimal_places=4, max_digits=14)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=16)),
+                ('realized_pnl', models.DecimalField(blank=True, decimal_places=2, max_digits=16, null=True)),
+                ('executed_at', models.DateTimeField(auto_now_add=True)),
+                ('portfolio', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='trades', to='users.demoportfolio')),
+            ],
+            options={
+                'ordering': ['-executed_at'],
+                'indexes': [models.Index(fields=['portfolio', 'executed_at'], name='users_trade_portfol_e75d2a_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,42 @@
+from decimal import Decimal
+
+from django.db import migrations
+
+
+def holdings_to_positions(apps, schema_editor):
+    """Copy each portfolio's holdings JSON into Position rows"""
+    DemoPortfolio = apps.get_model('users', 'DemoPortfolio')
+    Position = apps.get_model('users', 'Position')
+
+    positions = []
+    for portfolio in DemoPortfolio.objects.all():
+        for symbol, holding in (portfolio.holdings or {}).items():
+            if not isinstance(holding, dict):
+                continue
+            quantity = Decimal(str(holding.get('quantity', 0)))
+            avg_price = Decimal(str(holding.get('avg_price', 0)))
+            if quantity > 0:
+                positions.append(Position(portfolio=portfolio, symbol=symbol, quantity=quantity, avg_price=avg_price))
+    Position.objects.bulk_create(positions, batch_size=1000)
+
+
+def positions_to_holdings(apps, schema_editor):
+    """Rebuild the holdings JSON from Position rows"""
+    DemoPortfolio = apps.get_model('users', 'DemoPortfolio')
+    for portfolio in DemoPortfolio.objects.prefetch_related('positions'):
+        portfolio.holdings = {
+            position.symbol: {'quantity': float(position.quantity), 'avg_price': float(position.avg_price)}
+            for position in portfolio.positions.all()
+        }
+        portfolio.save(update_fields=['holdings'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0016_position_trade'),
+    ]
+
+    operations = [
+        migrations.RunPython(holdings_to_positions, positions_to_holdings),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0017_positions_from_holdings'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='demoportfolio',
+            name='day_change',
+            field=models.DecimalField(decimal_places=2, default=0.0, max_digits=12),
+        ),
+        migrations.AddField(
+            model_name='demoportfolio',
+            name='day_change_percent',
+            field=models.DecimalField(decimal_places=2, default=0.0, max_digits=8),
+        ),
+        migrations.AddField(
+            model_name='demoportfolio',
+            name='valued_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
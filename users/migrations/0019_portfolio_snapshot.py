@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0018_portfolio_day_change'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PortfolioSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('resolution', models.CharField(choices=[('intraday', 'Intraday'), ('daily', 'Daily'), ('weekly', 'Weekly')], max_length=8)),
+                ('value', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('taken_at', models.DateTimeField()),
+                ('portfolio', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='snapshots', to='users.demoportfolio')),
+            ],
+            options={
+                'ordering': ['taken_at'],
+                'indexes': [models.Index(fields=['portfolio', 'taken_at'], name='users_portf_portfol_42bae6_idx'), models.Index(fields=['resolution', 'taken_at'], name='users_portf_resolut_268c51_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:43
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0019_portfolio_snapshot'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Order',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('symbol', models.CharField(max_length=20)),
+                ('side', models.CharField(choices=[('buy', 'Buy'), ('sell', 'Sell')], max_length=4)),
+                ('order_type', models.CharField(choices=[('limit', 'Limit'), ('stop_loss', 'Stop Loss'), ('take_profit', 'Take Profit')], max_length=12)),
+                ('quantity', models.DecimalField(decimal_places=4, max_digits=16)),
+                ('trigger_price', models.DecimalField(decimal_places=4, max_digits=14)),
+                ('status', models.CharField(choices=[('open', 'Open'), ('filled', 'Filled'), ('cancelled', 'Cancelled'), ('rejected', 'Rejected')], default='open', max_length=10)),
+                ('fill_price', models.DecimalField(blank=True, decimal_places=4, max_digits=14, null=True)),
+                ('message', models.CharField(blank=True, max_length=200)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('closed_at', models.DateTimeField(blank=True, null=True)),
+                ('portfolio', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='orders', to='users.demoportfolio')),
+                ('trade', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='order', to='users.trade')),
+            ],
+            options={
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['symbol', 'status'], name='users_order_symbol_019666_idx'), models.Index(fields=['portfolio', 'status'], name='users_order_portfol_e6661a_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 03:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0021_idempotency_key'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='predictedstockdata',
+            name='ml_model_version',
+            field=models.CharField(blank=True, default='', max_length=32),
+        ),
+    ]
@@ -1,14 +1,16 @@
 # ML Prediction Service - Adapted from ML repo predictor.py
 
-import yfinance as yf
-import pandas as pd
 import numpy as np
 import json
-import lightgbm as lgb
+import threading
+import time
 from pathlib import Path
 import os
 from django.conf import settings
 
+from ml.registry import MODEL_FILES, ModelRegistry, RegistryError
+from .provider_guard import guarded_provider
+
 # --- Configuration ---
 TICKERS = [
     "AAPL", "GOOGL", "MSFT", "TSLA", "AMZN", "META", "NVDA", "SPY",
@@ -20,64 +22,209 @@ NSE_TICKERS = ["RELIANCE", "TCS", "INFY", "HDFCBANK", "ICICIBANK", "SBIN", "ITC"
 ML_ROOT = Path(settings.BASE_DIR)
 ARTIFACTS_DIR = ML_ROOT / "ml" / "artifacts"
 MODELS_DIR = ML_ROOT / "ml" / "models"
+REGISTRY_DIR = ML_ROOT / "ml" / "registry"
+
+# How often a process re-reads the registry pointer for a newly activated version
+MODEL_CHECK_SECONDS = getattr(settings, 'ML_MODEL_CHECK_SECONDS', 30)
+
+DIRECTION_LABELS = np.array(['bearish', 'neutral', 'bullish'])
+REGIME_LABELS = np.array(['Calm', 'Volatile', 'Crash'])
+
+# One row per symbol from PredictorService.predict_many
+PREDICTION_DTYPE = np.dtype([
+    ('symbol', 'U16'),
+    ('direction', 'U8'),
+    ('confidence', 'f8'),
+    ('vol', 'f8'),
+    ('regime', 'U8'),
+    ('valid', '?'),
+    ('model_version', 'U32'),
+])
+
+
+def prediction_dict(record):
+    """A predict_many row as the dict returned by PredictorService.predict"""
+    return {
+        'direction': str(record['direction']),
+        'confidence': float(record['confidence']),
+        'vol': float(record['vol']),
+        'regime': str(record['regime']),
+        'model_version': str(record['model_version']) or None,
+    }
+
+
+class ModelBundle:
+    """The boosters and feature list of one model version - never modified once loaded"""
+
+    def __init__(self, version, dir_model, vol_model, regime_model, features, metadata):
+        self.version = version
+        self.dir_model = dir_model
+        self.vol_model = vol_model
+        self.regime_model = regime_model
+        self.features = features
+        self.metadata = metadata
 
 
 class PredictorService:
-    """Handles loading models and making predictions - matches ML repo implementation"""
+    """
+    Handles loading models and making predictions - matches ML repo implementation
+
+    Models (and lightgbm itself) load on first use, so processes that never
+    predict - most management commands, web workers serving other pages -
+    do not pay for them. Processes that do predict call warm_up() at startup.
+
+    The active version comes from the model registry (ml/registry.py). Every
+    MODEL_CHECK_SECONDS the registry pointer is re-read and a newly activated
+    version is loaded in the background of whichever call noticed it, then
+    swapped in as one ModelBundle. A prediction reads the bundle once, so
+    in-flight predictions finish on the version they started with.
+    """
     
-    def __init__(self):
-        self.models_loaded = False
-        self.dir_model = None
-        self.vol_model = None
-        self.regime_model = None
-        self.features = None
-        self.ticker_mapping = None
-        self._load_models()
-
-    def _load_models(self):
-        """Load trained LightGBM models and feature list"""
+    def __init__(self, registry=None):
+        self.registry = registry or ModelRegistry(
+            root=getattr(settings, 'ML_REGISTRY_DIR', REGISTRY_DIR), models_dir=MODELS_DIR, artifacts_dir=ARTIFACTS_DIR,
+        )
+        self.online_features = None
+        self._bundle = None
+        self._next_check = 0.0
+        self._load_lock = threading.Lock()
+        self._active = (0.0, None)
+
+    @property
+    def models_loaded(self):
+        return self._bundle is not None
+
+    @property
+    def features(self):
+        bundle = self._bundle
+        return bundle.features if bundle is not None else None
+
+    @property
+    def model_version(self):
+        """Version of the active models (loads them on first use)"""
+        bundle = self.ensure_loaded()
+        return bundle.version if bundle is not None else None
+
+    def active_version(self):
+        """
+        Version the registry points at, without loading the models (the loaded
+        version while the pointer is broken). Re-read every MODEL_CHECK_SECONDS.
+        """
+        expires, version = self._active
+        if time.monotonic() < expires:
+            return version
         try:
-            # Load models
-            if (MODELS_DIR / "dir_model.txt").exists():
-                self.dir_model = lgb.Booster(model_file=str(MODELS_DIR / "dir_model.txt"))
-                print(f"[ML] Loaded direction model")
-
-            if (MODELS_DIR / "vol_model.txt").exists():
-                self.vol_model = lgb.Booster(model_file=str(MODELS_DIR / "vol_model.txt"))
-                print(f"[ML] Loaded volatility model")
-
-            if (MODELS_DIR / "regime_model.txt").exists():
-                self.regime_model = lgb.Booster(model_file=str(MODELS_DIR / "regime_model.txt"))
-                print(f"[ML] Loaded regime model")
-
-            # Load feature list
-            if (ARTIFACTS_DIR / "feature_cols.json").exists():
-                with open(ARTIFACTS_DIR / "feature_cols.json") as f:
-                    self.features = json.load(f)
-                print(f"[ML] Loaded {len(self.features)} features")
-
-            # Load ticker mapping
-            if (ARTIFACTS_DIR / "ticker_mapping.json").exists():
-                with open(ARTIFACTS_DIR / "ticker_mapping.json") as f:
-                    self.ticker_mapping = json.load(f)
-
-            self.models_loaded = (
-                self.dir_model is not None and
-                self.vol_model is not None and
-                self.regime_model is not None and
-                self.features is not None
-            )
-
-            if self.models_loaded:
-                print(f"[ML] All models loaded successfully: {len(self.features)} features")
-            else:
-                print("[ML] Warning: Some ML models not loaded - predictions will use fallback")
-
+            version = self.registry.resolve()[0]
+        except RegistryError:
+            bundle = self._bundle
+            version = bundle.version if bundle is not None else None
+        self._active = (time.monotonic() + MODEL_CHECK_SECONDS, version)
+        return version
+
+    def ensure_loaded(self):
+        """
+        The current ModelBundle, loading the models on first use and picking up
+        a newly activated version; None when no models can be loaded. A failed
+        load is retried after MODEL_CHECK_SECONDS, not on every call.
+        """
+        bundle = self._bundle
+        if time.monotonic() < self._next_check:
+            return bundle
+        # Only the first load waits; with a bundle in hand, predictions never block on a reload
+        if not self._load_lock.acquire(blocking=bundle is None):
+            return bundle
+        try:
+            if time.monotonic() >= self._next_check:
+                self._check_registry()
+                self._next_check = time.monotonic() + MODEL_CHECK_SECONDS
+        finally:
+            self._load_lock.release()
+        return self._bundle
+
+    def reload(self):
+        """Re-read the registry pointer now; returns the active version"""
+        with self._load_lock:
+            self._check_registry()
+            self._next_check = time.monotonic() + MODEL_CHECK_SECONDS
+        return self._bundle.version if self._bundle is not None else None
+
+    def _check_registry(self):
+        """Load and swap in the active version if it is not the one loaded (caller holds _load_lock)"""
+        try:
+            version, models_dir, artifacts_dir = self.registry.resolve()
+            if self._bundle is not None and self._bundle.version == version:
+                return
+            bundle = self._load_models(version, models_dir, artifacts_dir)
         except Exception as e:
             print(f"[ML] Error loading models: {e}")
             import traceback
             traceback.print_exc()
-            self.models_loaded = False
+            return
+        if bundle is None:
+            print("[ML] Warning: Some ML models not loaded - " + (
+                "predictions will use fallback" if self._bundle is None else f"keeping version {self._bundle.version}"
+            ))
+            return
+
+        previous = self._bundle
+        self._bundle = bundle
+        if previous is None:
+            print(f"[ML] All models loaded successfully: {len(bundle.features)} features (version {bundle.version})")
+        else:
+            print(f"[ML] Hot-reloaded models: version {previous.version} -> {bundle.version}")
+
+    def warm_up(self):
+        """
+        Load the models and run one prediction through every booster, so the
+        first real request does not pay for it. For processes that predict.
+        """
+        bundle = self.ensure_loaded()
+        if bundle is None:
+            return False
+        X = np.zeros((1, len(bundle.features)))
+        bundle.dir_model.predict(X)
+        bundle.vol_model.predict(X)
+        bundle.regime_model.predict(X)
+        print(f"[ML] Warm-up complete (version {bundle.version})")
+        return True
+
+    def _load_models(self, version, models_dir, artifacts_dir):
+        """Load the LightGBM models and feature list of one version; None if any is missing"""
+        import lightgbm as lgb
+        from ml.features import OnlineFeatures
+
+        if self.online_features is None:
+            self.online_features = OnlineFeatures()
+
+        boosters = {}
+        for name in MODEL_FILES:
+            path = models_dir / name
+            if path.exists():
+                boosters[name] = lgb.Booster(model_file=str(path))
+                print(f"[ML] Loaded {name} ({version})")
+
+        # Load feature list
+        features = None
+        if (artifacts_dir / "feature_cols.json").exists():
+            with open(artifacts_dir / "feature_cols.json") as f:
+                features = json.load(f)
+            print(f"[ML] Loaded {len(features)} features")
+
+        metadata = {}
+        if (artifacts_dir / "model_metadata.json").exists():
+            with open(artifacts_dir / "model_metadata.json") as f:
+                metadata = json.load(f)
+
+        if len(boosters) < len(MODEL_FILES) or features is None:
+            return None
+        return ModelBundle(
+            version,
+            boosters["dir_model.txt"],
+            boosters["vol_model.txt"],
+            boosters["regime_model.txt"],
+            features,
+            metadata,
+        )
 
     def _get_full_ticker(self, symbol):
         """Convert ticker name to yfinance format (NASDAQ or NSE)"""
@@ -109,88 +256,37 @@ class PredictorService:
         # Fallback to NASDAQ
         return symbol
 
-    def _compute_features(self, ticker_symbol):
-        """Download latest data and compute features for a ticker"""
-        try:
-            # Download last 90 days of data
-            df = yf.download(ticker_symbol, period="90d", interval="1d", progress=False, auto_adjust=True)
-
-            if df.empty:
-                print(f"[FEATURES] No data for {ticker_symbol}")
-                return None
-
-            # Handle multi-index columns
-            if isinstance(df.columns, pd.MultiIndex):
-                df.columns = df.columns.get_level_values(0)
-
-            df = df[['Open', 'High', 'Low', 'Close', 'Volume']].dropna()
-            df.columns = [c.lower() for c in df.columns]
-
-            # Compute returns
-            df['ret1'] = df['close'].pct_change()
-
-            # Lag returns (1-10 days)
-            for lag in range(1, 11):
-                df[f'ret_lag{lag}'] = df['ret1'].shift(lag)
-
-            # Momentum features
-            df['mom_7'] = df['close'].pct_change(7)
-            df['mom_21'] = df['close'].pct_change(21)
-
-            # Volatility features (annualized)
-            df['vol_7'] = df['ret1'].rolling(7).std() * np.sqrt(252)
-            df['vol_21'] = df['ret1'].rolling(21).std() * np.sqrt(252)
-            df['vol_63'] = df['ret1'].rolling(63).std() * np.sqrt(252)
-
-            # RSI
-            delta = df['close'].diff()
-            up = delta.clip(lower=0)
-            down = -1 * delta.clip(upper=0)
-            ma_up = up.rolling(14).mean()
-            ma_down = down.rolling(14).mean()
-            rs = ma_up / (ma_down + 1e-9)
-            df['rsi_14'] = 100 - (100 / (1 + rs))
-
-            # Volume features
-            df['vma_21'] = df['volume'] / (df['volume'].rolling(21).mean() + 1e-9)
-            df['vma_63'] = df['volume'] / (df['volume'].rolling(63).mean() + 1e-9)
-
-            # Price vs SMA
-            df['sma_7'] = df['close'].rolling(7).mean()
-            df['sma_21'] = df['close'].rolling(21).mean()
-            df['sma_50'] = df['close'].rolling(50).mean()
-            df['price_vs_sma7'] = df['close'] / (df['sma_7'] + 1e-9) - 1
-            df['price_vs_sma21'] = df['close'] / (df['sma_21'] + 1e-9) - 1
-            df['price_vs_sma50'] = df['close'] / (df['sma_50'] + 1e-9) - 1
-
-            # Calendar features
-            df['day_of_week'] = df.index.dayofweek
-            df['month'] = df.index.month
+    def _features_from_frame(self, df, ticker_symbol, features):
+        """
+        Latest `features` vector for a daily OHLCV frame (lowercase
+        open/high/low/close/volume columns, DatetimeIndex). The symbol's online
+        feature state only takes the bars it has not seen yet, so repeat
+        predictions do not recompute the rolling windows.
+        """
+        from ml.features import FEATURE_COLUMNS
 
+        try:
             # Ensure all required features exist
-            if not self.features:
+            if not features:
                 print(f"[FEATURES] Error: Features list is None!")
                 return None
-                
-            missing_features = [f for f in self.features if f not in df.columns]
+
+            missing_features = [f for f in features if f not in FEATURE_COLUMNS]
             if missing_features:
                 print(f"[FEATURES] Warning: Missing features for {ticker_symbol}: {missing_features}")
                 return None
 
-            df_clean = df[self.features].dropna()
-
-            if df_clean.empty:
-                print(f"[FEATURES] Warning: No valid data after feature computation for {ticker_symbol}")
+            self.online_features.sync(ticker_symbol, df)
+            feature_vector = self.online_features.vector(ticker_symbol, features)
+            if feature_vector is None:
+                print(f"[FEATURES] Warning: Not enough bars to compute features for {ticker_symbol}")
                 return None
 
-            # Return latest feature vector
-            feature_vector = df_clean.iloc[-1].values
-            
             # Validate feature vector
             if np.any(np.isnan(feature_vector)) or np.any(np.isinf(feature_vector)):
                 print(f"[FEATURES] Warning: Invalid feature values for {ticker_symbol}")
                 return None
-                
+
             return feature_vector
 
         except Exception as e:
@@ -199,76 +295,109 @@ class PredictorService:
             traceback.print_exc()
             return None
 
-    def predict(self, symbol):
+    def predict(self, symbol, df=None):
         """
         Get ML predictions for a stock ticker
         Returns dict with direction, volatility, regime predictions
+
+        If df (daily OHLCV frame, lowercase columns) is given it is used
+        instead of downloading the latest bars again.
         """
-        # Re-check models_loaded
-        if not self.models_loaded:
-            self._load_models()
-            if not self.models_loaded:
-                return self._fallback_prediction()
+        frames = {symbol: df} if df is not None else None
+        return prediction_dict(self.predict_many([symbol], frames=frames)[0])
 
-        try:
-            # Get ticker symbol
-            ticker_symbol = self._get_full_ticker(symbol)
-
-            # Compute features from latest data
-            features = self._compute_features(ticker_symbol)
-
-            if features is None:
-                print(f"[PREDICT] Features are None, returning fallback")
-                return self._fallback_prediction()
-
-            # Reshape for prediction
-            X = features.reshape(1, -1)
-            
-            # Validate feature count
-            if len(features) != len(self.features):
-                print(f"[PREDICT] Error: Feature count mismatch. Expected {len(self.features)}, got {len(features)}")
-                return self._fallback_prediction()
-
-            # Get predictions from all 3 models
-            try:
-                dir_probs = self.dir_model.predict(X)[0]
-                vol_pred = self.vol_model.predict(X)[0]
-                regime_probs = self.regime_model.predict(X)[0]
-                
-                # Ensure probabilities are valid
-                if np.any(np.isnan(dir_probs)) or np.any(np.isinf(dir_probs)):
-                    print(f"[PREDICT] Warning: Invalid direction probabilities for {symbol}")
-                    return self._fallback_prediction()
-                    
-            except Exception as e:
-                print(f"[PREDICT] Error during model prediction for {symbol}: {e}")
-                import traceback
-                traceback.print_exc()
-                return self._fallback_prediction()
-
-            # Direction prediction (0=Down, 1=Neutral, 2=Up)
-            dir_class = dir_probs.argmax()
-            dir_labels = ['bearish', 'neutral', 'bullish']  # Map to our format
-            direction = dir_labels[dir_class]
-            dir_confidence = float(dir_probs[dir_class])
-
-            # Regime prediction (0=Calm, 1=Volatile, 2=Crash)
-            regime_class = regime_probs.argmax()
-            regime_labels = ['Calm', 'Volatile', 'Crash']
-            regime = regime_labels[regime_class]
-
-            return {
-                'direction': direction,
-                'confidence': dir_confidence,
-                'vol': float(vol_pred),
-                'regime': regime,
-            }
+    def predict_many(self, symbols, frames=None):
+        """
+        Predict a batch of tickers with one call per model.
+
+        Feature vectors for all symbols are stacked into one matrix, so each
+        booster runs once however many symbols there are. `frames` maps
+        symbol -> daily OHLCV frame; symbols without one are downloaded in a
+        single batched request. Returns a PREDICTION_DTYPE structured array in
+        the order of `symbols`, each tagged with the model version that
+        produced it; rows that could not be predicted hold the fallback
+        prediction with valid=False.
+        """
+        symbols = list(symbols)
+        results = np.zeros(len(symbols), dtype=PREDICTION_DTYPE)
+        results['symbol'] = symbols
+        fallback = self._fallback_prediction()
+        results['direction'] = fallback['direction']
+        results['confidence'] = fallback['confidence']
+        results['vol'] = fallback['vol']
+        results['regime'] = fallback['regime']
+
+        # Loads the models on first use and picks up newly activated versions;
+        # the whole batch is predicted by this one bundle
+        bundle = self.ensure_loaded()
+        if bundle is None:
+            return results
 
+        try:
+            frames = dict(frames or {})
+            missing = [symbol for symbol in symbols if frames.get(symbol) is None]
+            if missing:
+                frames.update(self._download_frames(missing))
+
+            rows = []
+            vectors = []
+            for i, symbol in enumerate(symbols):
+                df = frames.get(symbol)
+                if df is None:
+                    print(f"[FEATURES] No data for {symbol}")
+                    continue
+                features = self._features_from_frame(df, self._get_full_ticker(symbol), bundle.features)
+                if features is None:
+                    continue
+                if len(features) != len(bundle.features):
+                    print(f"[PREDICT] Error: Feature count mismatch for {symbol}. Expected {len(bundle.features)}, got {len(features)}")
+                    continue
+                rows.append(i)
+                vectors.append(features)
+            if not rows:
+                return results
+
+            X = np.vstack(vectors).astype(float)
+
+            # One pass of each model over the whole batch
+            dir_probs = np.atleast_2d(bundle.dir_model.predict(X))
+            vol_pred = np.ravel(bundle.vol_model.predict(X))
+            regime_probs = np.atleast_2d(bundle.regime_model.predict(X))
+        except Exception as e:
+            print(f"[PREDICT] Error during batch prediction for {len(symbols)} symbols: {e}")
+            import traceback
+            traceback.print_exc()
+            return results
+
+        # Rows with invalid direction probabilities keep the fallback
+        finite = np.isfinite(dir_probs).all(axis=1)
+        for symbol in np.asarray(symbols, dtype=object)[rows][~finite]:
+            print(f"[PREDICT] Warning: Invalid direction probabilities for {symbol}")
+        rows = np.asarray(rows)[finite]
+        dir_probs, vol_pred, regime_probs = dir_probs[finite], vol_pred[finite], regime_probs[finite]
+
+        # Direction (0=Down, 1=Neutral, 2=Up), regime (0=Calm, 1=Volatile, 2=Crash)
+        dir_class = dir_probs.argmax(axis=1)
+        results['direction'][rows] = DIRECTION_LABELS[dir_class]
+        results['confidence'][rows] = dir_probs[np.arange(len(rows)), dir_class]
+        results['vol'][rows] = vol_pred
+        results['regime'][rows] = REGIME_LABELS[regime_probs.argmax(axis=1)]
+        results['valid'][rows] = True
+        results['model_version'][rows] = bundle.version
+        return results
+
+    def _download_frames(self, symbols):
+        """Download about 6 months of daily bars for the symbols in one request; {symbol: frame}"""
+        full_tickers = {self._get_full_ticker(symbol): symbol for symbol in symbols}
+        try:
+            # 6 months of daily bars - the 63-day features need more than 90 calendar days
+            frames = guarded_provider().download(list(full_tickers), period="6mo")
         except Exception as e:
-            print(f"[PREDICT] Error in prediction: {e}")
+            print(f"[FEATURES] Error downloading data for {list(full_tickers)}: {e}")
             import traceback
             traceback.print_exc()
-            return self._fallback_prediction()
+            return {}
+        return {full_tickers[full_ticker]: df for full_ticker, df in frames.items() if full_ticker in full_tickers}
 
     def _fallback_prediction(self):
         """Return neutral prediction when models not available"""
@@ -280,5 +409,5 @@ class PredictorService:
         }
 
 
-# Initialize the service globally to load models once
+# Shared service - models load on first prediction or warm_up()
 ML_PREDICTOR = PredictorService()
@@ -1,5 +1,6 @@
 from django.db import models
 from django.contrib.auth.models import User
+from django.core.serializers.json import DjangoJSONEncoder
 
 
 class UserProfile(models.Model):
@@ -132,8 +133,12 @@ class DemoPortfolio(models.Model):
     """Demo portfolio for practice trading"""
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='demo_portfolio')
     balance = models.DecimalField(max_digits=12, decimal_places=2, default=50000.00)
-    holdings = models.JSONField(default=dict)  # {symbol: {quantity, avg_price}}
+    holdings = models.JSONField(default=dict)  # Legacy {symbol: {quantity, avg_price}} - positions live in Position
     total_value = models.DecimalField(max_digits=12, decimal_places=2, default=50000.00)
+    # Written by the revaluation job (users/revaluation.py) after each price refresh
+    day_change = models.DecimalField(max_digits=12, decimal_places=2, default=0.0)
+    day_change_percent = models.DecimalField(max_digits=8, decimal_places=2, default=0.0)
+    valued_at = models.DateTimeField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
@@ -141,6 +146,145 @@ class DemoPortfolio(models.Model):
         return f"{self.user.username}'s Portfolio - ₹{self.balance}"
 
 
+class Position(models.Model):
+    """Open position in a demo portfolio - one row per held symbol"""
+    portfolio = models.ForeignKey(DemoPortfolio, on_delete=models.CASCADE, related_name='positions')
+    symbol = models.CharField(max_length=20, db_index=True)
+    quantity = models.DecimalField(max_digits=16, decimal_places=4, default=0)
+    avg_price = models.DecimalField(max_digits=14, decimal_places=4, default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        unique_together = ['portfolio', 'symbol']
+        ordering = ['symbol']
+    
+    def __str__(self):
+        return f"{self.portfolio.user.username} - {self.symbol} x {self.quantity}"
+
+
+class Trade(models.Model):
+    """Executed demo trade - append-only ledger"""
+    SIDE_CHOICES = [
+        ('buy', 'Buy'),
+        ('sell', 'Sell'),
+    ]
+    
+    portfolio = models.ForeignKey(DemoPortfolio, on_delete=models.CASCADE, related_name='trades')
+    symbol = models.CharField(max_length=20, db_index=True)
+    side = models.CharField(max_length=4, choices=SIDE_CHOICES)
+    quantity = models.DecimalField(max_digits=16, decimal_places=4)
+    price = models.DecimalField(max_digits=14, decimal_places=4)
+    amount = models.DecimalField(max_digits=16, decimal_places=2)  # quantity * price
+    realized_pnl = models.DecimalField(max_digits=16, decimal_places=2, null=True, blank=True)  # Sells only
+    executed_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['-executed_at']
+        indexes = [
+            models.Index(fields=['portfolio', 'executed_at']),
+        ]
+    
+    def __str__(self):
+        return f"{self.portfolio.user.username} {self.side} {self.quantity} {self.symbol} @ {self.price}"
+
+
+class Order(models.Model):
+    """Pending limit, stop-loss or take-profit order - filled by the order book (users/order_book.py)"""
+    SIDE_CHOICES = Trade.SIDE_CHOICES
+    TYPE_CHOICES = [
+        ('limit', 'Limit'),
+        ('stop_loss', 'Stop Loss'),
+        ('take_profit', 'Take Profit'),
+    ]
+    STATUS_CHOICES = [
+        ('open', 'Open'),
+        ('filled', 'Filled'),
+        ('cancelled', 'Cancelled'),
+        ('rejected', 'Rejected'),
+    ]
+
+    portfolio = models.ForeignKey(DemoPortfolio, on_delete=models.CASCADE, related_name='orders')
+    symbol = models.CharField(max_length=20)
+    side = models.CharField(max_length=4, choices=SIDE_CHOICES)
+    order_type = models.CharField(max_length=12, choices=TYPE_CHOICES)
+    quantity = models.DecimalField(max_digits=16, decimal_places=4)
+    trigger_price = models.DecimalField(max_digits=14, decimal_places=4)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='open')
+    fill_price = models.DecimalField(max_digits=14, decimal_places=4, null=True, blank=True)
+    trade = models.OneToOneField(Trade, on_delete=models.SET_NULL, null=True, blank=True, related_name='order')
+    message = models.CharField(max_length=200, blank=True)  # Rejection reason
+    created_at = models.DateTimeField(auto_now_add=True)
+    closed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['symbol', 'status']),
+            models.Index(fields=['portfolio', 'status']),
+        ]
+
+    def __str__(self):
+        return f"{self.portfolio.user.username} {self.order_type} {self.side} {self.quantity} {self.symbol} @ {self.trigger_price} ({self.status})"
+
+
+class IdempotencyKey(models.Model):
+    """Stored response of a trade request, replayed when the client retries with the same Idempotency-Key"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='idempotency_keys')
+    key = models.CharField(max_length=64)
+    request_hash = models.CharField(max_length=64)  # sha256 of method, path and body
+    status_code = models.IntegerField(default=200)
+    response = models.JSONField(default=dict, encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        unique_together = ['user', 'key']
+
+    def __str__(self):
+        return f"{self.user.username} {self.key} ({self.status_code})"
+
+
+class BacktestResult(models.Model):
+    """Outcome of a queued strategy backtest, written by the worker and polled by the web processes"""
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('done', 'Done'),
+        ('error', 'Error'),
+    ]
+
+    key = models.CharField(max_length=64, unique=True)  # backtest_key() of the spec
+    status = models.CharField(max_length=8, choices=STATUS_CHOICES, default='pending')
+    result = models.JSONField(default=dict, encoder=DjangoJSONEncoder)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    def __str__(self):
+        return f"{self.key} ({self.status})"
+
+
+class PortfolioSnapshot(models.Model):
+    """Portfolio value at a point in time - intraday rows roll up to daily, daily to weekly"""
+    RESOLUTION_CHOICES = [
+        ('intraday', 'Intraday'),
+        ('daily', 'Daily'),
+        ('weekly', 'Weekly'),
+    ]
+
+    portfolio = models.ForeignKey(DemoPortfolio, on_delete=models.CASCADE, related_name='snapshots')
+    resolution = models.CharField(max_length=8, choices=RESOLUTION_CHOICES)
+    value = models.DecimalField(max_digits=12, decimal_places=2)
+    taken_at = models.DateTimeField()
+
+    class Meta:
+        ordering = ['taken_at']
+        indexes = [
+            models.Index(fields=['portfolio', 'taken_at']),
+            models.Index(fields=['resolution', 'taken_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.portfolio.user.username} {self.resolution} ₹{self.value} @ {self.taken_at}"
+
+
 class ChallengeLeaderboard(models.Model):
     """Leaderboard for stock prediction challenges and scenario quizzes"""
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='challenge_leaderboard')
@@ -197,6 +341,9 @@ class PredictedStockData(models.Model):
     
     # Price history (JSON field storing array of price data)
     price_history = models.JSONField(default=list, blank=True)
+    # Summary statistics (window high/low/average, 52-week extremes, latest MAs)
+    # computed when the prices are written
+    summary = models.JSONField(default=dict, blank=True)
     
     # ML prediction results (cached)
     ml_direction = models.CharField(max_length=20, choices=[
@@ -207,6 +354,7 @@ class PredictedStockData(models.Model):
     ml_confidence = models.FloatField(default=0.5)
     ml_regime = models.CharField(max_length=20, default='Unknown')
     ml_volatility = models.FloatField(default=0.0)
+    ml_model_version = models.CharField(max_length=32, blank=True, default='')
     
     # Metadata
     last_updated = models.DateTimeField(auto_now=True)
@@ -253,6 +401,9 @@ class CustomStock(models.Model):
     
     # Price history (JSON field)
     price_history = models.JSONField(default=list, blank=True)
+    # Summary statistics (window high/low/average, 52-week extremes, latest MAs)
+    # computed when the prices are written
+    summary = models.JSONField(default=dict, blank=True)
     
     # Metadata
     currency = models.CharField(max_length=3, default='INR')
@@ -0,0 +1,341 @@
+"""
+Columnar OHLCV store - one append-only binary file of fixed-size records per symbol.
+
+Records are numpy structured rows (date, OHLC, volume, MA20, MA50) read back
+through np.memmap, so a window read only touches the bars it slices and the
+history can grow without making chart or stock-detail requests slower.
+Writes hold an exclusive flock on a per-symbol .lock file, so the refresh,
+tick and backfill workers can write from separate processes.
+"""
+from contextlib import contextmanager
+import hashlib
+import os
+import re
+import threading
+from functools import reduce
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # Windows - writes are only serialized within a process
+    fcntl = None
+
+import numpy as np
+from django.conf import settings
+
+OHLCV_DTYPE = np.dtype([
+    ('date', 'datetime64[D]'),
+    ('open', 'f8'),
+    ('high', 'f8'),
+    ('low', 'f8'),
+    ('close', 'f8'),
+    ('volume', 'i8'),
+    ('ma20', 'f8'),  # NaN until 20 bars are available
+    ('ma50', 'f8'),  # NaN until 50 bars are available
+])
+
+# Chart window covered by the high/low/average of a precomputed summary
+SUMMARY_DAYS = 60
+# Trading days in a year, for the 52-week extremes
+YEAR_BARS = 252
+# Symbols that can name a series file: tickers such as TCS, BRK-B, M&M.NS or
+# ^NSEI - no path separators and no leading dot, so a file never leaves the root
+SYMBOL_PATTERN = re.compile(r'^[A-Z0-9^][A-Z0-9._\-^&]{0,19}$')
+
+
+class OHLCVStore:
+    """Per-symbol OHLCV time series stored as memory-mapped record files"""
+
+    def __init__(self, root):
+        self.root = Path(root)
+        self._write_lock = threading.Lock()
+
+    def _path(self, symbol):
+        """Series file of a symbol; None if the symbol cannot name one"""
+        symbol = str(symbol).upper()
+        if not SYMBOL_PATTERN.match(symbol):
+            return None
+        return self.root / f"{symbol}.bin"
+
+    def _write_path(self, symbol):
+        path = self._path(symbol)
+        if path is None:
+            raise ValueError(f'Invalid symbol: {symbol!r}')
+        return path
+
+    @contextmanager
+    def _locked(self, symbol):
+        """Hold the write lock of a symbol across threads and processes"""
+        path = self._write_path(symbol)
+        with self._write_lock:
+            self.root.mkdir(parents=True, exist_ok=True)
+            if fcntl is None:
+                yield
+                return
+            # A sidecar file, since replace() swaps the data file itself
+            with open(path.with_suffix('.lock'), 'a') as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _open(self, symbol):
+        """Memory-map the full series for a symbol (None if nothing is stored yet)"""
+        path = self._path(symbol)
+        if path is None:
+            return None
+        try:
+            size = path.stat().st_size
+        except FileNotFoundError:
+            return None
+        # Ignore a trailing partial record from a write that is still in progress
+        count = size // OHLCV_DTYPE.itemsize
+        if count == 0:
+            return None
+        return np.memmap(path, dtype=OHLCV_DTYPE, mode='r', shape=(count,))
+
+    def count(self, symbol):
+        """Number of bars stored for a symbol"""
+        path = self._path(symbol)
+        if path is None:
+            return 0
+        try:
+            return path.stat().st_size // OHLCV_DTYPE.itemsize
+        except FileNotFoundError:
+            return 0
+
+    def _tail(self, symbol, days):
+        """Read the latest `days` bars with one seek (cheaper than mapping the file)"""
+        count = self.count(symbol)
+        days = min(days, count)
+        if days <= 0:
+            return np.empty(0, dtype=OHLCV_DTYPE)
+        return np.fromfile(
+            self._path(symbol), dtype=OHLCV_DTYPE, count=days,
+            offset=(count - days) * OHLCV_DTYPE.itemsize,
+        )
+
+    def last_date(self, symbol):
+        """Date of the latest stored bar, or None"""
+        last = self._tail(symbol, 1)
+        return last['date'][-1] if len(last) else None
+
+    def read(self, symbol, days=None, start=None, end=None):
+        """
+        Read a window of bars for a symbol as a structured array (a copy).
+        `days` keeps the latest N bars; `start`/`end` are inclusive date bounds.
+        """
+        if start is None and end is None and days is not None:
+            return self._tail(symbol, days)
+
+        data = self._open(symbol)
+        if data is None:
+            return np.empty(0, dtype=OHLCV_DTYPE)
+
+        lo, hi = 0, len(data)
+        if start is not None:
+            lo = int(np.searchsorted(data['date'], np.datetime64(start, 'D'), side='left'))
+        if end is not None:
+            hi = int(np.searchsorted(data['date'], np.datetime64(end, 'D'), side='right'))
+        if days is not None:
+            lo = max(lo, hi - days)
+        return np.array(data[lo:hi])
+
+    def append(self, symbol, records):
+        """
+        Append bars newer than the latest stored one. A bar dated the same day
+        as the latest stored bar replaces it, since today's bar keeps forming
+        until the session closes. Returns the number of bars written.
+        """
+        records = np.asarray(records, dtype=OHLCV_DTYPE)
+        if len(records) == 0:
+            return 0
+
+        with self._locked(symbol):
+            path = self._write_path(symbol)
+            last = self.last_date(symbol)
+
+            if last is not None:
+                records = records[records['date'] >= last]
+                if len(records) == 0:
+                    return 0
+                if records['date'][0] == last:
+                    # Rewrite the still-forming last bar in place
+                    count = self.count(symbol)
+                    with open(path, 'r+b') as f:
+                        f.seek((count - 1) * OHLCV_DTYPE.itemsize)
+                        f.write(records[:1].tobytes())
+                    records = records[1:]
+
+            if len(records):
+                with open(path, 'ab') as f:
+                    f.write(records.tobytes())
+                    f.flush()
+                    os.fsync(f.fileno())
+        return len(records)
+
+    def replace(self, symbol, records):
+        """Atomically replace the whole series for a symbol"""
+        records = np.asarray(records, dtype=OHLCV_DTYPE)
+        with self._locked(symbol):
+            path = self._write_path(symbol)
+            tmp_path = path.with_suffix('.tmp')
+            with open(tmp_path, 'wb') as f:
+                f.write(records.tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, path)
+        return len(records)
+
+
+def _rolling_mean(values, window):
+    """Trailing rolling mean with NaN until the window is full"""
+    out = np.full(len(values), np.nan)
+    if len(values) >= window:
+        csum = np.cumsum(np.insert(values, 0, 0.0))
+        out[window - 1:] = (csum[window:] - csum[:-window]) / window
+    return out
+
+
+def records_from_frame(df, prior=None):
+    """
+    Convert a normalized OHLCV frame (lowercase columns, DatetimeIndex) to store records.
+    `prior` (the stored records just before the frame) seeds the moving averages,
+    so appending new bars only computes MAs for the new tail.
+    """
+    records = np.empty(len(df), dtype=OHLCV_DTYPE)
+    records['date'] = df.index.values.astype('datetime64[D]')
+    for col in ('open', 'high', 'low', 'close'):
+        records[col] = df[col].to_numpy(dtype='f8')
+    records['volume'] = df['volume'].to_numpy(dtype='f8').astype('i8')
+
+    closes = records['close']
+    if prior is not None and len(prior):
+        closes = np.concatenate([prior['close'][-49:], closes])
+    tail = len(closes) - len(records)
+    records['ma20'] = _rolling_mean(closes, 20)[tail:]
+    records['ma50'] = _rolling_mean(closes, 50)[tail:]
+    return records
+
+
+def records_to_frame(records):
+    """Convert store records to an OHLCV frame (lowercase columns, DatetimeIndex)"""
+    import pandas as pd
+    return pd.DataFrame(
+        {col: records[col] for col in ('open', 'high', 'low', 'close', 'volume')},
+        index=pd.DatetimeIndex(records['date'].astype('datetime64[ns]'), name='date'),
+    )
+
+
+def records_from_history(history):
+    """Convert a list of legacy price_history dicts to store records"""
+    records = np.empty(len(history), dtype=OHLCV_DTYPE)
+    for i, entry in enumerate(history):
+        close = entry.get('close', entry.get('price', 0.0))
+        records[i] = (
+            np.datetime64(entry['date'], 'D'),
+            entry.get('open', close),
+            entry.get('high', close),
+            entry.get('low', close),
+            close,
+            int(entry.get('volume', 0)),
+            np.nan if entry.get('ma20') is None else entry['ma20'],
+            np.nan if entry.get('ma50') is None else entry['ma50'],
+        )
+    return records
+
+
+def to_price_history(records):
+    """Serialize store records to the chart price_history format used by the API"""
+    dates = records['date'].astype(str).tolist()
+    closes = np.round(records['close'], 2).tolist()
+    opens = np.round(records['open'], 2).tolist()
+    highs = np.round(records['high'], 2).tolist()
+    lows = np.round(records['low'], 2).tolist()
+    volumes = records['volume'].tolist()
+    ma20 = np.round(records['ma20'], 2).tolist()
+    ma50 = np.round(records['ma50'], 2).tolist()
+
+    return [
+        {
+            'date': dates[i],
+            'price': closes[i],
+            'volume': volumes[i],
+            'open': opens[i],
+            'high': highs[i],
+            'low': lows[i],
+            'close': closes[i],
+            'ma20': None if ma20[i] != ma20[i] else ma20[i],  # NaN -> None
+            'ma50': None if ma50[i] != ma50[i] else ma50[i],
+        }
+        for i in range(len(records))
+    ]
+
+
+def summarize(records, current_price):
+    """High/low/average/volume/MA summary for a window of store records"""
+    if len(records) == 0:
+        return {
+            'high': round(current_price, 2),
+            'low': round(current_price, 2),
+            'average': round(current_price, 2),
+            'avg_volume': 0,
+            'ma20': None,
+            'ma50': None,
+        }
+
+    closes = records['close']
+    latest = records[-1]
+    return {
+        'high': round(float(closes.max()), 2),
+        'low': round(float(closes.min()), 2),
+        'average': round(float(closes.mean()), 2),
+        'avg_volume': round(float(records['volume'].mean()), 0),
+        'ma20': None if np.isnan(latest['ma20']) else round(float(latest['ma20']), 2),
+        'ma50': None if np.isnan(latest['ma50']) else round(float(latest['ma50']), 2),
+    }
+
+
+def build_summary(records, current_price, days=SUMMARY_DAYS):
+    """
+    Summary stored next to the quote at write time: summarize() over the
+    latest `days` bars plus 52-week extremes over up to YEAR_BARS records.
+    """
+    summary = summarize(records[-days:], current_price)
+    year = records[-YEAR_BARS:]
+    summary.update({
+        'days': days,
+        'high_52w': round(float(year['high'].max()), 2) if len(year) else round(current_price, 2),
+        'low_52w': round(float(year['low'].min()), 2) if len(year) else round(current_price, 2),
+        'as_of': str(records['date'][-1]) if len(records) else None,
+    })
+    return summary
+
+
+OHLCV_STORE = OHLCVStore(getattr(settings, 'OHLCV_STORE_DIR', Path(settings.BASE_DIR) / 'data' / 'ohlcv'))
+
+
+def series_version(symbols):
+    """Hash of the last stored bar of each series - changes whenever a refresh writes new bars"""
+    parts = []
+    for symbol in sorted(symbols):
+        last = OHLCV_STORE.read(symbol, days=1)
+        if len(last):
+            parts.append(f"{symbol}:{OHLCV_STORE.count(symbol)}:{last['date'][-1]}:{last['close'][-1]!r}")
+        else:
+            parts.append(symbol)
+    return hashlib.sha1('|'.join(parts).encode()).hexdigest()
+
+
+def aligned_closes(symbols, days):
+    """
+    Closes of every symbol on the dates they all share, over roughly the last
+    `days` trading days. Returns (dates, T x len(symbols) close matrix).
+    """
+    series = [OHLCV_STORE.read(symbol, days=days + 1) for symbol in symbols]
+    dates = reduce(np.intersect1d, [records['date'] for records in series])
+    if not len(dates):
+        return dates, np.empty((0, len(symbols)))
+    closes = np.column_stack([records['close'][np.searchsorted(records['date'], dates)] for records in series])
+    return dates, closes
@@ -0,0 +1,216 @@
+"""
+Pending order matching - limit, stop-loss and take-profit orders.
+
+Every symbol has an in-memory OrderBook with its open orders split by the
+direction that fires them: buy limits and stop-losses fire when the price
+falls to the trigger, sell limits and take-profits when it rises to it. Both
+sides are kept sorted, so a price update finds its crossed orders with one
+bisect per side - O(log n + k) however many orders are open.
+
+Books live in the worker process and are rebuilt from the database when a
+symbol's open orders change (any order placed, cancelled or filled, in any
+process): the version is the count and highest id of its open orders, read
+for every symbol with one aggregate query. Crossed orders are filled in one transaction through
+execute_trade, each in its own savepoint, so a rejected order does not undo
+the rest of the batch; if the transaction fails, the books it popped orders
+from are rebuilt on the next match.
+"""
+import bisect
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, Max
+from django.utils import timezone
+
+from .models import Order, Position
+from .revaluation import revalue_portfolios
+from .trading import TradeError, execute_trade, get_or_create_portfolio, parse_quantity
+
+# Order types allowed per side
+ORDER_TYPES = {
+    'buy': ('limit',),
+    'sell': ('limit', 'stop_loss', 'take_profit'),
+}
+
+# {symbol: (version, OrderBook)} for this process
+_books = {}
+
+
+def fires_on_fall(side, order_type):
+    """True if the order fires when the price falls to its trigger, False if when it rises"""
+    return order_type == 'stop_loss' or (order_type == 'limit' and side == 'buy')
+
+
+class OrderBook:
+    """Open orders of one symbol as sorted (trigger, order id) arrays"""
+
+    def __init__(self, rows=()):
+        # rows: (order id, trigger, fires on fall)
+        self.falling = sorted((trigger, pk) for pk, trigger, falls in rows if falls)
+        self.rising = sorted((trigger, pk) for pk, trigger, falls in rows if not falls)
+
+    def __len__(self):
+        return len(self.falling) + len(self.rising)
+
+    def add(self, order_id, trigger, falls):
+        bisect.insort(self.falling if falls else self.rising, (trigger, order_id))
+
+    def pop_crossed(self, price):
+        """Remove and return the ids of the orders crossed at `price`"""
+        # Falling orders fire at price <= trigger: the tail from the first trigger >= price
+        start = bisect.bisect_left(self.falling, (price,))
+        # Rising orders fire at price >= trigger: the head up to the last trigger <= price
+        end = bisect.bisect_right(self.rising, (price, float('inf')))
+        crossed = [pk for _, pk in self.falling[start:]] + [pk for _, pk in self.rising[:end]]
+        del self.falling[start:]
+        del self.rising[:end]
+        return crossed
+
+
+def book_versions(symbols):
+    """
+    {symbol: (open order count, highest open order id)}. Ids only grow and
+    orders never reopen, so an unchanged pair means the same open orders.
+    """
+    versions = dict.fromkeys(symbols, (0, None))
+    open_orders = (
+        Order.objects.filter(symbol__in=symbols, status='open')
+        .order_by().values('symbol').annotate(count=Count('id'), top=Max('id'))
+        .values_list('symbol', 'count', 'top')
+    )
+    for symbol, count, top in open_orders:
+        versions[symbol] = (count, top)
+    return versions
+
+
+def load_books(symbols):
+    """Current order books for the symbols, rebuilding stale ones with one query"""
+    versions = book_versions(symbols)
+    stale = [symbol for symbol in symbols if _books.get(symbol, (None,))[0] != versions[symbol]]
+    if stale:
+        rows = defaultdict(list)
+        open_orders = Order.objects.filter(symbol__in=stale, status='open').values_list(
+            'symbol', 'id', 'trigger_price', 'side', 'order_type',
+        )
+        for symbol, pk, trigger, side, order_type in open_orders:
+            rows[symbol].append((pk, float(trigger), fires_on_fall(side, order_type)))
+        for symbol in stale:
+            _books[symbol] = (versions[symbol], OrderBook(rows[symbol]))
+
+    return {symbol: _books[symbol][1] for symbol in symbols}
+
+
+def fill_orders(order_ids, prices):
+    """
+    Fill the given open orders at the symbols' current prices in one
+    transaction. Orders that cannot be filled are rejected.
+    Returns the number of orders filled.
+    """
+    orders = list(
+        Order.objects.filter(pk__in=order_ids, status='open')
+        .select_related('portfolio__user')
+        .order_by('created_at')
+    )
+    filled = 0
+    touched = set()
+    now = timezone.now()
+    with transaction.atomic():
+        for order in orders:
+            price = Decimal(str(prices[order.symbol]))
+            try:
+                with transaction.atomic():
+                    # Claim the order first so two workers never fill it twice
+                    if not Order.objects.filter(pk=order.pk, status='open').update(status='filled', closed_at=now):
+                        continue
+                    trade = execute_trade(
+                        order.portfolio.user, order.symbol, order.side, order.quantity, price, revalue=False,
+                    )
+                    Order.objects.filter(pk=order.pk).update(trade=trade, fill_price=price)
+                filled += 1
+            except TradeError as e:
+                Order.objects.filter(pk=order.pk, status='open').update(
+                    status='rejected', message=str(e)[:200], closed_at=now,
+                )
+            touched.add(order.portfolio_id)
+        if touched:
+            transaction.on_commit(lambda: revalue_portfolios(portfolio_ids=touched))
+    return filled
+
+
+def match_orders(prices):
+    """
+    Fill every open order crossed by the new prices ({symbol: price}).
+    Returns the number of orders filled.
+    """
+    books = load_books(list(prices))
+    crossed = []
+    popped = []
+    for symbol, book in books.items():
+        if book:
+            orders = book.pop_crossed(float(prices[symbol]))
+            if orders:
+                crossed.extend(orders)
+                popped.append(symbol)
+    if not crossed:
+        return 0
+    try:
+        return fill_orders(crossed, prices)
+    except Exception:
+        # The fill transaction rolled back, so the popped orders are still open:
+        # drop these books so the next match rebuilds them from the database
+        for symbol in popped:
+            _books.pop(symbol, None)
+        raise
+
+
+def place_order(user, symbol, side, order_type, quantity, trigger_price, current_price=None):
+    """
+    Place a pending order. If `current_price` already crosses the trigger the
+    order is filled straight away. Raises TradeError for invalid orders.
+    Balance and shares are checked again when the order fills.
+    """
+    quantity = Decimal(parse_quantity(quantity))
+    try:
+        trigger_price = Decimal(str(trigger_price))
+    except ArithmeticError:
+        raise TradeError('Invalid trigger price')
+    if not symbol:
+        raise TradeError('Invalid symbol')
+    if not trigger_price.is_finite() or trigger_price <= 0:
+        raise TradeError('Invalid trigger price')
+    if order_type not in ORDER_TYPES.get(side, ()):
+        raise TradeError(f'Invalid order: {order_type} {side}')
+
+    portfolio = get_or_create_portfolio(user)
+    if side == 'sell':
+        held = Position.objects.filter(portfolio=portfolio, symbol=symbol).values_list('quantity', flat=True).first()
+        if held is None or held < quantity:
+            raise TradeError('Insufficient shares')
+    elif quantity * trigger_price > portfolio.balance:
+        raise TradeError('Insufficient balance')
+
+    order = Order.objects.create(
+        portfolio=portfolio,
+        symbol=symbol,
+        side=side,
+        order_type=order_type,
+        quantity=quantity,
+        trigger_price=trigger_price,
+    )
+
+    if current_price and current_price > 0:
+        falls = fires_on_fall(side, order_type)
+        if (falls and current_price <= trigger_price) or (not falls and current_price >= trigger_price):
+            fill_orders([order.pk], {symbol: current_price})
+            order.refresh_from_db()
+    return order
+
+
+def cancel_order(user, order_id):
+    """Cancel one of the user's open orders. Returns False if there was none."""
+    order = Order.objects.filter(pk=order_id, portfolio__user=user, status='open').first()
+    if order is None:
+        return False
+    cancelled = Order.objects.filter(pk=order.pk, status='open').update(status='cancelled', closed_at=timezone.now())
+    return bool(cancelled)
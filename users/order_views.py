@@ -0,0 +1,77 @@
+"""
+API endpoints for pending limit, stop-loss and take-profit orders
+"""
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+
+from .idempotency import idempotent
+from .models import Order
+from .order_book import cancel_order, place_order
+from .quotes import get_quote
+from .trading import TradeError
+
+
+def serialize_order(order):
+    """Order as returned by the API"""
+    return {
+        'id': order.id,
+        'symbol': order.symbol,
+        'side': order.side,
+        'order_type': order.order_type,
+        'quantity': float(order.quantity),
+        'trigger_price': float(order.trigger_price),
+        'status': order.status,
+        'fill_price': float(order.fill_price) if order.fill_price is not None else None,
+        'message': order.message,
+        'created_at': order.created_at.isoformat(),
+        'closed_at': order.closed_at.isoformat() if order.closed_at else None,
+    }
+
+
+@api_view(['GET', 'POST'])
+@permission_classes([IsAuthenticated])
+@idempotent
+def portfolio_orders(request):
+    """List the user's orders (?status=open) or place a new pending order"""
+    try:
+        if request.method == 'GET':
+            queryset = Order.objects.filter(portfolio__user=request.user)
+            status_filter = request.query_params.get('status')
+            if status_filter:
+                queryset = queryset.filter(status=status_filter)
+            return Response({'orders': [serialize_order(order) for order in queryset[:200]]})
+
+        symbol = request.data.get('symbol')
+        quote = get_quote(symbol) if symbol else None
+        if not quote:
+            return Response({'error': 'Stock not found'}, status=404)
+
+        try:
+            order = place_order(
+                request.user,
+                symbol,
+                request.data.get('side'),
+                request.data.get('order_type', 'limit'),
+                request.data.get('quantity', 0),
+                request.data.get('trigger_price', 0),
+                current_price=quote['current_price'],
+            )
+        except TradeError as e:
+            return Response({'error': str(e)}, status=400)
+
+        return Response({'success': True, 'order': serialize_order(order)}, status=201)
+    except Exception as e:
+        return Response({'error': str(e)}, status=500)
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def cancel_portfolio_order(request, order_id):
+    """Cancel an open order"""
+    try:
+        if not cancel_order(request.user, order_id):
+            return Response({'error': 'Open order not found'}, status=404)
+        return Response({'success': True})
+    except Exception as e:
+        return Response({'error': str(e)}, status=500)
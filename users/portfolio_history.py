@@ -0,0 +1,132 @@
+"""
+Portfolio value history - snapshots written by the revaluation job and the
+windowed series served to the portfolio chart.
+
+Snapshots are tiered by age: intraday rows (optional) are kept for
+INTRADAY_RETENTION_DAYS, daily rows for DAILY_RETENTION_DAYS, and older
+data is weekly. A rollup keeps the last snapshot of each day (then week) and
+drops the rest, so a user with years of history has a few hundred rows and
+any chart window is one range scan on the (portfolio, taken_at) index.
+"""
+from datetime import timedelta
+
+import numpy as np
+from django.db.models import FloatField
+from django.db.models.functions import Cast
+from django.utils import timezone
+
+from .bulk_writes import executemany_insert, executemany_update
+from .models import PortfolioSnapshot
+
+INTRADAY_RETENTION_DAYS = 2
+DAILY_RETENTION_DAYS = 365
+# Upper bound on points returned for one chart window
+DEFAULT_POINTS = 200
+MAX_POINTS = 1000
+MAX_HISTORY_DAYS = 3650
+
+
+def record_snapshots(portfolio_ids, values, resolution, taken_at):
+    """
+    Bulk-insert one snapshot per portfolio. `values` are floats and
+    `taken_at` a database-ready timestamp, as produced by the revaluation job.
+    """
+    return executemany_insert(
+        PortfolioSnapshot, ['portfolio', 'resolution', 'value', 'taken_at'],
+        ((pk, resolution, value, taken_at) for pk, value in zip(portfolio_ids, values)),
+    )
+
+
+def _keep_last_per_period(rows, period_of):
+    """
+    Ids of the last snapshot in each (portfolio, period) group.
+    `rows` are (id, portfolio_id, taken_at) ordered by portfolio and time.
+    """
+    ids = np.array([pk for pk, _, _ in rows], dtype=np.int64)
+    portfolio = np.array([portfolio_id for _, portfolio_id, _ in rows], dtype=np.int64)
+    period = np.array([period_of(taken_at) for _, _, taken_at in rows], dtype=np.int64)
+    last = np.r_[(portfolio[1:] != portfolio[:-1]) | (period[1:] != period[:-1]), True]
+    return ids[last].tolist()
+
+
+def _rollup(source, target, cutoff, period_of):
+    """Relabel the last `source` snapshot of each period before `cutoff` as `target`, drop the rest"""
+    stale = PortfolioSnapshot.objects.filter(resolution=source, taken_at__lt=cutoff)
+    rows = list(stale.order_by('portfolio_id', 'taken_at').values_list('id', 'portfolio_id', 'taken_at'))
+    if not rows:
+        return 0
+
+    # Periods that already have a target snapshot (e.g. an end-of-day row) need no promotion
+    covered = {
+        (portfolio_id, period_of(taken_at))
+        for portfolio_id, taken_at in PortfolioSnapshot.objects.filter(
+            resolution=target, taken_at__gte=rows[0][2], taken_at__lt=cutoff,
+        ).values_list('portfolio_id', 'taken_at')
+    }
+    keep = _keep_last_per_period(rows, period_of)
+    by_id = {pk: (portfolio_id, taken_at) for pk, portfolio_id, taken_at in rows}
+    promote = [
+        (pk, target) for pk in keep
+        if (by_id[pk][0], period_of(by_id[pk][1])) not in covered
+    ]
+    executemany_update(PortfolioSnapshot, ['resolution'], promote, prepare=False)
+    stale.delete()
+    return len(promote)
+
+
+def _day(taken_at):
+    return taken_at.date().toordinal()
+
+
+def _week(taken_at):
+    return taken_at.date().toordinal() // 7
+
+
+def rollup_snapshots(now=None):
+    """
+    Roll intraday snapshots older than INTRADAY_RETENTION_DAYS up to daily and
+    daily snapshots older than DAILY_RETENTION_DAYS up to weekly. Only whole
+    days and weeks are rolled up.
+    """
+    now = now or timezone.now()
+    day_cutoff = (now - timedelta(days=INTRADAY_RETENTION_DAYS)).replace(hour=0, minute=0, second=0, microsecond=0)
+    week_cutoff = (now - timedelta(days=DAILY_RETENTION_DAYS)).replace(hour=0, minute=0, second=0, microsecond=0)
+    # Align to the start of a _week() period (ordinal divisible by 7)
+    week_cutoff -= timedelta(days=week_cutoff.date().toordinal() % 7)
+    return {
+        'daily': _rollup('intraday', 'daily', day_cutoff, _day),
+        'weekly': _rollup('daily', 'weekly', week_cutoff, _week),
+    }
+
+
+def history_series(portfolio, days=30, points=DEFAULT_POINTS, now=None):
+    """
+    Portfolio value over the last `days`, downsampled to at most `points`
+    evenly spaced buckets (the last snapshot in each). The current valuation
+    is appended as the final point.
+    """
+    now = now or timezone.now()
+    start = now - timedelta(days=days)
+    rows = list(
+        PortfolioSnapshot.objects.filter(portfolio=portfolio, taken_at__gte=start)
+        .order_by('taken_at')
+        .values_list('taken_at', Cast('value', FloatField()))
+    )
+    valued_at = portfolio.valued_at or now
+    if not rows or valued_at > rows[-1][0]:
+        rows.append((valued_at, float(portfolio.total_value)))
+
+    if len(rows) > points:
+        seconds = np.array([taken_at.timestamp() for taken_at, _ in rows])
+        bucket = np.minimum((seconds - start.timestamp()) * points // (days * 86400), points - 1)
+        last = np.r_[bucket[1:] != bucket[:-1], True]
+        rows = [row for row, keep in zip(rows, last) if keep]
+
+    return [
+        {
+            'date': taken_at.strftime('%Y-%m-%d'),
+            'timestamp': taken_at.isoformat(),
+            'value': round(value, 2),
+        }
+        for taken_at, value in rows
+    ]
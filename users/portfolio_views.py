@@ -5,19 +5,27 @@ from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from django.http import JsonResponse
-from django.utils import timezone
-from datetime import timedelta
+from datetime import date
 from decimal import Decimal
 import json
-import random
 
 # --- UPDATED IMPORTS ---
-import yfinance as yf
-import pandas as pd
+import numpy as np
+from .provider_guard import guarded_provider
 from .ml_predictor import ML_PREDICTOR, TICKERS
+from .prediction_cache import serve_prediction
 # -----------------------
 
-from .models import UserProfile, DemoPortfolio, PredictedStockData
+from .models import UserProfile, DemoPortfolio, PredictedStockData, Position
+from .ohlcv_store import OHLCV_STORE, YEAR_BARS, records_from_history, to_price_history, summarize
+from .portfolio_history import DEFAULT_POINTS, MAX_HISTORY_DAYS, MAX_POINTS, history_series
+from .refresh_scheduler import record_view
+from .risk import BENCHMARKS, MIN_RETURNS, RiskUnavailable, portfolio_risk
+from .sip import SIPError, simulate_sip
+from .backtest import BacktestError, get_result, normalize_spec, request_backtest
+from .idempotency import idempotent
+from .trading import TradeError, execute_basket, execute_trade, get_or_create_portfolio, parse_quantity
+from .quotes import get_quote, get_quotes, request_refresh, quote_age, custom_stock_quote, cached_stock_quote
 
 
 # --- REMOVAL: SAMPLE_STOCKS removed, replaced by live data ---
@@ -25,25 +33,20 @@ from .models import UserProfile, DemoPortfolio, PredictedStockData
 
 def get_stock_info(symbol, use_cache=True):
     """
-    Fetch basic stock info - uses cached data for instant response.
-    Falls back to live API if cache is missing or stale.
+    Fetch basic stock info from the quote serving layer for instant response.
+    Serves the last known data marked with its age and queues a background
+    refresh if it is stale or missing - web requests never wait on the provider.
+    use_cache=False fetches live from the market data provider (scripts and commands only).
     Returns prices in appropriate currency (INR for Indian stocks, USD for US stocks).
     """
+    if use_cache:
+        quote = get_quote(symbol)
+        return quote if quote is not None else _unavailable_stock_info(symbol)
+    
     # First check if it's a custom stock
     from .models import CustomStock
     try:
-        custom_stock = CustomStock.objects.get(symbol=symbol)
-        return {
-            'symbol': custom_stock.symbol,
-            'name': custom_stock.name,
-            'current_price': float(custom_stock.current_price),
-            'change_percent': float(custom_stock.change_percent),
-            'category': custom_stock.category,
-            'sector': custom_stock.sector,
-            'market_cap': custom_stock.market_cap,
-            'full_ticker': symbol,  # Custom stocks don't have full ticker
-            'currency': custom_stock.currency or 'INR',
-        }
+        return custom_stock_quote(CustomStock.objects.get(symbol=symbol))
     except CustomStock.DoesNotExist:
         pass  # Fall through to real stock lookup
     
@@ -51,171 +54,166 @@ def get_stock_info(symbol, use_cache=True):
     from users.ml_predictor import NSE_TICKERS
     is_indian_stock = symbol.upper() in NSE_TICKERS
     
-    # Try cache first for instant response
-    if use_cache:
-        try:
-            cached = PredictedStockData.objects.get(symbol=symbol)
-            # Check if cache is fresh (updated within last 10 minutes)
-            cache_age = timezone.now() - cached.last_updated
-            if cache_age.total_seconds() < 600:  # 10 minutes
-                return {
-                    'symbol': symbol,
-                    'name': cached.name,
-                    'current_price': float(cached.current_price),
-                    'change_percent': float(cached.change_percent),
-                    'category': cached.category,
-                    'sector': cached.sector,
-                    'market_cap': cached.market_cap,
-                    'full_ticker': ML_PREDICTOR._get_full_ticker(symbol),
-                    'currency': 'INR' if is_indian_stock else 'USD',
-                }
-        except PredictedStockData.DoesNotExist:
-            pass  # Fall through to live fetch
-    
-    # Fallback to live API if cache miss or stale
+    # Live API fetch
     full_ticker = ML_PREDICTOR._get_full_ticker(symbol)
     try:
-        ticker = yf.Ticker(full_ticker)
-        info = ticker.info
-        
-        name = info.get('longName') or info.get('shortName') or symbol
-        sector = info.get('sector') or 'Other'
-        market_cap_usd = info.get('marketCap')
-        
-        category = 'Large Cap' 
-        if market_cap_usd and market_cap_usd < 5000000000: 
-            category = 'Small Cap'
-        
-        current_price = info.get('regularMarketPrice') or info.get('currentPrice')
+        metadata = fetch_stock_metadata(symbol)
+        current_price = metadata.pop('current_price')
         
         # Get 1-day change percent
-        history = ticker.history(period="1d", interval="1d")
+        history = guarded_provider().download([full_ticker], period="5d").get(full_ticker)
         change_percent = 0
-        if not history.empty and len(history) > 0 and 'Close' in history.columns:
-             close = history['Close'].iloc[-1]
-             open_price = history['Open'].iloc[-1]
+        if history is not None:
+             close = float(history['close'].iloc[-1])
+             open_price = float(history['open'].iloc[-1])
              change_percent = ((close - open_price) / open_price) * 100 if open_price else 0
-        
-        # Format market cap based on currency
-        if is_indian_stock:
-            # For Indian stocks, market cap is in USD from yfinance, but we display in INR
-            # Approximate conversion (you might want to use a live rate)
-            market_cap_inr = market_cap_usd * 83 if market_cap_usd else None  # Approximate 1 USD = 83 INR
-            market_cap_display = f"₹{market_cap_inr:,.0f} Cr" if market_cap_inr else 'N/A'
-        else:
-            market_cap_display = f"${market_cap_usd:,}" if market_cap_usd else 'N/A'
+             current_price = current_price or close
         
         return {
             'symbol': symbol,
-            'name': name,
+            **metadata,
             'current_price': round(current_price, 2) if current_price else 0.0,
             'change_percent': round(change_percent, 2),
-            'category': category,
-            'sector': sector,
-            'market_cap': market_cap_display,
             'full_ticker': full_ticker,
             'currency': 'INR' if is_indian_stock else 'USD',
         }
     except Exception as e:
-        return {
-            'symbol': symbol,
-            'name': f"{symbol} (Data Unavailable)",
-            'current_price': 0.0,
-            'change_percent': 0.0,
-            'category': 'Unknown',
-            'sector': 'Unknown',
-            'market_cap': 'N/A',
-            'currency': 'INR' if is_indian_stock else 'USD',
-        }
+        return _unavailable_stock_info(symbol)
+
+
+def _unavailable_stock_info(symbol):
+    """Placeholder stock info for symbols with no data (yet)"""
+    from users.ml_predictor import NSE_TICKERS
+    return {
+        'symbol': symbol,
+        'name': f"{symbol} (Data Unavailable)",
+        'current_price': 0.0,
+        'change_percent': 0.0,
+        'category': 'Unknown',
+        'sector': 'Unknown',
+        'market_cap': 'N/A',
+        'currency': 'INR' if symbol.upper() in NSE_TICKERS else 'USD',
+    }
+
+
+def fetch_stock_metadata(symbol):
+    """
+    Fetch slow-changing stock metadata (name, sector, category, market cap) from the market data provider.
+    Also returns the quoted price from `info` as 'current_price'.
+    Raises on network errors - callers decide how to fall back.
+    """
+    from users.ml_predictor import NSE_TICKERS
+    is_indian_stock = symbol.upper() in NSE_TICKERS
+    
+    info = guarded_provider().info(ML_PREDICTOR._get_full_ticker(symbol))
+    
+    name = info.get('longName') or info.get('shortName') or symbol
+    sector = info.get('sector') or 'Other'
+    market_cap_usd = info.get('marketCap')
+    
+    category = 'Large Cap' 
+    if market_cap_usd and market_cap_usd < 5000000000: 
+        category = 'Small Cap'
+    
+    # Format market cap based on currency
+    if is_indian_stock:
+        # For Indian stocks, market cap is in USD from yfinance, but we display in INR
+        # Approximate conversion (you might want to use a live rate)
+        market_cap_inr = market_cap_usd * 83 if market_cap_usd else None  # Approximate 1 USD = 83 INR
+        market_cap_display = f"₹{market_cap_inr:,.0f} Cr" if market_cap_inr else 'N/A'
+    else:
+        market_cap_display = f"${market_cap_usd:,}" if market_cap_usd else 'N/A'
+    
+    return {
+        'name': name,
+        'sector': sector,
+        'category': category,
+        'market_cap': market_cap_display,
+        'current_price': info.get('regularMarketPrice') or info.get('currentPrice'),
+    }
 
 
 def get_stock_price(symbol):
     """Get current price for a stock - handles both custom and real stocks"""
-    from .models import CustomStock
-    try:
-        custom_stock = CustomStock.objects.get(symbol=symbol)
-        return float(custom_stock.current_price)
-    except CustomStock.DoesNotExist:
-        pass
-    info = get_stock_info(symbol)
-    return info.get('current_price', 0.0)
+    quote = get_quote(symbol)
+    return quote['current_price'] if quote else 0.0
 
 
 def generate_price_history(symbol, days=60, use_cache=True):
     """
-    Generate price history for a stock - uses cached data for instant response.
-    Falls back to live API if cache is missing.
+    Generate price history for a stock - uses the OHLCV store for instant response.
+    use_cache=False fetches live from the market data provider (scripts and commands only).
     """
     # First check if it's a custom stock
     from .models import CustomStock
     try:
         custom_stock = CustomStock.objects.get(symbol=symbol)
-        history = custom_stock.price_history or []
-        return history[-days:] if len(history) > days else history
+        return to_price_history(load_history_records(symbol, days, custom_stock.price_history))
     except CustomStock.DoesNotExist:
         pass  # Fall through to real stock lookup
     
-    # Try cache first for instant response
+    # Serve the stored history, queueing a background refresh if it is stale
     if use_cache:
         try:
             cached = PredictedStockData.objects.get(symbol=symbol)
-            cache_age = timezone.now() - cached.last_updated
-            if cache_age.total_seconds() < 600:  # 10 minutes
-                # Return cached history, limiting to requested days
-                history = cached.price_history or []
-                return history[-days:] if len(history) > days else history
         except PredictedStockData.DoesNotExist:
-            pass  # Fall through to live fetch
+            request_refresh([symbol])
+            return []
+        if quote_age(cached.last_updated, symbol)[1]:
+            request_refresh([symbol])
+        return to_price_history(load_history_records(symbol, days, cached.price_history))
     
-    # Fallback to live API if cache miss
+    # Live API fetch
     full_ticker = ML_PREDICTOR._get_full_ticker(symbol)
     
     try:
         # Fetch 90 calendar days to ensure MA50 can be calculated
-        df = yf.download(full_ticker, period="90d", interval="1d", progress=False, auto_adjust=True)
-        if df.empty:
-            return []
-        
-        # Handle multi-index columns from yfinance
-        if isinstance(df.columns, pd.MultiIndex):
-            df.columns = df.columns.get_level_values(0)
-        
-        # Reset index to get date as a column
-        df = df.reset_index()
-        
-        # Handle column names - convert to lowercase strings
-        new_columns = []
-        for col in df.columns:
-            if isinstance(col, tuple):
-                # MultiIndex: take first level
-                col_name = str(col[0]).lower()
-            elif isinstance(col, str):
-                col_name = col.lower()
-            else:
-                col_name = str(col).lower()
-            new_columns.append(col_name)
-        df.columns = new_columns
-        
-        # Ensure we have required columns
-        required_cols = ['open', 'high', 'low', 'close', 'volume']
-        missing_cols = [c for c in required_cols if c not in df.columns]
-        if missing_cols:
-            print(f"Warning: Missing columns for {symbol}: {missing_cols}")
+        df = guarded_provider().download([full_ticker], period="90d").get(full_ticker)
+        if df is None:
             return []
-        
-        # Rename date column if needed
-        if 'date' not in df.columns:
-            # Look for date-like column names
-            for col in df.columns:
-                if 'date' in col.lower() or col.lower() == 'index':
-                    df = df.rename(columns={col: 'date'})
-                    break
     except Exception as e:
         print(f"Error fetching price history for {symbol}: {e}")
         import traceback
         traceback.print_exc()
         return []
 
+    return price_history_from_frame(df, days)
+
+
+def load_history_records(symbol, days=60, legacy_history=None):
+    """
+    Read the latest `days` bars for a symbol from the columnar OHLCV store.
+    Rows written before the store existed fall back to their JSON price_history.
+    """
+    records = OHLCV_STORE.read(symbol, days=days)
+    if len(records) == 0 and legacy_history:
+        records = records_from_history(legacy_history[-days:])
+    return records
+
+
+def detail_history_and_summary(symbol, stock, current_price, days=60, summary_only=False):
+    """
+    Chart history and summary statistics for a stock row (CustomStock or
+    PredictedStockData). The summary is the one precomputed when the prices
+    were written; only a non-default chart window recomputes its window stats.
+    Returns (price_history, summary); price_history is None for summary_only.
+    """
+    summary = stock.summary
+    if summary_only and summary:
+        return None, summary
+    
+    records = load_history_records(symbol, days, stock.price_history)
+    if not summary or summary.get('days') != days:
+        # Rows written before summaries were stored, or a custom chart window
+        summary = {**(summary or {}), **summarize(records, current_price), 'days': days}
+    return (None if summary_only else to_price_history(records)), summary
+
+
+def price_history_from_frame(df, days=60):
+    """Build the chart price history (with MA20/MA50) from a normalized OHLCV frame"""
+    import pandas as pd
+    df = df.copy()
+    
     # Calculate Moving Averages (MA20 and MA50) locally
     df['ma20'] = df['close'].rolling(window=20).mean()
     df['ma50'] = df['close'].rolling(window=50).mean()
@@ -224,9 +222,9 @@ def generate_price_history(symbol, days=60, use_cache=True):
     df = df.tail(days)
     
     history = []
-    for index, row in df.iterrows():
+    for date, row in df.iterrows():
         history.append({
-            'date': row['date'].strftime('%Y-%m-%d'),
+            'date': date.strftime('%Y-%m-%d'),
             'price': round(row['close'], 2),
             'volume': int(row['volume']),
             'open': round(row['open'], 2),
@@ -239,78 +237,67 @@ def generate_price_history(symbol, days=60, use_cache=True):
     return history
 
 
+def position_holding(user, symbol):
+    """The user's position in a symbol as {'quantity', 'avg_price'} (empty if none)"""
+    position = Position.objects.filter(portfolio__user=user, symbol=symbol).values('quantity', 'avg_price').first()
+    if not position:
+        return {}
+    return {'quantity': float(position['quantity']), 'avg_price': float(position['avg_price'])}
+
+
 def calculate_portfolio_data(portfolio):
-    """Helper function to calculate portfolio values"""
-    # Ensure holdings is a dict
-    holdings = portfolio.holdings if isinstance(portfolio.holdings, dict) else {}
-    if holdings is None:
-        holdings = {}
+    """
+    Value a portfolio in one pass: one query for the positions, one bulk quote
+    lookup for all held symbols, then vectorized P&L arithmetic.
+    """
+    positions = list(
+        portfolio.positions.filter(quantity__gt=0, avg_price__gt=0).values_list('symbol', 'quantity', 'avg_price')
+    )
+    symbols = [symbol for symbol, _, _ in positions]
+    quotes = get_quotes(symbols)
+    
+    quantity = np.array([float(q) for _, q, _ in positions])
+    avg_price = np.array([float(p) for _, _, p in positions])
+    current_price = np.array([quotes[symbol]['current_price'] if symbol in quotes else 0.0 for symbol in symbols])
+    # If stock price not found, use avg_price as fallback
+    current_price = np.where(current_price > 0, current_price, avg_price)
+    
+    invested = quantity * avg_price
+    current_value = quantity * current_price
+    pnl = current_value - invested
+    pnl_percent = pnl / invested * 100
     
-    total_invested = Decimal('0')
-    total_current_value = Decimal('0')
     holdings_list = []
-        
-    for symbol, holding_data in holdings.items():
-        try:
-            if not isinstance(holding_data, dict):
-                continue
-            
-            quantity = Decimal(str(holding_data.get('quantity', 0)))
-            avg_price = Decimal(str(holding_data.get('avg_price', 0)))
-            current_price_val = get_stock_price(symbol)
-            if current_price_val <= 0:
-                # If stock price not found, use avg_price as fallback
-                current_price_val = float(avg_price) if avg_price > 0 else 0
-            
-            if quantity <= 0 or avg_price <= 0:
-                continue
-                
-            current_price = Decimal(str(current_price_val))
-            
-            invested = quantity * avg_price
-            current_value = quantity * current_price
-            pnl = current_value - invested
-            pnl_percent = (pnl / invested * 100) if invested > 0 else 0
-            
-            total_invested += invested
-            total_current_value += current_value
-            
-            stock_info = get_stock_info(symbol)
-            
-            holdings_list.append({
-                'symbol': symbol,
-                'name': stock_info.get('name', symbol),
-                'quantity': float(quantity),
-                'avg_price': float(avg_price),
-                'current_price': float(current_price),
-                'invested': float(invested),
-                'current_value': float(current_value),
-                'pnl': float(pnl),
-                'pnl_percent': float(pnl_percent),
-                'change_percent': stock_info.get('change_percent', 0),
-                'sector': stock_info.get('sector', 'Other'),
-                'category': stock_info.get('category', 'Unknown'),
-            })
-        except Exception as e:
-            # Skip holdings with errors, log for debugging
-            import traceback
-            print(f"Error processing holding {symbol}: {e}")
-            print(traceback.format_exc())
-            continue
+    for i, symbol in enumerate(symbols):
+        stock_info = quotes.get(symbol) or _unavailable_stock_info(symbol)
+        holdings_list.append({
+            'symbol': symbol,
+            'name': stock_info.get('name', symbol),
+            'quantity': float(quantity[i]),
+            'avg_price': float(avg_price[i]),
+            'current_price': float(current_price[i]),
+            'invested': float(invested[i]),
+            'current_value': float(current_value[i]),
+            'pnl': float(pnl[i]),
+            'pnl_percent': float(pnl_percent[i]),
+            'change_percent': stock_info.get('change_percent', 0),
+            'sector': stock_info.get('sector', 'Other'),
+            'category': stock_info.get('category', 'Unknown'),
+        })
     
-    # Ensure portfolio.balance is Decimal for calculation
-    portfolio_balance = Decimal(str(portfolio.balance)) if not isinstance(portfolio.balance, Decimal) else portfolio.balance
-    total_portfolio_value = portfolio_balance + total_current_value
+    total_invested = float(invested.sum())
+    total_current_value = float(current_value.sum())
+    balance = float(portfolio.balance)
     total_pnl = total_current_value - total_invested
-    total_pnl_percent = (total_pnl / total_invested * 100) if total_invested > 0 else Decimal('0')
+    total_pnl_percent = (total_pnl / total_invested * 100) if total_invested > 0 else 0.0
     
     return {
-        'balance': float(portfolio_balance),
-        'invested': float(total_invested),
-        'current_value': float(total_current_value),
-        'total_value': float(total_portfolio_value),
-        'total_pnl': float(total_pnl),
-        'total_pnl_percent': float(total_pnl_percent),
+        'balance': balance,
+        'invested': total_invested,
+        'current_value': total_current_value,
+        'total_value': balance + total_current_value,
+        'total_pnl': total_pnl,
+        'total_pnl_percent': total_pnl_percent,
         'holdings': holdings_list,
         'holdings_count': len(holdings_list),
     }
@@ -372,58 +359,29 @@ def get_stocks(request):
     try:
         from .models import CustomStock
         
-        stocks = []
-        
         # First, add custom stocks (always available)
         custom_stocks = CustomStock.objects.filter(current_price__gt=0).order_by('symbol')
-        for custom in custom_stocks:
-            stocks.append({
-                'symbol': custom.symbol,
-                'name': custom.name,
-                'current_price': float(custom.current_price),
-                'change_percent': float(custom.change_percent),
-                'category': custom.category,
-                'sector': custom.sector,
-                'market_cap': custom.market_cap,
-                'currency': custom.currency or 'INR',
-                'is_custom': True,  # Flag to identify custom stocks
-            })
-        
-        # Then, add cached real stocks
+        stocks = [custom_stock_quote(custom) for custom in custom_stocks]
+        seen = {stock['symbol'] for stock in stocks}
+        
+        # Then, add cached real stocks - stale ones are served as-is and refreshed in the background
         cached_stocks = PredictedStockData.objects.filter(
             current_price__gt=0
         ).order_by('symbol')
         
+        to_refresh = []
         for cached in cached_stocks:
-            cache_age = timezone.now() - cached.last_updated
-            if cache_age.total_seconds() < 600:  # 10 minutes
-                stocks.append({
-                    'symbol': cached.symbol,
-                    'name': cached.name,
-                    'current_price': float(cached.current_price),
-                    'change_percent': float(cached.change_percent),
-                    'category': cached.category,
-                    'sector': cached.sector,
-                    'market_cap': cached.market_cap,
-                    'currency': cached.currency or 'USD',
-                    'is_custom': False,
-                })
-        
-        # Always include real stocks from TICKERS list (even if not in cache)
-        # This ensures users can see and trade real stocks like AAPL, GOOGL, etc.
-        for symbol in TICKERS:
-            # Skip if already added (either as custom or cached)
-            if any(s['symbol'] == symbol for s in stocks):
-                continue
-            try:
-                info = get_stock_info(symbol, use_cache=False)
-                if info.get('current_price', 0.0) > 0.0:
-                    info['is_custom'] = False
-                    stocks.append(info)
-            except Exception as e:
-                # Skip stocks that fail to fetch
-                print(f"Warning: Could not fetch {symbol}: {e}")
+            if cached.symbol in seen:
                 continue
+            quote = cached_stock_quote(cached)
+            if quote['is_stale']:
+                to_refresh.append(cached.symbol)
+            stocks.append(quote)
+            seen.add(cached.symbol)
+        
+        # Real stocks from TICKERS with no data yet are fetched in the background too
+        to_refresh += [symbol for symbol in TICKERS if symbol not in seen]
+        request_refresh(to_refresh)
         
         return Response({'stocks': stocks})
     except Exception as e:
@@ -440,38 +398,28 @@ def get_stock_detail(request, symbol):
     try:
         from .models import CustomStock
         
+        # Chart window (trading days), at most a year - the store keeps the full history
+        try:
+            days = int(request.query_params.get('days', 60))
+        except ValueError:
+            return Response({'error': 'days must be a whole number'}, status=400)
+        if days < 1:
+            return Response({'error': 'days must be positive'}, status=400)
+        days = min(days, YEAR_BARS)
+        # Clients that only need the quote and statistics can skip the history
+        summary_only = request.query_params.get('summary_only') in ('1', 'true')
+        record_view(symbol)
+        
         # First check if it's a custom stock
         try:
             custom_stock = CustomStock.objects.get(symbol=symbol)
-            price_history = custom_stock.price_history or []
             current_price = float(custom_stock.current_price)
-            
-            # Calculate summary statistics
-            if price_history:
-                prices = [h.get('price', h.get('close', 0)) for h in price_history]
-                volumes = [h.get('volume', 0) for h in price_history]
-                high_price = max(prices) if prices else current_price
-                low_price = min(prices) if prices else current_price
-                avg_price = sum(prices) / len(prices) if prices else current_price
-                avg_volume = sum(volumes) / len(volumes) if volumes else 0
-                
-                latest_entry = price_history[-1] if price_history else {}
-                ma20 = latest_entry.get('ma20')
-                ma50 = latest_entry.get('ma50')
-            else:
-                high_price = low_price = avg_price = current_price
-                avg_volume = 0
-                ma20 = ma50 = None
+            price_history, summary = detail_history_and_summary(symbol, custom_stock, current_price, days, summary_only)
             
             # Check if user owns this stock
-            portfolio, _ = DemoPortfolio.objects.get_or_create(
-                user=request.user,
-                defaults={'balance': 50000.00, 'holdings': {}, 'total_value': 50000.00}
-            )
-            holdings = portfolio.holdings or {}
-            holding = holdings.get(symbol, {})
+            holding = position_holding(request.user, symbol)
             
-            return Response({
+            response = {
                 'symbol': custom_stock.symbol,
                 'name': custom_stock.name,
                 'current_price': current_price,
@@ -480,204 +428,80 @@ def get_stock_detail(request, symbol):
                 'sector': custom_stock.sector,
                 'market_cap': custom_stock.market_cap,
                 'currency': custom_stock.currency or 'INR',
-                'price_history': price_history,
-                'summary': {
-                    'high': round(high_price, 2),
-                    'low': round(low_price, 2),
-                    'average': round(avg_price, 2),
-                    'avg_volume': round(avg_volume, 0),
-                    'ma20': round(ma20, 2) if ma20 else None,
-                    'ma50': round(ma50, 2) if ma50 else None,
-                },
+                'summary': summary,
                 'holding': {
                     'quantity': holding.get('quantity', 0),
                     'avg_price': holding.get('avg_price', 0),
                     'invested': holding.get('quantity', 0) * holding.get('avg_price', 0),
                 } if holding else None,
                 'is_custom': True,
-            })
+            }
+            if not summary_only:
+                response['price_history'] = price_history
+            return Response(response)
         except CustomStock.DoesNotExist:
             pass  # Fall through to real stock lookup
         
-        # Try to get from cache first for instant response
+        # Serve the last known data - never block the request on a live fetch
         try:
             cached = PredictedStockData.objects.get(symbol=symbol)
-            cache_age = timezone.now() - cached.last_updated
-            
-            if cache_age.total_seconds() < 600:  # 10 minutes - use cache
-                price_history = cached.price_history or []
-                current_price = float(cached.current_price)
-                
-                # Calculate summary statistics from cached history
-                if price_history:
-                    prices = [h.get('price', h.get('close', 0)) for h in price_history]
-                    volumes = [h.get('volume', 0) for h in price_history]
-                    high_price = max(prices) if prices else current_price
-                    low_price = min(prices) if prices else current_price
-                    avg_price = sum(prices) / len(prices) if prices else current_price
-                    avg_volume = sum(volumes) / len(volumes) if volumes else 0
-                    
-                    latest_entry = price_history[-1] if price_history else {}
-                    ma20 = latest_entry.get('ma20')
-                    ma50 = latest_entry.get('ma50')
-                else:
-                    high_price = low_price = avg_price = current_price
-                    avg_volume = 0
-                    ma20 = ma50 = None
-                
-                # Check if user owns this stock
-                portfolio, _ = DemoPortfolio.objects.get_or_create(
-                    user=request.user,
-                    defaults={'balance': 50000.00, 'holdings': {}, 'total_value': 50000.00}
-                )
-                holdings = portfolio.holdings or {}
-                holding = holdings.get(symbol, {})
-                
-                return Response({
-                    'symbol': cached.symbol,
-                    'name': cached.name,
-                    'current_price': current_price,
-                    'change_percent': float(cached.change_percent),
-                    'category': cached.category,
-                    'sector': cached.sector,
-                    'market_cap': cached.market_cap,
-                    'currency': cached.currency or 'USD',
-                    'price_history': price_history,
-                    'summary': {
-                        'high': round(high_price, 2),
-                        'low': round(low_price, 2),
-                        'average': round(avg_price, 2),
-                        'avg_volume': round(avg_volume, 0),
-                        'ma20': round(ma20, 2) if ma20 else None,
-                        'ma50': round(ma50, 2) if ma50 else None,
-                    },
-                    'holding': {
-                        'quantity': holding.get('quantity', 0),
-                        'avg_price': holding.get('avg_price', 0),
-                        'invested': holding.get('quantity', 0) * holding.get('avg_price', 0),
-                    } if holding else None,
-                    'is_custom': False,
-                })
         except PredictedStockData.DoesNotExist:
-            pass  # Fall through to live fetch
-        
-        # Fallback to live data if cache miss
-        stock_info = get_stock_info(symbol, use_cache=False)
-        if stock_info.get('current_price', 0.0) <= 0.0:
-            return Response({'error': 'Stock not found'}, status=404)
+            if symbol not in TICKERS:
+                return Response({'error': 'Stock not found'}, status=404)
+            request_refresh([symbol])
+            return Response({'error': 'Stock data not available yet', 'refresh_queued': True}, status=404)
         
-        current_price = get_stock_price(symbol)
-        price_history = generate_price_history(symbol, 60, use_cache=False)  # Generate 60 days for better MA calculations
-        
-        # Calculate summary statistics
-        if price_history:
-            prices = [h['price'] for h in price_history]
-            volumes = [h['volume'] for h in price_history]
-            high_price = max(prices) if prices else current_price
-            low_price = min(prices) if prices else current_price
-            avg_price = sum(prices) / len(prices) if prices else current_price
-            avg_volume = sum(volumes) / len(volumes) if volumes else 0
-            
-            # Get latest MA values
-            latest_entry = price_history[-1] if price_history else {}
-            ma20 = latest_entry.get('ma20')
-            ma50 = latest_entry.get('ma50')
-        else:
-            high_price = low_price = avg_price = current_price
-            avg_volume = 0
-            ma20 = ma50 = None
+        quote = cached_stock_quote(cached)
+        if quote['is_stale']:
+            request_refresh([symbol])
+        current_price = quote['current_price']
+        price_history, summary = detail_history_and_summary(symbol, cached, current_price, days, summary_only)
         
         # Check if user owns this stock
-        portfolio, _ = DemoPortfolio.objects.get_or_create(
-            user=request.user,
-            defaults={'balance': 50000.00, 'holdings': {}, 'total_value': 50000.00}
-        )
-        holdings = portfolio.holdings or {}
-        holding = holdings.get(symbol, {})
+        holding = position_holding(request.user, symbol)
         
-        return Response({
-            **stock_info,
-            'current_price': current_price,
-            'price_history': price_history,
-            'summary': {
-                'high': round(high_price, 2),
-                'low': round(low_price, 2),
-                'average': round(avg_price, 2),
-                'avg_volume': round(avg_volume, 0),
-                'ma20': round(ma20, 2) if ma20 else None,
-                'ma50': round(ma50, 2) if ma50 else None,
-            },
+        response = {
+            **quote,
+            'summary': summary,
             'holding': {
                 'quantity': holding.get('quantity', 0),
                 'avg_price': holding.get('avg_price', 0),
                 'invested': holding.get('quantity', 0) * holding.get('avg_price', 0),
             } if holding else None,
-        })
+        }
+        if not summary_only:
+            response['price_history'] = price_history
+        return Response(response)
     except Exception as e:
         return Response({'error': str(e)}, status=500)
 
 
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
+@idempotent
 def buy_stock(request):
-    """Buy stock and check for achievements"""
-    from .achievement_views import check_and_unlock_achievements
     """Buy stock in demo portfolio"""
     try:
         symbol = request.data.get('symbol')
-        quantity = int(request.data.get('quantity', 0))
+        try:
+            quantity = parse_quantity(request.data.get('quantity', 0))
+        except TradeError as e:
+            return Response({'error': str(e)}, status=400)
         
-        if not symbol or quantity <= 0:
-            return Response({'error': 'Invalid symbol or quantity'}, status=400)
+        if not symbol:
+            return Response({'error': 'Invalid symbol'}, status=400)
         
         current_price = get_stock_price(symbol)
         if current_price <= 0:
             return Response({'error': 'Stock not found'}, status=404)
         
-        total_cost = Decimal(str(current_price)) * Decimal(str(quantity))
-        
-        portfolio, _ = DemoPortfolio.objects.get_or_create(
-            user=request.user,
-            defaults={'balance': Decimal('50000.00'), 'holdings': {}, 'total_value': Decimal('50000.00')}
-        )
-        
-        # Ensure balance is Decimal type
-        if not isinstance(portfolio.balance, Decimal):
-            portfolio.balance = Decimal(str(portfolio.balance))
-        
-        if portfolio.balance < total_cost:
-            return Response({'error': 'Insufficient balance'}, status=400)
-        
-        # Update holdings
-        holdings = portfolio.holdings or {}
-        if symbol in holdings:
-            # Calculate new average price
-            old_quantity = Decimal(str(holdings[symbol]['quantity']))
-            old_avg_price = Decimal(str(holdings[symbol]['avg_price']))
-            new_investment = total_cost
-            
-            new_quantity = old_quantity + Decimal(str(quantity))
-            new_avg_price = ((old_quantity * old_avg_price) + new_investment) / new_quantity
-            
-            holdings[symbol] = {
-                'quantity': float(new_quantity),
-                'avg_price': float(new_avg_price),
-            }
-        else:
-            holdings[symbol] = {
-                'quantity': quantity,
-                'avg_price': float(current_price),
-            }
-        
-        portfolio.holdings = holdings
-        # Ensure both sides are Decimal for subtraction
-        if not isinstance(portfolio.balance, Decimal):
-            portfolio.balance = Decimal(str(portfolio.balance))
-        portfolio.balance = portfolio.balance - total_cost
-        portfolio.save()
+        try:
+            execute_trade(request.user, symbol, 'buy', quantity, current_price)
+        except TradeError as e:
+            return Response({'error': str(e)}, status=400)
         
         # Calculate and return updated portfolio data
-        portfolio_data = calculate_portfolio_data(portfolio)
+        portfolio_data = calculate_portfolio_data(get_or_create_portfolio(request.user))
         portfolio_data['success'] = True
         portfolio_data['message'] = f'Successfully bought {quantity} shares of {symbol}'
         
@@ -688,52 +512,74 @@ def buy_stock(request):
 
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
+@idempotent
 def sell_stock(request):
     """Sell stock from demo portfolio"""
     try:
         symbol = request.data.get('symbol')
-        quantity = int(request.data.get('quantity', 0))
+        try:
+            quantity = parse_quantity(request.data.get('quantity', 0))
+        except TradeError as e:
+            return Response({'error': str(e)}, status=400)
         
-        if not symbol or quantity <= 0:
-            return Response({'error': 'Invalid symbol or quantity'}, status=400)
+        if not symbol:
+            return Response({'error': 'Invalid symbol'}, status=400)
         
         current_price = get_stock_price(symbol)
         if current_price <= 0:
             return Response({'error': 'Stock not found'}, status=404)
         
-        portfolio, _ = DemoPortfolio.objects.get_or_create(
-            user=request.user,
-            defaults={'balance': Decimal('50000.00'), 'holdings': {}, 'total_value': Decimal('50000.00')}
-        )
-        
-        # Ensure balance is Decimal type
-        if not isinstance(portfolio.balance, Decimal):
-            portfolio.balance = Decimal(str(portfolio.balance))
+        try:
+            execute_trade(request.user, symbol, 'sell', quantity, current_price)
+        except TradeError as e:
+            return Response({'error': str(e)}, status=400)
         
-        holdings = portfolio.holdings or {}
-        if symbol not in holdings or holdings[symbol]['quantity'] < quantity:
-            return Response({'error': 'Insufficient shares'}, status=400)
+        # Calculate and return updated portfolio data
+        portfolio_data = calculate_portfolio_data(get_or_create_portfolio(request.user))
+        portfolio_data['success'] = True
+        portfolio_data['message'] = f'Successfully sold {quantity} shares of {symbol}'
         
-        # Update holdings
-        holdings[symbol]['quantity'] -= quantity
-        if holdings[symbol]['quantity'] <= 0:
-            del holdings[symbol]
+        return Response(portfolio_data)
+    except Exception as e:
+        return Response({'error': str(e)}, status=500)
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+@idempotent
+def basket_order(request):
+    """
+    Execute several buys and sells in one transaction, e.g. to rebalance.
+    Body: {"legs": [{"symbol": "TCS", "side": "buy", "quantity": 2}, ...]}
+    """
+    try:
+        legs = request.data.get('legs')
+        if not isinstance(legs, list) or not all(isinstance(leg, dict) for leg in legs):
+            return Response({'error': 'legs must be a list of {symbol, side, quantity}'}, status=400)
         
-        sale_amount = Decimal(str(current_price)) * Decimal(str(quantity))
-        portfolio.holdings = holdings
-        # Ensure both sides are Decimal for addition
-        if not isinstance(portfolio.balance, Decimal):
-            portfolio.balance = Decimal(str(portfolio.balance))
-        portfolio.balance = Decimal(str(portfolio.balance)) + sale_amount
-        portfolio.save()
+        # One bulk quote lookup for every leg
+        quotes = get_quotes(leg.get('symbol') for leg in legs if leg.get('symbol'))
+        prices = {symbol: quote['current_price'] for symbol, quote in quotes.items()}
         
-        # Check for achievements after successful trade
-        check_and_unlock_achievements(request.user)
+        try:
+            trades = execute_basket(request.user, legs, prices)
+        except TradeError as e:
+            return Response({'error': str(e)}, status=400)
         
-        # Calculate and return updated portfolio data
-        portfolio_data = calculate_portfolio_data(portfolio)
+        # One valuation for the whole basket - achievements follow from the trade events
+        portfolio_data = calculate_portfolio_data(get_or_create_portfolio(request.user))
         portfolio_data['success'] = True
-        portfolio_data['message'] = f'Successfully sold {quantity} shares of {symbol}'
+        portfolio_data['trades'] = [
+            {
+                'symbol': trade.symbol,
+                'side': trade.side,
+                'quantity': float(trade.quantity),
+                'price': float(trade.price),
+                'amount': float(trade.amount),
+            }
+            for trade in trades
+        ]
+        portfolio_data['message'] = f'Executed {len(trades)} trades'
         
         return Response(portfolio_data)
     except Exception as e:
@@ -742,30 +588,106 @@ def sell_stock(request):
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
-def get_portfolio_history(request):
-    """Get portfolio value history for charts"""
+def get_sip_simulation(request):
+    """
+    What a monthly SIP into a tracked ticker would be worth today, e.g.
+    ?symbol=TCS&amount=5000&start=2023-01-05 - units, invested, current value and XIRR
+    """
     try:
-        # Generate portfolio history (in production, store and retrieve from DB)
-        days = int(request.query_params.get('days', 30))
-        portfolio, _ = DemoPortfolio.objects.get_or_create(
-            user=request.user,
-            defaults={'balance': 50000.00, 'holdings': {}, 'total_value': 50000.00}
-        )
+        symbol = (request.query_params.get('symbol') or '').strip().upper()
+        if not symbol:
+            return Response({'error': 'symbol is required'}, status=400)
+        try:
+            amount = float(request.query_params.get('amount', 0))
+            start = date.fromisoformat(request.query_params.get('start', ''))
+        except ValueError:
+            return Response({'error': 'amount must be a number and start a YYYY-MM-DD date'}, status=400)
+        if amount <= 0:
+            return Response({'error': 'amount must be positive'}, status=400)
+        if start >= date.today():
+            return Response({'error': 'start must be in the past'}, status=400)
         
-        history = []
-        base_value = float(portfolio.balance)
-        holdings = portfolio.holdings or {}
+        try:
+            return Response(simulate_sip(symbol, amount, start))
+        except SIPError as e:
+            return Response({'error': str(e)}, status=404)
+    except Exception as e:
+        return Response({'error': str(e)}, status=500)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def get_portfolio_risk(request):
+    """
+    Risk analytics for the user's holdings: volatility, historical VaR/CVaR,
+    beta against SPY or NIFTY (?benchmark=) and the correlation matrix
+    """
+    try:
+        benchmark = (request.query_params.get('benchmark') or '').upper() or None
+        if benchmark and benchmark not in BENCHMARKS:
+            return Response({'error': f'benchmark must be one of {", ".join(BENCHMARKS)}'}, status=400)
+        days = min(max(int(request.query_params.get('days', YEAR_BARS)), MIN_RETURNS + 1), 2 * YEAR_BARS)
         
-        for i in range(days - 1, -1, -1):
-            # Simulate portfolio value changes
-            change_percent = random.uniform(-0.02, 0.02)
-            current_value = base_value * (1 + change_percent * i / days)
-            
-            date = (timezone.now() - timedelta(days=i)).strftime('%Y-%m-%d')
-            history.append({
-                'date': date,
-                'value': round(current_value, 2),
-            })
+        try:
+            risk = portfolio_risk(get_or_create_portfolio(request.user), benchmark, days)
+        except RiskUnavailable as e:
+            return Response({'error': str(e)}, status=404)
+        if risk is None:
+            return Response({'error': 'No holdings to analyse'}, status=404)
+        
+        return Response(risk)
+    except Exception as e:
+        return Response({'error': str(e)}, status=500)
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def create_backtest(request):
+    """
+    Queue a strategy backtest over the stored history, e.g.
+    {"strategy": "sma_crossover", "symbols": ["AAPL", "TCS"], "params": {"fast": [10, 20], "slow": 50}}
+    Identical backtests are answered from stored results; others are polled at the returned id.
+    """
+    try:
+        try:
+            spec = normalize_spec(request.data)
+        except BacktestError as e:
+            return Response({'error': str(e)}, status=400)
+        
+        try:
+            key, result = request_backtest(spec)
+        except Exception as e:
+            print(f"[BACKTEST] Could not queue backtest: {e}")
+            return Response({'error': 'Backtests are unavailable right now, please try again shortly'}, status=503)
+        
+        backtest_id = key.split(':', 1)[1]
+        return Response({'id': backtest_id, **result}, status=202 if result['status'] == 'pending' else 200)
+    except Exception as e:
+        return Response({'error': str(e)}, status=500)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def get_backtest(request, backtest_id):
+    """Poll a queued backtest"""
+    try:
+        result = get_result(f'backtest:{backtest_id}')
+        if result is None:
+            return Response({'error': 'Backtest not found or expired'}, status=404)
+        return Response({'id': backtest_id, **result})
+    except Exception as e:
+        return Response({'error': str(e)}, status=500)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def get_portfolio_history(request):
+    """Get portfolio value history for charts - stored snapshots, downsampled to the window"""
+    try:
+        days = min(max(int(request.query_params.get('days', 30)), 1), MAX_HISTORY_DAYS)
+        points = min(max(int(request.query_params.get('points', DEFAULT_POINTS)), 2), MAX_POINTS)
+        portfolio = get_or_create_portfolio(request.user)
+        history = history_series(portfolio, days, points)
         
         return Response({'history': history})
     except Exception as e:
@@ -775,67 +697,33 @@ def get_portfolio_history(request):
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def get_ai_recommendation(request):
-    """Get AI recommendation for stocks - uses cached ML predictions for instant response"""
+    """Get AI recommendation for stocks - serves cached ML predictions for instant response"""
     try:
         symbol = request.data.get('symbol')
         
         if not symbol:
             return Response({'error': 'Symbol required'}, status=400)
+        record_view(symbol)
         
-        # Try to get from cache first for instant response
+        # Serve the last cached ML prediction - predictions are only computed by the refresh job
         try:
             cached = PredictedStockData.objects.get(symbol=symbol)
-            cache_age = timezone.now() - cached.last_updated
-            
-            if cache_age.total_seconds() < 600:  # 10 minutes - use cache
-                recommendation = cached.ml_direction
-                confidence = cached.ml_confidence
-                regime = cached.ml_regime
-                vol = cached.ml_volatility
-                
-                # Convert prediction to recommendation message
-                if recommendation == 'bullish':
-                    message = f"ML Analysis: The model suggests an **Up** move with {round(confidence * 100)}% confidence."
-                    action_text = "BUY"
-                elif recommendation == 'bearish':
-                    message = f"ML Analysis: The model suggests a **Down** move with {round(confidence * 100)}% confidence."
-                    action_text = "SELL"
-                else:
-                    message = f"ML Analysis: The model is **Neutral** with {round(confidence * 100)}% confidence."
-                    action_text = "HOLD"
-                
-                reasons = [
-                    f'Market Regime: Currently **{regime}** (Volatility: {round(vol * 100, 2)}%)',
-                    f'Confidence Level: {round(confidence * 100)}%',
-                    f'Predicted Action: {action_text}.'
-                ]
-                
-                return Response({
-                    'symbol': symbol,
-                    'recommendation': recommendation,
-                    'confidence': round(confidence, 2),
-                    'message': message,
-                    'reasons': reasons,
-                    'metadata': {
-                        'regime': regime,
-                        'volatility': round(vol, 4)
-                    }
-                })
         except PredictedStockData.DoesNotExist:
-            pass  # Fall through to live prediction
-        
-        # Fallback to live prediction if cache miss
-        stock_info = get_stock_info(symbol, use_cache=False)
-        if stock_info.get('current_price', 0.0) <= 0.0:
-            return Response({'error': 'Stock data not available for AI analysis'}, status=404)
-        
-        # Run the actual ML prediction
-        prediction_results = ML_PREDICTOR.predict(symbol)
-        
-        recommendation = prediction_results['direction']
-        confidence = prediction_results['confidence']
-        regime = prediction_results['regime']
-        vol = prediction_results['vol']
+            if symbol not in TICKERS:
+                return Response({'error': 'Stock data not available for AI analysis'}, status=404)
+            request_refresh([symbol])
+            return Response({'error': 'AI analysis not available yet', 'refresh_queued': True}, status=404)
+        
+        age_seconds, is_stale = quote_age(cached.last_updated, symbol)
+        if is_stale:
+            request_refresh([symbol])
+        
+        # The prediction for the latest stored bar, else the one saved with the quote
+        prediction = serve_prediction(symbol, row=cached)
+        recommendation = prediction['direction']
+        confidence = prediction['confidence']
+        regime = prediction['regime']
+        vol = prediction['vol']
         
         # Convert prediction to recommendation message
         if recommendation == 'bullish':
@@ -862,7 +750,11 @@ def get_ai_recommendation(request):
             'reasons': reasons,
             'metadata': {
                 'regime': regime,
-                'volatility': round(vol, 4)
+                'volatility': round(vol, 4),
+                'model_version': prediction.get('model_version'),
+                'as_of': cached.last_updated.isoformat(),
+                'age_seconds': age_seconds,
+                'is_stale': is_stale,
             }
         })
     except Exception as e:
@@ -0,0 +1,163 @@
+"""
+Prediction cache keyed by (symbol, last bar date, model version).
+
+Every ML prediction - the refresh job, stock challenges and the AI
+recommendation - goes through this cache, so the models run at most once
+per symbol per new bar whatever the traffic; activating a new model
+version changes the key. Entries also hold the close they were predicted
+from: the latest bar may still be forming, and a bar whose close has moved
+since is predicted again. A bounded in-process LRU sits in front of the
+shared Django cache, which carries predictions made by the refresh worker
+over to the web processes. Web requests only read: on a miss they fall back
+to the prediction saved with the symbol's quote (serve_prediction), so the
+models and the market data provider never run inside a request.
+"""
+from collections import OrderedDict
+import threading
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .ml_predictor import ML_PREDICTOR, prediction_dict
+from .models import PredictedStockData
+from .ohlcv_store import OHLCV_STORE, records_to_frame
+
+# Bars read back from the store for the model features (the 63-day
+# volatility/volume features need 64 bars)
+FEATURE_WINDOW = 90
+
+PREDICTION_CACHE_SIZE = getattr(settings, 'PREDICTION_CACHE_SIZE', 2048)
+PREDICTION_CACHE_TTL = 7 * 24 * 3600
+
+
+class LRUCache:
+    """Thread-safe mapping that evicts the least recently used entry beyond maxsize"""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            if key not in self.entries:
+                return None
+            self.entries.move_to_end(key)
+            return self.entries[key]
+
+    def set(self, key, value):
+        with self.lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def __len__(self):
+        return len(self.entries)
+
+
+PREDICTIONS = LRUCache(PREDICTION_CACHE_SIZE)
+
+
+def prediction_key(symbol, bar_date, model_version):
+    return f'prediction:{symbol}:{bar_date}:{model_version}'
+
+
+def _lookup(key, close):
+    entry = PREDICTIONS.get(key)
+    if entry is None:
+        entry = cache.get(key)
+        if entry is not None:
+            PREDICTIONS.set(key, entry)
+    if entry is not None and entry['close'] == close:
+        return entry['prediction']
+    return None
+
+
+def _store(key, close, prediction):
+    entry = {'close': close, 'prediction': prediction}
+    PREDICTIONS.set(key, entry)
+    cache.set(key, entry, PREDICTION_CACHE_TTL)
+
+
+def predict_frames(frames):
+    """
+    Predictions for {symbol: daily OHLCV frame} as {symbol: prediction dict}.
+    Symbols whose latest bar the current models have already predicted are
+    served from the cache; the rest are predicted in one batch.
+    """
+    version = ML_PREDICTOR.active_version()
+    results = {}
+    misses = {}
+    for symbol, df in frames.items():
+        bar_date = df.index[-1].date()
+        close = float(df['close'].iloc[-1])
+        prediction = _lookup(prediction_key(symbol, bar_date, version), close)
+        if prediction is None:
+            misses[symbol] = (bar_date, close)
+        else:
+            results[symbol] = prediction
+
+    if misses:
+        batch = ML_PREDICTOR.predict_many(list(misses), frames={symbol: frames[symbol] for symbol in misses})
+        for record in batch:
+            symbol = str(record['symbol'])
+            results[symbol] = prediction_dict(record)
+            # Fallback predictions are not cached - the next call retries. Keyed by the
+            # version that made the prediction, which a hot reload may have changed.
+            if record['valid']:
+                bar_date, close = misses[symbol]
+                _store(prediction_key(symbol, bar_date, record['model_version']), close, results[symbol])
+    return results
+
+
+def cached_prediction(symbol, download=True, compute=True):
+    """
+    Prediction for a symbol's latest bar. Symbols in the OHLCV store are
+    predicted from the stored window - a cache hit reads only the last bar
+    and does not load the models. Others are downloaded when `download` is
+    set. Without `compute` a miss returns None instead of predicting.
+    """
+    last = OHLCV_STORE.read(symbol, days=1)
+    if len(last):
+        key = prediction_key(symbol, last['date'][-1], ML_PREDICTOR.active_version())
+        prediction = _lookup(key, float(last['close'][-1]))
+        if prediction is not None or not compute:
+            return prediction
+        frame = records_to_frame(OHLCV_STORE.read(symbol, days=FEATURE_WINDOW))
+    elif download and compute:
+        frame = ML_PREDICTOR._download_frames([symbol]).get(symbol)
+        if frame is None or frame.empty:
+            return ML_PREDICTOR._fallback_prediction()
+    else:
+        return None
+    return predict_frames({symbol: frame})[symbol]
+
+
+def stored_prediction(row):
+    """Prediction saved with a PredictedStockData row by the refresh job"""
+    return {
+        'direction': row.ml_direction,
+        'confidence': row.ml_confidence,
+        'regime': row.ml_regime,
+        'vol': row.ml_volatility,
+        'model_version': row.ml_model_version or None,
+    }
+
+
+def serve_prediction(symbol, row=None):
+    """
+    Prediction for a web request: the cached one for the latest stored bar,
+    else the one saved with the symbol's quote (`row`, looked up if not
+    given), else None. Never runs the models or downloads data.
+    """
+    prediction = cached_prediction(symbol, download=False, compute=False)
+    if prediction is not None:
+        return prediction
+    if row is None:
+        row = PredictedStockData.objects.filter(symbol=symbol).first()
+    return stored_prediction(row) if row is not None else None
@@ -0,0 +1,188 @@
+"""
+Guards around the market data provider, kept in the Django cache:
+
+- a per-ticker negative cache: tickers that failed or came back empty are
+  skipped with exponential backoff instead of being retried on every call
+- a global circuit breaker: after repeated failed calls the provider is not
+  called at all for a cooldown, then a single probe call decides whether to
+  close it again
+- a token bucket capping outbound provider calls
+
+The state is shared by the web and Celery workers only when the cache is
+(REDIS_CACHE_URL); with the default per-process LocMemCache each process
+has its own breaker and bucket, and the users.W001 system check warns.
+"""
+import time
+
+from django.core.cache import cache
+
+from ml.market_data import MarketDataProvider, get_provider
+
+# Per-ticker backoff: 1, 2, 4, ... minutes, capped at an hour
+BACKOFF_BASE_SECONDS = 60
+BACKOFF_MAX_SECONDS = 3600
+# Consecutive failed calls that open the breaker, and how long it stays open
+BREAKER_THRESHOLD = 5
+BREAKER_COOLDOWN_SECONDS = 120
+# Outbound calls allowed per window (across all processes with a shared cache)
+TOKEN_BUCKET_SIZE = 30
+TOKEN_BUCKET_WINDOW_SECONDS = 60
+# How long a caller waits for a token before giving up
+TOKEN_WAIT_SECONDS = 5
+
+BREAKER_FAILURES_KEY = 'provider:breaker:failures'
+BREAKER_OPEN_KEY = 'provider:breaker:open'
+BREAKER_PROBE_KEY = 'provider:breaker:probe'
+
+
+class ProviderUnavailable(Exception):
+    """The provider was not called: circuit open or out of rate-limit tokens"""
+
+
+def _backoff_key(ticker):
+    return f'provider:backoff:{ticker.upper()}'
+
+
+def blocked_tickers(tickers):
+    """Tickers the provider should not be asked about right now"""
+    tickers = list(tickers)
+    if cache.get(BREAKER_OPEN_KEY):
+        return set(tickers)
+    now = time.time()
+    entries = cache.get_many([_backoff_key(ticker) for ticker in tickers])
+    return {ticker for ticker in tickers if entries.get(_backoff_key(ticker), {}).get('until', 0) > now}
+
+
+def record_ticker_failures(tickers):
+    """Back off tickers that failed or returned no data"""
+    if not tickers:
+        return
+    now = time.time()
+    keys = {ticker: _backoff_key(ticker) for ticker in tickers}
+    entries = cache.get_many(keys.values())
+    updates = {}
+    for ticker, key in keys.items():
+        failures = entries.get(key, {}).get('failures', 0) + 1
+        delay = min(BACKOFF_BASE_SECONDS * 2 ** (failures - 1), BACKOFF_MAX_SECONDS)
+        updates[key] = {'failures': failures, 'until': now + delay}
+        print(f"[PROVIDER] Backing off {ticker} for {delay}s after {failures} failure(s)")
+    # Keep the failure count around long enough for the backoff to keep growing
+    cache.set_many(updates, BACKOFF_MAX_SECONDS * 2)
+
+
+def clear_ticker_failures(tickers):
+    cache.delete_many([_backoff_key(ticker) for ticker in tickers])
+
+
+def _breaker_allow():
+    """Raise ProviderUnavailable unless the breaker lets this call through"""
+    if cache.get(BREAKER_OPEN_KEY):
+        raise ProviderUnavailable("Market data provider circuit is open")
+    if cache.get(BREAKER_FAILURES_KEY, 0) >= BREAKER_THRESHOLD:
+        # Half-open: exactly one caller probes the provider
+        if not cache.add(BREAKER_PROBE_KEY, True, BREAKER_COOLDOWN_SECONDS):
+            raise ProviderUnavailable("Market data provider circuit is half-open, probe in flight")
+
+
+def _breaker_success():
+    cache.delete_many([BREAKER_FAILURES_KEY, BREAKER_PROBE_KEY])
+
+
+def _breaker_failure():
+    cache.add(BREAKER_FAILURES_KEY, 0, None)
+    try:
+        failures = cache.incr(BREAKER_FAILURES_KEY)
+    except ValueError:
+        failures = 1
+        cache.set(BREAKER_FAILURES_KEY, failures, None)
+    if failures >= BREAKER_THRESHOLD:
+        print(f"[PROVIDER] Circuit open for {BREAKER_COOLDOWN_SECONDS}s after {failures} failed calls")
+        cache.set(BREAKER_OPEN_KEY, True, BREAKER_COOLDOWN_SECONDS)
+        cache.delete(BREAKER_PROBE_KEY)
+
+
+def acquire_token(wait=TOKEN_WAIT_SECONDS):
+    """
+    Take one outbound-call token, waiting up to `wait` seconds for the next
+    window. The bucket is a per-window counter in the shared cache, since
+    cache.incr is the only atomic operation every Django cache backend has.
+    """
+    deadline = time.time() + wait
+    while True:
+        now = time.time()
+        window = int(now // TOKEN_BUCKET_WINDOW_SECONDS)
+        key = f'provider:tokens:{window}'
+        cache.add(key, 0, TOKEN_BUCKET_WINDOW_SECONDS * 2)
+        try:
+            if cache.incr(key) <= TOKEN_BUCKET_SIZE:
+                return True
+        except ValueError:
+            continue  # Window key expired between add and incr
+        next_window = (window + 1) * TOKEN_BUCKET_WINDOW_SECONDS
+        if next_window > deadline:
+            return False
+        time.sleep(next_window - now)
+
+
+class GuardedProvider(MarketDataProvider):
+    """Wraps a provider with the negative cache, circuit breaker and token bucket"""
+
+    def __init__(self, provider):
+        self.provider = provider
+        self.name = provider.name
+
+    def _call(self, fn, *args, **kwargs):
+        _breaker_allow()
+        if not acquire_token():
+            cache.delete(BREAKER_PROBE_KEY)
+            raise ProviderUnavailable("Market data provider rate limit reached")
+        try:
+            result = fn(*args, **kwargs)
+        except Exception:
+            _breaker_failure()
+            raise
+        return result
+
+    def download(self, tickers, period=None, start=None, interval="1d"):
+        tickers = list(tickers)
+        blocked = blocked_tickers(tickers)
+        wanted = [ticker for ticker in tickers if ticker not in blocked]
+        if not wanted:
+            return {}
+
+        frames = self._call(self.provider.download, wanted, period=period, start=start, interval=interval)
+
+        missing = [ticker for ticker in wanted if ticker not in frames]
+        if len(wanted) > 1 and not frames:
+            # Nothing at all for a batch looks like an outage, not bad tickers
+            _breaker_failure()
+        else:
+            _breaker_success()
+        record_ticker_failures(missing)
+        clear_ticker_failures(list(frames))
+        return frames
+
+    def info(self, ticker):
+        if blocked_tickers([ticker]):
+            raise ProviderUnavailable(f"{ticker} is backing off after provider failures")
+        try:
+            info = self._call(self.provider.info, ticker)
+        except ProviderUnavailable:
+            raise
+        except Exception:
+            record_ticker_failures([ticker])
+            raise
+        _breaker_success()
+        return info
+
+
+_guarded = None
+
+
+def guarded_provider():
+    """The configured provider wrapped with the shared guards"""
+    global _guarded
+    provider = get_provider()
+    if _guarded is None or _guarded.provider is not provider:
+        _guarded = GuardedProvider(provider)
+    return _guarded
@@ -0,0 +1,198 @@
+"""
+Quote serving layer - answers from the last known data and never calls the
+market data provider from a web worker.
+
+Stale symbols are refreshed in the background: each one is queued at most
+once per dedupe window, however many requests see it stale.
+
+Staleness follows the market clock: while a symbol's exchange is closed its
+post-close quote stays fresh until the next session opens.
+
+Quotes are also kept in a process-local read-through cache with a short TTL.
+Writers (the market refresh and the custom-stock updaters) call
+invalidate_quotes(), which bumps a shared version stamp so every process
+drops its local copies on the next lookup.
+"""
+import time
+
+from django.core.cache import cache
+from django.utils import timezone
+
+from .market_clock import CUSTOM_STOCK_EXCHANGE, EXCHANGES, exchange_for, is_open, is_quote_stale
+from .ml_predictor import ML_PREDICTOR, TICKERS, NSE_TICKERS
+from .models import CustomStock, PredictedStockData
+from .provider_guard import blocked_tickers
+
+# During a session, data older than this is still served, but marked stale and re-queued
+QUOTE_FRESH_SECONDS = 600  # 10 minutes
+# How long a queued refresh suppresses further refreshes for the same symbol
+REFRESH_DEDUPE_SECONDS = 300
+# Upper bound on how long a process serves its local copy without re-reading the DB
+LOCAL_QUOTE_TTL = 30
+# ...and while the symbol's exchange is closed (writes still invalidate immediately)
+LOCAL_QUOTE_TTL_CLOSED = 300
+QUOTES_VERSION_KEY = 'quotes:version'
+
+# symbol -> (expires_at, version, quote or None)
+_local_quotes = {}
+
+
+def _refresh_key(symbol):
+    return f'quotes:refresh:{symbol.upper()}'
+
+
+def quote_age(last_updated, symbol):
+    """Return (age_seconds, is_stale) for a symbol's last_updated timestamp"""
+    now = timezone.now()
+    age = (now - last_updated).total_seconds()
+    return round(age), is_quote_stale(symbol, last_updated, QUOTE_FRESH_SECONDS, now)
+
+
+def custom_stock_quote(custom_stock):
+    """Quote dict for a simulated CustomStock (never stale - there is no provider)"""
+    return {
+        'symbol': custom_stock.symbol,
+        'name': custom_stock.name,
+        'current_price': float(custom_stock.current_price),
+        'change_percent': float(custom_stock.change_percent),
+        'category': custom_stock.category,
+        'sector': custom_stock.sector,
+        'market_cap': custom_stock.market_cap,
+        'full_ticker': custom_stock.symbol,  # Custom stocks don't have full ticker
+        'currency': custom_stock.currency or 'INR',
+        'is_custom': True,
+        'as_of': custom_stock.last_updated.isoformat(),
+        'age_seconds': 0,
+        'is_stale': False,
+    }
+
+
+def cached_stock_quote(cached):
+    """Quote dict for a PredictedStockData row, marked with its age"""
+    age_seconds, is_stale = quote_age(cached.last_updated, cached.symbol)
+    return {
+        'symbol': cached.symbol,
+        'name': cached.name,
+        'current_price': float(cached.current_price),
+        'change_percent': float(cached.change_percent),
+        'category': cached.category,
+        'sector': cached.sector,
+        'market_cap': cached.market_cap,
+        'full_ticker': ML_PREDICTOR._get_full_ticker(cached.symbol),
+        'currency': cached.currency or ('INR' if cached.symbol.upper() in NSE_TICKERS else 'USD'),
+        'is_custom': False,
+        'as_of': cached.last_updated.isoformat(),
+        'age_seconds': age_seconds,
+        'is_stale': is_stale,
+    }
+
+
+def quotes_version():
+    """Shared version stamp of the quote data, bumped on every write"""
+    return cache.get(QUOTES_VERSION_KEY, 0)
+
+
+def invalidate_quotes():
+    """Drop cached quotes in every process - call after writing prices"""
+    try:
+        cache.incr(QUOTES_VERSION_KEY)
+    except ValueError:
+        cache.set(QUOTES_VERSION_KEY, 1, None)
+    _local_quotes.clear()
+
+
+def _with_age(quote):
+    """Copy a cached quote with its age fields recomputed for now"""
+    quote = dict(quote)
+    if not quote['is_custom']:
+        quote['age_seconds'], quote['is_stale'] = quote_age(quote['_last_updated'], quote['symbol'])
+    del quote['_last_updated']
+    return quote
+
+
+def get_quotes(symbols):
+    """
+    Resolve quotes for any set of symbols: the process-local cache first, then
+    at most two queries (CustomStock, PredictedStockData) for the misses.
+    Returns {symbol: quote}; symbols with no data yet are left out. Stale and
+    missing symbols get a background refresh queued.
+    """
+    symbols = set(symbols)
+    version = quotes_version()
+    now = time.monotonic()
+
+    quotes = {}
+    misses = []
+    for symbol in symbols:
+        entry = _local_quotes.get(symbol)
+        if entry is not None and entry[0] > now and entry[1] == version:
+            if entry[2] is not None:
+                quotes[symbol] = _with_age(entry[2])
+        else:
+            misses.append(symbol)
+
+    if misses:
+        loaded = {}
+        for custom in CustomStock.objects.filter(symbol__in=misses):
+            loaded[custom.symbol] = {**custom_stock_quote(custom), '_last_updated': custom.last_updated}
+        remaining = [symbol for symbol in misses if symbol not in loaded]
+        if remaining:
+            for cached in PredictedStockData.objects.filter(symbol__in=remaining):
+                loaded[cached.symbol] = {**cached_stock_quote(cached), '_last_updated': cached.last_updated}
+
+        open_now = {exchange: is_open(exchange) for exchange in EXCHANGES}
+        for symbol in misses:
+            # Symbols with no data are cached as None so they don't re-query every lookup
+            quote = loaded.get(symbol)
+            # Custom stocks tick on their own session, whatever their symbol looks like
+            exchange = CUSTOM_STOCK_EXCHANGE if quote is not None and quote['is_custom'] else exchange_for(symbol)
+            ttl = LOCAL_QUOTE_TTL if open_now[exchange] else LOCAL_QUOTE_TTL_CLOSED
+            _local_quotes[symbol] = (now + ttl, version, quote)
+            if quote is not None:
+                quotes[symbol] = _with_age(quote)
+
+    to_refresh = [symbol for symbol in symbols if symbol not in quotes or quotes[symbol]['is_stale']]
+    if to_refresh:
+        request_refresh(to_refresh)
+    return quotes
+
+
+def get_quote(symbol):
+    """
+    Return the last known quote for a symbol, or None if there is no data yet.
+    Queues a background refresh if the quote is stale or missing.
+    """
+    return get_quotes([symbol]).get(symbol)
+
+
+def request_refresh(symbols):
+    """
+    Queue one background refresh for the given tracked symbols, skipping any
+    that already have a refresh pending or that the provider guard is backing
+    off. Returns the symbols actually queued.
+    """
+    tracked = {ML_PREDICTOR._get_full_ticker(symbol): symbol for symbol in symbols if symbol in TICKERS}
+    if not tracked:
+        return []
+    blocked = blocked_tickers(tracked)
+    queued = [
+        symbol for full_ticker, symbol in tracked.items()
+        if full_ticker not in blocked and cache.add(_refresh_key(symbol), True, REFRESH_DEDUPE_SECONDS)
+    ]
+    if not queued:
+        return []
+
+    try:
+        from .tasks import refresh_symbols_task
+        refresh_symbols_task.delay(queued)
+    except Exception as e:
+        # Broker unavailable - let the next request (or the beat job) try again
+        print(f"[QUOTES] Could not queue refresh for {queued}: {e}")
+        cache.delete_many([_refresh_key(symbol) for symbol in queued])
+        return []
+    return queued
+
+
+def refresh_done(symbols):
+    """Clear the pending-refresh markers once a refresh has run"""
+    cache.delete_many([_refresh_key(symbol) for symbol in symbols])
@@ -0,0 +1,123 @@
+"""
+Adaptive refresh scheduler - decides which tracked symbols are due for new data.
+
+Each symbol gets its own refresh interval from its exchange's market state,
+its recent volatility (ml_volatility) and its popularity (recent detail views
+and the number of portfolios holding it). A beat task pops every due symbol
+off a priority queue ordered by due time and queues one batched refresh, so
+closed markets cost one post-close refresh per session and hot symbols stay
+fresher while trading.
+"""
+import heapq
+import math
+from collections import Counter
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.core.cache import cache
+from django.db.models import Count
+from django.utils import timezone
+
+from .market_clock import CLOSE_SETTLE, EXCHANGES, exchange_for, is_open, last_close, next_open
+from .ml_predictor import TICKERS
+from .models import Position, PredictedStockData
+from .quotes import request_refresh
+
+# Interval for an average symbol during a session
+OPEN_BASE_INTERVAL = 300
+MIN_INTERVAL = 60
+MAX_INTERVAL = 900
+# Annualized volatility that gets the base interval
+TYPICAL_VOLATILITY = 0.3
+# Detail views are counted over this window
+VIEW_WINDOW_SECONDS = 3600
+# Upper bound on symbols queued per dispatch, most overdue first
+MAX_SYMBOLS_PER_DISPATCH = 50
+
+
+def _views_key(symbol):
+    return f'refresh:views:{symbol.upper()}'
+
+
+def record_view(symbol):
+    """Count a detail view of a symbol towards its refresh priority"""
+    key = _views_key(symbol)
+    cache.add(key, 0, VIEW_WINDOW_SECONDS)
+    try:
+        cache.incr(key)
+    except ValueError:
+        pass  # Expired between add and incr
+
+
+def view_counts(symbols):
+    """Recent detail views per symbol"""
+    counts = cache.get_many([_views_key(symbol) for symbol in symbols])
+    return {symbol: counts.get(_views_key(symbol), 0) for symbol in symbols}
+
+
+def holder_counts():
+    """Number of portfolios holding each symbol"""
+    rows = Position.objects.filter(quantity__gt=0).values('symbol').annotate(holders=Count('id'))
+    return Counter({row['symbol']: row['holders'] for row in rows})
+
+
+def refresh_interval(volatility, views=0, holders=0):
+    """Seconds between refreshes of a symbol while its exchange is open"""
+    vol_factor = min(max((volatility or 0.0) / TYPICAL_VOLATILITY, 0.5), 3.0)
+    popularity = 1 + math.log1p(views + 5 * holders) / 2
+    interval = OPEN_BASE_INTERVAL / (math.sqrt(vol_factor) * popularity)
+    return int(min(max(interval, MIN_INTERVAL), MAX_INTERVAL))
+
+
+def due_at(symbol, last_updated, interval, now, open_now):
+    """When a symbol next needs refreshing, given its open-session interval"""
+    exchange = exchange_for(symbol)
+    if open_now[exchange]:
+        return last_updated + timedelta(seconds=interval)
+    # Closed: one refresh once the final bar has settled, then wait for the next open
+    settled = last_close(exchange, now) + CLOSE_SETTLE
+    if last_updated < settled:
+        return settled
+    return next_open(exchange, now)
+
+
+def build_queue(now=None):
+    """Priority queue of (due_at, symbol) for every tracked symbol"""
+    now = now or timezone.now()
+    open_now = {exchange: is_open(exchange, now) for exchange in EXCHANGES}
+    views = view_counts(TICKERS)
+    holders = holder_counts()
+
+    queue = []
+    seen = set()
+    rows = PredictedStockData.objects.filter(symbol__in=TICKERS).values_list('symbol', 'last_updated', 'ml_volatility')
+    for symbol, last_updated, volatility in rows:
+        interval = refresh_interval(volatility, views[symbol], holders[symbol])
+        queue.append((due_at(symbol, last_updated, interval, now, open_now), symbol))
+        seen.add(symbol)
+
+    # Symbols with no data yet are due immediately
+    epoch = datetime.min.replace(tzinfo=dt_timezone.utc)
+    queue.extend((epoch, symbol) for symbol in TICKERS if symbol not in seen)
+
+    heapq.heapify(queue)
+    return queue
+
+
+def dispatch_due_refreshes(now=None):
+    """
+    Pop every due symbol off the queue and queue one batched refresh for them.
+    Returns the queued symbols and when the next symbol falls due.
+    """
+    now = now or timezone.now()
+    queue = build_queue(now)
+
+    due = []
+    while queue and queue[0][0] <= now and len(due) < MAX_SYMBOLS_PER_DISPATCH:
+        due.append(heapq.heappop(queue)[1])
+
+    queued = request_refresh(due) if due else []
+    return {
+        'due': due,
+        'queued': queued,
+        'next_due': queue[0][0].isoformat() if queue else None,
+    }
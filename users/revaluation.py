@@ -0,0 +1,125 @@
+"""
+Fleet-wide portfolio revaluation - keeps DemoPortfolio.total_value and the
+day's change current after every price refresh and trade.
+
+All positions are loaded as a sparse portfolios x symbols matrix (row index,
+column index, quantity) and multiplied by the price vector with np.bincount,
+then written back in one batched UPDATE. Position.symbol is indexed, so it
+doubles as the reverse index from a symbol to the portfolios holding it: a
+refresh of a few symbols only revalues the portfolios that hold them.
+Users whose P&L reaches an achievement milestone get a portfolio_value event.
+"""
+import numpy as np
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.models import FloatField
+from django.db.models.functions import Cast
+from django.utils import timezone
+
+from .bulk_writes import executemany_update
+from .events import portfolio_values_changed
+from .models import CustomStock, DemoPortfolio, Position, PredictedStockData
+from .portfolio_history import record_snapshots
+
+
+def load_price_vector(symbols=None):
+    """
+    Latest prices for every quoted symbol, or only for `symbols`.
+    Returns (column index {symbol: i}, current prices, prices at the day's open).
+    """
+    quoted, custom = PredictedStockData.objects.all(), CustomStock.objects.all()
+    if symbols is not None:
+        quoted, custom = quoted.filter(symbol__in=symbols), custom.filter(symbol__in=symbols)
+    rows = list(quoted.values_list('symbol', 'current_price', 'change_percent'))
+    rows += list(custom.values_list('symbol', 'current_price', 'change_percent'))
+    columns = {symbol: i for i, (symbol, _, _) in enumerate(rows)}
+    prices = np.array([float(price) for _, price, _ in rows])
+    change = np.array([float(change) for _, _, change in rows])
+    # change_percent is measured from the day's open
+    opens = prices / (1 + change / 100)
+    return columns, prices, opens
+
+
+def affected_portfolios(symbols):
+    """Ids of the portfolios holding any of the symbols"""
+    return set(Position.objects.filter(symbol__in=symbols).values_list('portfolio_id', flat=True))
+
+
+def revalue_portfolios(symbols=None, portfolio_ids=None, snapshot=None):
+    """
+    Revalue portfolios and bulk-write total_value, day_change and
+    day_change_percent. By default every portfolio is revalued; `symbols`
+    limits it to the holders of those symbols, `portfolio_ids` to specific
+    portfolios. With `snapshot` set to a resolution ('intraday' or 'daily')
+    the values are also recorded as PortfolioSnapshot rows.
+    Returns the number of portfolios written.
+    """
+    if symbols is not None:
+        portfolio_ids = affected_portfolios(symbols) | set(portfolio_ids or ())
+        if not portfolio_ids:
+            return 0
+
+    portfolios = DemoPortfolio.objects.all()
+    positions = Position.objects.filter(quantity__gt=0)
+    if portfolio_ids is not None:
+        portfolios = portfolios.filter(pk__in=portfolio_ids)
+        positions = positions.filter(portfolio_id__in=portfolio_ids)
+
+    # Decimal columns are cast to float in SQL - per-row Decimal conversion dominates at this scale
+    balances = list(portfolios.values_list('id', 'user_id', Cast('balance', FloatField())))
+    if not balances:
+        return 0
+    ids = np.array([pk for pk, _, _ in balances])
+    user_ids = [user_id for _, user_id, _ in balances]
+    balance = np.array([b for _, _, b in balances])
+    rows_of = {pk: i for i, pk in enumerate(ids.tolist())}
+
+    # Sparse matrix in coordinate form: (portfolio row, symbol column, quantity)
+    entries = list(positions.values_list(
+        'portfolio_id', 'symbol', Cast('quantity', FloatField()), Cast('avg_price', FloatField()),
+    ))
+    # A partial revaluation (e.g. after a trade) only loads the prices its positions need
+    held = None if portfolio_ids is None else {symbol for _, symbol, _, _ in entries}
+    columns, prices, opens = load_price_vector(held)
+    row = np.array([rows_of[pk] for pk, _, _, _ in entries], dtype=np.int64)
+    col = np.array([columns.get(symbol, -1) for _, symbol, _, _ in entries], dtype=np.int64)
+    quantity = np.array([q for _, _, q, _ in entries])
+    avg_price = np.array([p for _, _, _, p in entries])
+
+    # Symbols with no quote are valued at cost and have no day change
+    quoted = col >= 0
+    price = avg_price.copy()
+    price[quoted] = prices[col[quoted]]
+    open_price = avg_price.copy()
+    open_price[quoted] = opens[col[quoted]]
+
+    holdings_value = np.bincount(row, weights=quantity * price, minlength=len(ids))
+    invested = np.bincount(row, weights=quantity * avg_price, minlength=len(ids))
+    day_change = np.bincount(row, weights=quantity * (price - open_price), minlength=len(ids))
+    total_value = balance + holdings_value
+    prior_value = total_value - day_change
+    day_change_percent = np.divide(
+        day_change * 100, prior_value, out=np.zeros_like(day_change), where=prior_value > 0,
+    )
+
+    now = connections[DEFAULT_DB_ALIAS].ops.adapt_datetimefield_value(timezone.now())
+    total_value = np.round(total_value, 2)
+    written = executemany_update(
+        DemoPortfolio, ['total_value', 'day_change', 'day_change_percent', 'valued_at'],
+        zip(
+            ids.tolist(),
+            total_value.tolist(),
+            np.round(day_change, 2).tolist(),
+            np.round(day_change_percent, 2).tolist(),
+            [now] * len(ids),
+        ),
+        prepare=False,
+    )
+    if snapshot:
+        record_snapshots(ids.tolist(), total_value.tolist(), snapshot, now)
+
+    # Total P&L of the holdings, as the portfolio_value achievement rules measure it
+    pnl_percent = np.divide(
+        (holdings_value - invested) * 100, invested, out=np.zeros_like(invested), where=invested > 0,
+    )
+    portfolio_values_changed(dict(zip(user_ids, pnl_percent.tolist())))
+    return written
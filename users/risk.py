@@ -0,0 +1,152 @@
+"""
+Portfolio risk analytics - volatility, historical VaR/CVaR, beta and the
+holdings correlation matrix.
+
+Daily closes for the holdings and the benchmark are read from the OHLCV
+store and aligned on their common dates into one returns matrix, so every
+metric is a handful of numpy operations. Results are memoized in the cache
+per (holdings hash, data version): the version is derived from the last
+stored bar of every series involved, so repeat views are free and a new
+computation happens only once a refresh has written new bars.
+"""
+import hashlib
+
+import numpy as np
+from django.core.cache import cache
+
+from .market_clock import exchange_for
+from .models import Position
+from .ohlcv_store import OHLCV_STORE, YEAR_BARS, aligned_closes, series_version
+
+BENCHMARKS = ('SPY', 'NIFTY')
+TRADING_DAYS = 252
+# Fewer aligned daily returns than this give meaningless tail estimates
+MIN_RETURNS = 20
+VAR_LEVELS = (0.95, 0.99)
+RISK_CACHE_TTL = 24 * 3600
+
+
+class RiskUnavailable(Exception):
+    """Not enough aligned price history to compute risk"""
+
+
+def default_benchmark(holdings):
+    """NIFTY when most of the holdings (by quantity x last close) trade on NSE, else SPY"""
+    nse = sum(value for symbol, value in holdings.items() if exchange_for(symbol) == 'NSE')
+    return 'NIFTY' if nse * 2 > sum(holdings.values()) else 'SPY'
+
+
+def holdings_hash(quantities):
+    """Stable hash of {symbol: quantity}"""
+    text = ','.join(f'{symbol}:{quantities[symbol]}' for symbol in sorted(quantities))
+    return hashlib.sha1(text.encode()).hexdigest()
+
+
+def compute_risk(quantities, benchmark, days=YEAR_BARS):
+    """
+    Risk metrics for holdings {symbol: quantity} against a benchmark symbol.
+    Raises RiskUnavailable without enough common history.
+    """
+    if OHLCV_STORE.count(benchmark) <= MIN_RETURNS:
+        raise RiskUnavailable(f'No {benchmark} history stored yet')
+    symbols = sorted(quantities)
+    dates, closes = aligned_closes(symbols + [benchmark], days)
+    if len(dates) <= MIN_RETURNS:
+        raise RiskUnavailable(f'Only {max(len(dates) - 1, 0)} aligned daily returns available')
+
+    returns = closes[1:] / closes[:-1] - 1
+    asset_returns, benchmark_returns = returns[:, :-1], returns[:, -1]
+
+    # Value weights at the latest close
+    values = np.array([quantities[symbol] for symbol in symbols]) * closes[-1, :-1]
+    holdings_value = values.sum()
+    weights = values / holdings_value
+    portfolio_returns = asset_returns @ weights
+
+    daily_vol = portfolio_returns.std(ddof=1)
+    benchmark_var = benchmark_returns.var(ddof=1)
+    centered = asset_returns - asset_returns.mean(axis=0)
+    benchmark_centered = benchmark_returns - benchmark_returns.mean()
+    if benchmark_var > 0:
+        asset_betas = centered.T @ benchmark_centered / (len(returns) - 1) / benchmark_var
+    else:
+        asset_betas = np.zeros(len(symbols))
+    asset_vols = asset_returns.std(axis=0, ddof=1)
+
+    # Share of portfolio variance from each holding: w_i (C w)_i / w'Cw
+    covariance = np.atleast_2d(np.cov(asset_returns, rowvar=False))
+    marginal = covariance @ weights
+    portfolio_var = weights @ marginal
+    contributions = weights * marginal / portfolio_var if portfolio_var > 0 else np.zeros(len(symbols))
+
+    var_cvar = {}
+    for level in VAR_LEVELS:
+        cutoff = np.quantile(portfolio_returns, 1 - level)
+        tail = portfolio_returns[portfolio_returns <= cutoff]
+        key = str(int(level * 100))
+        var_cvar[key] = {
+            'var_percent': round(float(-cutoff) * 100, 2),
+            'cvar_percent': round(float(-tail.mean()) * 100, 2),
+            'var_amount': round(float(-cutoff * holdings_value), 2),
+            'cvar_amount': round(float(-tail.mean() * holdings_value), 2),
+        }
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        correlation = np.nan_to_num(np.atleast_2d(np.corrcoef(asset_returns, rowvar=False)))
+
+    return {
+        'benchmark': benchmark,
+        'start_date': str(dates[0]),
+        'end_date': str(dates[-1]),
+        'observations': int(len(returns)),
+        'holdings_value': round(float(holdings_value), 2),
+        'volatility_daily': round(float(daily_vol) * 100, 2),
+        'volatility_annual': round(float(daily_vol * np.sqrt(TRADING_DAYS)) * 100, 2),
+        'beta': round(float(weights @ asset_betas), 3),
+        'var': var_cvar,
+        'holdings': [
+            {
+                'symbol': symbol,
+                'weight': round(float(weights[i]) * 100, 2),
+                'volatility_annual': round(float(asset_vols[i] * np.sqrt(TRADING_DAYS)) * 100, 2),
+                'beta': round(float(asset_betas[i]), 3),
+                'risk_contribution': round(float(contributions[i]) * 100, 2),
+            }
+            for i, symbol in enumerate(symbols)
+        ],
+        'correlation': {
+            'symbols': symbols,
+            'matrix': np.round(correlation, 3).tolist(),
+        },
+    }
+
+
+def portfolio_risk(portfolio, benchmark=None, days=YEAR_BARS):
+    """
+    Memoized risk metrics for a portfolio's current positions. Holdings
+    without enough stored history are left out and listed as 'excluded'.
+    Returns None for a portfolio without positions.
+    """
+    held = {
+        symbol: float(quantity)
+        for symbol, quantity in Position.objects.filter(portfolio=portfolio, quantity__gt=0).values_list('symbol', 'quantity')
+    }
+    if not held:
+        return None
+    quantities = {symbol: quantity for symbol, quantity in held.items() if OHLCV_STORE.count(symbol) > MIN_RETURNS}
+    excluded = sorted(set(held) - set(quantities))
+    if not quantities:
+        raise RiskUnavailable('No holding has enough price history yet')
+    if benchmark not in BENCHMARKS:
+        last_closes = {symbol: OHLCV_STORE.read(symbol, days=1)['close'] for symbol in quantities}
+        benchmark = default_benchmark({
+            symbol: quantity * float(last_closes[symbol][-1]) if len(last_closes[symbol]) else 0.0
+            for symbol, quantity in quantities.items()
+        })
+
+    key = f'risk:{holdings_hash(quantities)}:{series_version(list(quantities) + [benchmark])}:{benchmark}:{days}'
+    result = cache.get(key)
+    if result is None:
+        result = compute_risk(quantities, benchmark, days)
+        cache.set(key, result, RISK_CACHE_TTL)
+    return {**result, 'excluded': excluded}
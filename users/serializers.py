@@ -22,6 +22,14 @@ class UserProfileSerializer(serializers.ModelSerializer):
 
 
 class DemoPortfolioSerializer(serializers.ModelSerializer):
+    holdings = serializers.SerializerMethodField()
+    
     class Meta:
         model = DemoPortfolio
-        fields = ['id', 'user', 'holdings', 'total_value', 'created_at', 'updated_at']
+        fields = ['id', 'user', 'holdings', 'total_value', 'day_change', 'day_change_percent', 'valued_at', 'created_at', 'updated_at']
+    
+    def get_holdings(self, obj):
+        return {
+            position.symbol: {'quantity': float(position.quantity), 'avg_price': float(position.avg_price)}
+            for position in obj.positions.all()
+        }
@@ -0,0 +1,198 @@
+"""
+Historical SIP ("what if I had invested") simulator over the stored daily closes.
+
+A monthly installment buys at the close of the first trading day on or after
+its due date; installment dates come from one searchsorted over the date
+array and units, invested amount and value from cumulative sums. Everything
+but XIRR scales linearly with the installment and XIRR does not depend on it,
+so results are computed and cached once per (symbol, start date, data
+version) for an installment of 1 and scaled to the requested amount -
+a common start date is served from the cache for any amount.
+"""
+from datetime import date
+
+import numpy as np
+from django.core.cache import cache
+
+from .ml_predictor import TICKERS
+from .ohlcv_store import OHLCV_STORE, series_version
+
+SIP_CACHE_TTL = 24 * 3600
+# Chart points for the value-over-time series
+MAX_CURVE_POINTS = 120
+# Start dates precomputed for every tracked ticker, in years before today (the
+# longer ones can reach past the stored history and come back truncated)
+PRESET_YEARS = (1, 2, 3, 5)
+
+
+class SIPError(Exception):
+    """No stored price history to simulate over"""
+
+
+def xirr(amounts, days, guess=0.1):
+    """
+    Annualized internal rate of return of cash flows `amounts` made `days`
+    after the first one (Newton's method, bisection fallback). None if the
+    flows have no sign change.
+    """
+    amounts = np.asarray(amounts, dtype=float)
+    years = np.asarray(days, dtype=float) / 365.0
+    if not (amounts > 0).any() or not (amounts < 0).any():
+        return None
+
+    def npv(rate):
+        return (amounts / (1 + rate) ** years).sum()
+
+    rate = guess
+    for _ in range(50):
+        discount = (1 + rate) ** years
+        value = (amounts / discount).sum()
+        slope = (-years * amounts / (discount * (1 + rate))).sum()
+        if slope == 0:
+            break
+        step = value / slope
+        rate -= step
+        if rate <= -0.9999:
+            break
+        if abs(step) < 1e-9:
+            return float(rate)
+
+    # Bisection over a wide bracket when Newton does not converge
+    low, high = -0.9999, 100.0
+    if npv(low) * npv(high) > 0:
+        return None
+    for _ in range(200):
+        mid = (low + high) / 2
+        if npv(low) * npv(mid) <= 0:
+            high = mid
+        else:
+            low = mid
+    return float((low + high) / 2)
+
+
+def simulate_unit_sip(records, start):
+    """
+    SIP of 1 per month from `start` over a symbol's stored OHLCV records (the
+    whole series, so installments due before its first bar can be told apart
+    from ones due on a weekend or holiday); the result dict before scaling.
+    """
+    dates = records['date']
+    closes = records['close']
+    start = np.datetime64(start, 'D')
+
+    # Due dates: the start's day of month in every month up to the last bar (short
+    # months clamp); installments due before the first stored bar are skipped
+    months = np.arange(start.astype('datetime64[M]'), dates[-1].astype('datetime64[M]') + 1)
+    day_offset = (start - start.astype('datetime64[M]').astype('datetime64[D]')).astype(int)
+    month_starts = months.astype('datetime64[D]')
+    month_ends = (months + 1).astype('datetime64[D]') - 1
+    due = np.minimum(month_starts + day_offset, month_ends)
+    due = due[due <= dates[-1]]
+    skipped = int(np.count_nonzero(due < dates[0]))
+    due = due[due >= dates[0]]
+
+    # Each installment buys at the first trading day on or after its due date
+    bought = np.searchsorted(dates, due, side='left')
+    bought = bought[bought < len(dates)]
+    if not len(bought):
+        raise SIPError('No trading days after the start date')
+
+    units_per_bar = np.zeros(len(dates))
+    np.add.at(units_per_bar, bought, 1.0 / closes[bought])
+    installments_per_bar = np.zeros(len(dates))
+    np.add.at(installments_per_bar, bought, 1.0)
+    units = np.cumsum(units_per_bar)
+    invested = np.cumsum(installments_per_bar)
+    value = units * closes
+
+    first = bought[0]
+    points = np.unique(np.linspace(first, len(dates) - 1, min(len(dates) - first, MAX_CURVE_POINTS)).round().astype(int))
+    flow_days = (dates[bought] - dates[first]).astype(int)
+    final_day = int((dates[-1] - dates[first]).astype(int))
+    rate = xirr(np.append(-np.ones(len(bought)), value[-1]), np.append(flow_days, final_day))
+
+    return {
+        'start_date': str(dates[first]),
+        'end_date': str(dates[-1]),
+        'history_start': str(dates[0]),
+        'skipped_installments': skipped,
+        'installments': int(len(bought)),
+        'units': float(units[-1]),
+        'invested': float(invested[-1]),
+        'current_value': float(value[-1]),
+        'last_price': float(closes[-1]),
+        'xirr': rate,
+        'curve': {
+            'dates': [str(day) for day in dates[points]],
+            'invested': invested[points].tolist(),
+            'value': value[points].tolist(),
+        },
+    }
+
+
+def unit_sip(symbol, start):
+    """Memoized unit SIP for a symbol and start date"""
+    key = f'sip:{symbol}:{start}:{series_version([symbol])}'
+    result = cache.get(key)
+    if result is None:
+        records = OHLCV_STORE.read(symbol)
+        if len(records) < 2:
+            raise SIPError(f'No stored price history for {symbol}')
+        result = simulate_unit_sip(records, start)
+        cache.set(key, result, SIP_CACHE_TTL)
+    return result
+
+
+def simulate_sip(symbol, amount, start):
+    """
+    SIP of `amount` per month into `symbol` from `start` (a past date). When the
+    stored history begins after `start`, the simulation starts at the first
+    stored bar and the result is flagged `truncated`.
+    """
+    unit = unit_sip(symbol.upper(), start)
+
+    invested = unit['invested'] * amount
+    value = unit['current_value'] * amount
+    return {
+        'symbol': symbol.upper(),
+        'monthly_amount': amount,
+        'requested_start': str(start),
+        'start_date': unit['start_date'],
+        'end_date': unit['end_date'],
+        # Installments due before the stored history were not simulated
+        'truncated': unit['skipped_installments'] > 0,
+        'history_start': unit['history_start'],
+        'skipped_installments': unit['skipped_installments'],
+        'installments': unit['installments'],
+        'units': round(unit['units'] * amount, 4),
+        'invested': round(invested, 2),
+        'current_value': round(value, 2),
+        'gain': round(value - invested, 2),
+        'absolute_return': round((value / invested - 1) * 100, 2) if invested else 0.0,
+        'xirr': round(unit['xirr'] * 100, 2) if unit['xirr'] is not None else None,
+        'last_price': round(unit['last_price'], 2),
+        'curve': {
+            'dates': unit['curve']['dates'],
+            'invested': [round(v * amount, 2) for v in unit['curve']['invested']],
+            'value': [round(v * amount, 2) for v in unit['curve']['value']],
+        },
+    }
+
+
+def preset_starts(today=None):
+    """The common start dates: the 1st of the month PRESET_YEARS ago"""
+    today = today or date.today()
+    return [date(today.year - years, today.month, 1) for years in PRESET_YEARS]
+
+
+def precompute_presets(symbols=None):
+    """Fill the cache for every tracked ticker and preset start. Returns the number computed."""
+    computed = 0
+    for symbol in symbols or TICKERS:
+        for start in preset_starts():
+            try:
+                unit_sip(symbol, start)
+                computed += 1
+            except SIPError:
+                pass
+    return computed
@@ -21,3 +21,177 @@ def update_ml_data_task():
         traceback.print_exc()
         return {'status': 'error', 'message': error_msg}
 
+
+
+@shared_task
+def refresh_symbols_task(symbols):
+    """
+    Celery task to refresh specific symbols on demand.
+    Queued by the quote serving layer when web requests see stale data.
+    """
+    from .market_refresh import refresh_market_data
+    from .order_book import match_orders
+    from .quotes import refresh_done
+    from .revaluation import revalue_portfolios
+    try:
+        results = refresh_market_data(symbols)
+        prices = {r['symbol']: r['current_price'] for r in results if r['status'] in ('created', 'updated')}
+        filled = match_orders(prices) if prices else 0
+        revalued = revalue_portfolios(symbols=list(prices)) if prices else 0
+        return {'status': 'success', 'updated': list(prices), 'filled': filled, 'revalued': revalued}
+    except Exception as e:
+        error_msg = f'Error refreshing {symbols}: {str(e)}'
+        print(error_msg)
+        traceback.print_exc()
+        return {'status': 'error', 'message': error_msg}
+    finally:
+        refresh_done(symbols)
+
+
+@shared_task
+def dispatch_refreshes_task():
+    """
+    Celery beat task that queues refreshes for the symbols that are due,
+    following market hours, volatility and popularity.
+    """
+    from .refresh_scheduler import dispatch_due_refreshes
+    try:
+        result = dispatch_due_refreshes()
+        return {'status': 'success', **result}
+    except Exception as e:
+        error_msg = f'Error dispatching refreshes: {str(e)}'
+        print(error_msg)
+        traceback.print_exc()
+        return {'status': 'error', 'message': error_msg}
+
+
+@shared_task
+def tick_custom_stocks_task():
+    """
+    Celery beat task that advances all custom stock prices by one tick.
+    """
+    from .custom_ticks import tick_custom_stocks
+    from .models import CustomStock
+    from .order_book import match_orders
+    from .revaluation import revalue_portfolios
+    try:
+        ticked = tick_custom_stocks()
+        if not ticked:
+            return {'status': 'success', 'ticked': 0}
+        prices = dict(CustomStock.objects.values_list('symbol', 'current_price'))
+        filled = match_orders(prices)
+        revalued = revalue_portfolios(symbols=list(prices))
+        return {'status': 'success', 'ticked': ticked, 'filled': filled, 'revalued': revalued}
+    except Exception as e:
+        error_msg = f'Error ticking custom stocks: {str(e)}'
+        print(error_msg)
+        traceback.print_exc()
+        return {'status': 'error', 'message': error_msg}
+
+
+@shared_task
+def snapshot_portfolios_task(resolution='daily'):
+    """
+    Celery beat task that revalues every portfolio and records a value
+    snapshot for the history chart. The end-of-day run also rolls old
+    snapshots up to coarser resolutions.
+    """
+    from .portfolio_history import rollup_snapshots
+    from .revaluation import revalue_portfolios
+    try:
+        recorded = revalue_portfolios(snapshot=resolution)
+        rolled_up = rollup_snapshots() if resolution == 'daily' else {}
+        return {'status': 'success', 'recorded': recorded, 'rolled_up': rolled_up}
+    except Exception as e:
+        error_msg = f'Error recording {resolution} portfolio snapshots: {str(e)}'
+        print(error_msg)
+        traceback.print_exc()
+        return {'status': 'error', 'message': error_msg}
+
+
+@shared_task
+def purge_idempotency_keys_task():
+    """
+    Celery beat task that deletes expired trade idempotency keys.
+    """
+    from .idempotency import purge_idempotency_keys
+    try:
+        deleted = purge_idempotency_keys()
+        return {'status': 'success', 'deleted': deleted}
+    except Exception as e:
+        error_msg = f'Error purging idempotency keys: {str(e)}'
+        print(error_msg)
+        traceback.print_exc()
+        return {'status': 'error', 'message': error_msg}
+
+
+@shared_task
+def purge_backtest_results_task():
+    """
+    Celery beat task that deletes expired backtest results.
+    """
+    from .backtest import purge_backtest_results
+    try:
+        deleted = purge_backtest_results()
+        return {'status': 'success', 'deleted': deleted}
+    except Exception as e:
+        error_msg = f'Error purging backtest results: {str(e)}'
+        print(error_msg)
+        traceback.print_exc()
+        return {'status': 'error', 'message': error_msg}
+
+
+@shared_task
+def evaluate_achievements_task(user_id, events):
+    """
+    Celery task that evaluates the achievement rules affected by domain
+    events (see users/events.py) and pushes any unlocks to the user.
+    """
+    from django.contrib.auth.models import User
+    from .achievements import evaluate_achievements, push_unlocked
+    try:
+        user = User.objects.filter(pk=user_id).first()
+        if user is None:
+            return {'status': 'success', 'unlocked': []}
+        unlocked = evaluate_achievements(user, events)
+        push_unlocked(user_id, unlocked)
+        return {'status': 'success', 'unlocked': [achievement.id for achievement in unlocked]}
+    except Exception as e:
+        error_msg = f'Error evaluating achievements for user {user_id}: {str(e)}'
+        print(error_msg)
+        traceback.print_exc()
+        return {'status': 'error', 'message': error_msg}
+
+
+@shared_task
+def run_backtest_task(key, spec):
+    """
+    Celery task that runs a strategy backtest and stores the result for
+    the polling endpoint.
+    """
+    from .backtest import clear_pending, store_result
+    try:
+        return {'status': store_result(key, spec)['status'], 'key': key}
+    except Exception as e:
+        error_msg = f'Error running backtest {key}: {str(e)}'
+        print(error_msg)
+        traceback.print_exc()
+        clear_pending(key)
+        return {'status': 'error', 'message': error_msg}
+
+
+@shared_task
+def precompute_sip_presets_task():
+    """
+    Celery beat task that caches SIP simulations for every tracked ticker
+    from the common start dates, once the day's closes are stored.
+    """
+    from .sip import precompute_presets
+    try:
+        computed = precompute_presets()
+        return {'status': 'success', 'computed': computed}
+    except Exception as e:
+        error_msg = f'Error precomputing SIP presets: {str(e)}'
+        print(error_msg)
+        traceback.print_exc()
+        return {'status': 'error', 'message': error_msg}
@@ -1,3 +1,50 @@
-from django.test import TestCase
+import tempfile
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+from django.core.cache import cache
+from django.test import SimpleTestCase
+
+from .ohlcv_store import OHLCV_DTYPE, OHLCVStore
+from .sip import simulate_unit_sip, unit_sip
+
+
+def business_day_records(first, last):
+    """Synthetic OHLCV records for every weekday from `first` to `last`"""
+    dates = np.arange(np.datetime64(first, 'D'), np.datetime64(last, 'D') + 1)
+    dates = dates[np.is_busday(dates)]
+    records = np.zeros(len(dates), dtype=OHLCV_DTYPE)
+    records['date'] = dates
+    records['close'] = np.linspace(100.0, 120.0, len(dates))
+    return records
+
+
+class SIPSimulationTests(SimpleTestCase):
+    def setUp(self):
+        self.records = business_day_records('2025-01-01', '2025-06-30')
+
+    def test_weekend_start_buys_on_next_trading_day(self):
+        # 2025-02-01 is a Saturday: the first installment buys on Monday 2025-02-03
+        weekend = simulate_unit_sip(self.records, '2025-02-01')
+        weekday = simulate_unit_sip(self.records, '2025-02-03')
+        self.assertEqual(weekend['start_date'], '2025-02-03')
+        self.assertEqual(weekend['skipped_installments'], 0)
+        self.assertEqual(weekend['installments'], 5)
+        self.assertEqual(weekday['installments'], 5)
+
+    def test_start_before_history_is_truncated(self):
+        result = simulate_unit_sip(self.records[self.records['date'] >= np.datetime64('2025-03-01')], '2025-01-15')
+        self.assertEqual(result['history_start'], '2025-03-03')
+        self.assertEqual(result['skipped_installments'], 2)
+        self.assertEqual(result['start_date'], '2025-03-17')
+
+    def test_unit_sip_weekend_start_is_not_truncated(self):
+        cache.clear()
+        with tempfile.TemporaryDirectory() as root:
+            store = OHLCVStore(root)
+            store.append('TEST', self.records)
+            with mock.patch('users.sip.OHLCV_STORE', store), mock.patch('users.sip.series_version', return_value='v1'):
+                result = unit_sip('TEST', '2025-02-01')
+        self.assertEqual(result['start_date'], '2025-02-03')
+        self.assertEqual(result['skipped_installments'], 0)
+        self.assertEqual(result['installments'], 5)
@@ -0,0 +1,133 @@
+"""
+Trade execution for demo portfolios.
+
+Each trade locks the portfolio row (select_for_update), so concurrent orders
+from the same user run one after another, and changes balance and position
+with F() arithmetic in single-row UPDATEs. Every executed trade is appended
+to the Trade ledger.
+"""
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import F
+
+from .models import DemoPortfolio, Position, Trade
+from .revaluation import revalue_portfolios
+
+STARTING_BALANCE = Decimal('50000.00')
+MAX_BASKET_LEGS = 50
+
+
+class TradeError(Exception):
+    """A trade was rejected (bad input, insufficient balance or shares)"""
+
+
+def parse_quantity(value):
+    """A positive whole number of shares from request data; raises TradeError otherwise"""
+    try:
+        quantity = Decimal(str(value).strip())
+    except ArithmeticError:
+        raise TradeError(f'Invalid quantity: {value!r}')
+    if not quantity.is_finite() or quantity <= 0 or quantity != quantity.to_integral_value():
+        raise TradeError('Quantity must be a positive whole number')
+    return int(quantity)
+
+
+def get_or_create_portfolio(user):
+    """Get or create the user's demo portfolio"""
+    portfolio, _ = DemoPortfolio.objects.get_or_create(
+        user=user,
+        defaults={'balance': STARTING_BALANCE, 'holdings': {}, 'total_value': STARTING_BALANCE}
+    )
+    return portfolio
+
+
+def execute_trade(user, symbol, side, quantity, price, revalue=True):
+    """
+    Buy or sell `quantity` shares of `symbol` at `price` for the user's demo
+    portfolio. Returns the Trade; raises TradeError if it cannot be filled.
+    Batch callers pass revalue=False and revalue the portfolios once at the end.
+    """
+    quantity = Decimal(parse_quantity(quantity))
+    price = Decimal(str(price))
+    if not symbol:
+        raise TradeError('Invalid symbol')
+    if price <= 0:
+        raise TradeError('Stock not found')
+    if side not in ('buy', 'sell'):
+        raise TradeError(f'Invalid side: {side}')
+
+    amount = (quantity * price).quantize(Decimal('0.01'))
+    portfolio_id = get_or_create_portfolio(user).pk
+
+    with transaction.atomic():
+        # Serializes trades per portfolio
+        DemoPortfolio.objects.select_for_update().only('id').get(pk=portfolio_id)
+
+        if side == 'buy':
+            paid = DemoPortfolio.objects.filter(pk=portfolio_id, balance__gte=amount).update(
+                balance=F('balance') - amount,
+            )
+            if not paid:
+                raise TradeError('Insufficient balance')
+
+            position, created = Position.objects.get_or_create(
+                portfolio_id=portfolio_id, symbol=symbol,
+                defaults={'quantity': quantity, 'avg_price': price},
+            )
+            if not created:
+                # avg_price is set first so it sees the old quantity on every backend
+                Position.objects.filter(pk=position.pk).update(
+                    avg_price=(F('quantity') * F('avg_price') + amount) / (F('quantity') + quantity),
+                    quantity=F('quantity') + quantity,
+                )
+            realized_pnl = None
+        else:
+            position = Position.objects.filter(portfolio_id=portfolio_id, symbol=symbol).first()
+            if position is None or position.quantity < quantity:
+                raise TradeError('Insufficient shares')
+
+            Position.objects.filter(pk=position.pk).update(quantity=F('quantity') - quantity)
+            Position.objects.filter(pk=position.pk, quantity__lte=0).delete()
+            DemoPortfolio.objects.filter(pk=portfolio_id).update(balance=F('balance') + amount)
+            realized_pnl = ((price - position.avg_price) * quantity).quantize(Decimal('0.01'))
+
+        # Refresh the stored valuation once the trade is committed
+        if revalue:
+            transaction.on_commit(lambda: revalue_portfolios(portfolio_ids=[portfolio_id]))
+        return Trade.objects.create(
+            portfolio_id=portfolio_id,
+            symbol=symbol,
+            side=side,
+            quantity=quantity,
+            price=price,
+            amount=amount,
+            realized_pnl=realized_pnl,
+        )
+
+
+def execute_basket(user, legs, prices):
+    """
+    Execute several trades in one transaction - all legs fill or none do.
+    `legs` are {symbol, side, quantity} dicts and `prices` maps each symbol to
+    its current price. Sells run before buys so they can fund them.
+    Returns the Trades; raises TradeError naming the first leg that failed.
+    """
+    if not legs or len(legs) > MAX_BASKET_LEGS:
+        raise TradeError(f'A basket needs 1 to {MAX_BASKET_LEGS} legs')
+
+    ordered = sorted(enumerate(legs), key=lambda item: item[1].get('side') != 'sell')
+    trades = []
+    with transaction.atomic():
+        for index, leg in ordered:
+            symbol = leg.get('symbol')
+            try:
+                trades.append(execute_trade(
+                    user, symbol, leg.get('side'), leg.get('quantity', 0), prices.get(symbol, 0), revalue=False,
+                ))
+            except (TradeError, ArithmeticError) as e:
+                raise TradeError(f'Leg {index + 1} ({leg.get("side")} {symbol}): {e}')
+
+        portfolio_id = trades[0].portfolio_id
+        transaction.on_commit(lambda: revalue_portfolios(portfolio_ids=[portfolio_id]))
+    return trades
@@ -6,9 +6,11 @@ from .views import award_xp
 from .progress_views import flashcard_flip, get_flashcard_progress, get_mcq_progress, get_module_progress, complete_module, mcq_answer
 from .portfolio_views import (
     get_portfolio, get_stocks, get_stock_detail, buy_stock, sell_stock,
-    get_portfolio_history, get_ai_recommendation
+    get_portfolio_history, get_portfolio_risk, get_ai_recommendation, basket_order,
+    create_backtest, get_backtest, get_sip_simulation
 )
 from .challenge_views import get_leaderboard, get_user_challenge_stats, submit_stock_prediction, get_random_stock_question
+from .order_views import portfolio_orders, cancel_portfolio_order
 from .achievement_views import get_achievements, check_achievements, mark_achievement_notified
 
 router = DefaultRouter()
@@ -35,11 +37,18 @@ urlpatterns = [
     # Portfolio endpoints
     path('portfolio/', get_portfolio, name='get_portfolio'),
     path('portfolio/history/', get_portfolio_history, name='get_portfolio_history'),
+    path('portfolio/risk/', get_portfolio_risk, name='get_portfolio_risk'),
+    path('portfolio/sip/', get_sip_simulation, name='get_sip_simulation'),
+    path('portfolio/backtests/', create_backtest, name='create_backtest'),
+    path('portfolio/backtests/<str:backtest_id>/', get_backtest, name='get_backtest'),
     path('portfolio/stocks/', get_stocks, name='get_stocks'),
     path('portfolio/stocks/<str:symbol>/', get_stock_detail, name='get_stock_detail'),
     path('portfolio/buy/', buy_stock, name='buy_stock'),
     path('portfolio/sell/', sell_stock, name='sell_stock'),
+    path('portfolio/basket/', basket_order, name='basket_order'),
     path('portfolio/ai-recommendation/', get_ai_recommendation, name='get_ai_recommendation'),
+    path('portfolio/orders/', portfolio_orders, name='portfolio_orders'),
+    path('portfolio/orders/<int:order_id>/cancel/', cancel_portfolio_order, name='cancel_portfolio_order'),
     # Challenge endpoints
     path('challenges/leaderboard/', get_leaderboard, name='get_leaderboard'),
     path('challenges/stats/', get_user_challenge_stats, name='get_user_challenge_stats'),
@@ -1,8 +1,10 @@
 import os
+from django.conf import settings
 from django.core.asgi import get_asgi_application
 from channels.routing import ProtocolTypeRouter, URLRouter
 from channels.auth import AuthMiddlewareStack
 import chat.routing
+import users.routing
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'wealthplay.settings')
 
@@ -10,7 +12,11 @@ application = ProtocolTypeRouter({
     "http": get_asgi_application(),
     "websocket": AuthMiddlewareStack(
         URLRouter(
-            chat.routing.websocket_urlpatterns
+            chat.routing.websocket_urlpatterns + users.routing.websocket_urlpatterns
         )
     ),
 })
+
+if settings.ML_WARMUP_WEB:
+    from users.ml_predictor import ML_PREDICTOR
+    ML_PREDICTOR.warm_up()
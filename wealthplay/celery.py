@@ -3,6 +3,7 @@ Celery configuration for WealthPlay
 """
 import os
 from celery import Celery
+from celery.signals import worker_process_init
 
 # Set the default Django settings module for the 'celery' program.
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'wealthplay.settings')
@@ -19,6 +20,15 @@ app.config_from_object('django.conf:settings', namespace='CELERY')
 app.autodiscover_tasks()
 
 
+@worker_process_init.connect
+def warm_up_ml_models(**kwargs):
+    """Load the ML models in each worker process before it takes tasks"""
+    from django.conf import settings
+    if settings.ML_WARMUP_WORKERS:
+        from users.ml_predictor import ML_PREDICTOR
+        ML_PREDICTOR.warm_up()
+
+
 @app.task(bind=True, ignore_result=True)
 def debug_task(self):
     print(f'Request: {self.request!r}')
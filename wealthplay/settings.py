@@ -13,6 +13,7 @@ https://docs.djangoproject.com/en/4.2/ref/settings/
 from pathlib import Path
 import os
 from dotenv import load_dotenv
+from celery.schedules import crontab
 
 # Load environment variables from .env file
 load_dotenv()
@@ -147,6 +148,17 @@ STATIC_ROOT = BASE_DIR / 'staticfiles'
 MEDIA_URL = 'media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Columnar OHLCV store (one memory-mapped record file per symbol)
+OHLCV_STORE_DIR = BASE_DIR / 'data' / 'ohlcv'
+
+# Market data provider (read from the environment by ml/market_data.py, which
+# also runs outside Django): MARKET_DATA_PROVIDER=yfinance|replay,
+# MARKET_DATA_REPLAY_DIR (default ml/fixtures), MARKET_DATA_REPLAY_LATENCY (seconds)
+
+# Extra exchange holidays for users/market_clock.py, as JSON {"NSE": ["2027-01-26", ...]}.
+# Add each new year here as soon as the exchange publishes its calendar.
+MARKET_HOLIDAYS_FILE = os.getenv('MARKET_HOLIDAYS_FILE')
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
 
@@ -195,6 +207,26 @@ CHANNEL_LAYERS = {
     },
 }
 
+# Achievement unlocks are pushed from Celery workers, which needs a layer shared
+# across processes - set REDIS_CHANNEL_URL in production
+if os.getenv('REDIS_CHANNEL_URL'):
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'channels_redis.core.RedisChannelLayer',
+            'CONFIG': {'hosts': [os.getenv('REDIS_CHANNEL_URL')]},
+        },
+    }
+
+# Cache - shared across web and Celery workers when REDIS_CACHE_URL is set, so
+# refresh de-duplication and quote invalidation work across processes
+if os.getenv('REDIS_CACHE_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.getenv('REDIS_CACHE_URL'),
+        },
+    }
+
 # Celery Configuration
 CELERY_BROKER_URL = 'redis://localhost:6379/0'
 CELERY_RESULT_BACKEND = 'redis://localhost:6379/0'
@@ -203,8 +235,48 @@ CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = TIME_ZONE
 CELERY_BEAT_SCHEDULE = {
-    'update-ml-data-every-5-minutes': {
-        'task': 'users.tasks.update_ml_data_task',
-        'schedule': 300.0,  # Every 5 minutes (300 seconds)
+    # Per-symbol refresh intervals follow market hours, volatility and popularity
+    # (see users/refresh_scheduler.py); this only checks which symbols are due
+    'dispatch-due-refreshes-every-minute': {
+        'task': 'users.tasks.dispatch_refreshes_task',
+        'schedule': 60.0,
+    },
+    'tick-custom-stocks-every-minute': {
+        'task': 'users.tasks.tick_custom_stocks_task',
+        'schedule': 60.0,  # One tick = one minute of the NSE session; skipped while closed
+    },
+    # After both NSE (10:00 UTC) and NASDAQ (20:00/21:00 UTC) have closed
+    'snapshot-portfolios-end-of-day': {
+        'task': 'users.tasks.snapshot_portfolios_task',
+        'schedule': crontab(hour=21, minute=30),
+        'args': ('daily',),
+    },
+    'precompute-sip-presets-end-of-day': {
+        'task': 'users.tasks.precompute_sip_presets_task',
+        'schedule': crontab(hour=21, minute=45),
+    },
+    'purge-idempotency-keys-hourly': {
+        'task': 'users.tasks.purge_idempotency_keys_task',
+        'schedule': 3600.0,
+    },
+    'purge-backtest-results-hourly': {
+        'task': 'users.tasks.purge_backtest_results_task',
+        'schedule': 3600.0,
     },
 }
+
+# ML models load lazily on the first prediction. Processes that predict warm them up
+# at startup: Celery workers (refreshes, challenges) by default, web processes on request.
+ML_WARMUP_WORKERS = os.getenv('ML_WARMUP_WORKERS', '1') == '1'
+ML_WARMUP_WEB = os.getenv('ML_WARMUP_WEB', '0') == '1'
+# Seconds between checks of the model registry for a newly activated version (hot reload)
+ML_MODEL_CHECK_SECONDS = int(os.getenv('ML_MODEL_CHECK_SECONDS', '30'))
+
+# Optional intraday portfolio snapshots for the history chart, e.g. every 15 minutes
+PORTFOLIO_INTRADAY_SNAPSHOT_MINUTES = int(os.getenv('PORTFOLIO_INTRADAY_SNAPSHOT_MINUTES', '0'))
+if PORTFOLIO_INTRADAY_SNAPSHOT_MINUTES:
+    CELERY_BEAT_SCHEDULE['snapshot-portfolios-intraday'] = {
+        'task': 'users.tasks.snapshot_portfolios_task',
+        'schedule': PORTFOLIO_INTRADAY_SNAPSHOT_MINUTES * 60.0,
+        'args': ('intraday',),
+    }
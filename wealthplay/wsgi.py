@@ -9,8 +9,13 @@ https://docs.djangoproject.com/en/4.2/howto/deployment/wsgi/
 
 import os
 
+from django.conf import settings
 from django.core.wsgi import get_wsgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'wealthplay.settings')
 
 application = get_wsgi_application()
+
+if settings.ML_WARMUP_WEB:
+    from users.ml_predictor import ML_PREDICTOR
+    ML_PREDICTOR.warm_up()